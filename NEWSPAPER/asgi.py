@@ -9,8 +9,10 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from newspaper_app.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "NEWSPAPER.settings")
 
+# Django's ASGIHandler, streaming the exports off the event loop, see
+# newspaper_app/asgi.py
 application = get_asgi_application()
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.sitemaps",
     # third party apps
     "django_summernote",
     "rest_framework",
@@ -46,7 +47,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover the rest of the stack
+    "newspaper_app.metrics.MetricsMiddleware",
+    # before anything reads the database
+    "newspaper_app.db_router.PrimaryStickinessMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # static files answer before sessions and the database are touched
+    "newspaper_app.static_files.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -61,8 +68,17 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": ["templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
+            # templates are compiled once per process
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -82,11 +98,47 @@ WSGI_APPLICATION = "NEWSPAPER.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        # Django's SQLite backend with WAL, busy_timeout and retries on
+        # "database is locked", see newspaper_app/sqlite/base.py
+        "ENGINE": "newspaper_app.sqlite",
         "NAME": BASE_DIR / "db.sqlite3",
+        # keep the connection open between requests for 10 minutes
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# pragmas set on every connection and the retries on "database is locked",
+# defaults in newspaper_app/sqlite/base.py. WAL is turned on once, by the
+# migrations
+SQLITE = {
+    "PRAGMAS": {
+        "synchronous": "normal",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "busy_timeout": 5000,
+    },
+    "LOCK_RETRIES": 5,
+    "LOCK_BACKOFF": 0.05,
+}
+
+# read replicas (aliases in DATABASES), see newspaper_app/db_router.py. To
+# try one locally, add a second SQLite file the `sync_replica` command copies
+# db.sqlite3 into:
+#
+#     DATABASES["replica"] = {
+#         "ENGINE": "django.db.backends.sqlite3",
+#         "NAME": BASE_DIR / "replica.sqlite3",
+#         "TEST": {"MIRROR": "default"},
+#     }
+#     DATABASE_REPLICAS = ["replica"]
+DATABASE_REPLICAS = []
+# seconds the replicas may lag behind, clients that wrote read from the
+# primary that long
+REPLICA_MAX_LAG = 5
+
+DATABASE_ROUTERS = ["newspaper_app.db_router.ReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -124,6 +176,17 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 STATICFILES_DIRS = ("static",)
+# `collectstatic` fingerprints and compresses the files the pages use into
+# STATIC_ROOT, StaticFilesMiddleware serves them, see
+# newspaper_app/static_files.py
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STATICFILES_STORAGE = "newspaper_app.static_files.CompressedManifestStaticFilesStorage"
+STATICFILES_FINDERS = [
+    "newspaper_app.static_files.ThemeFinder",
+    "django.contrib.staticfiles.finders.AppDirectoriesFinder",
+]
+# seconds browsers cache the static files that aren't fingerprinted
+STATIC_MAX_AGE = 60 * 60
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media/")
@@ -150,3 +213,73 @@ SUMMERNOTE_CONFIG = {
     "width": "100%",
     "height": "600",
 }
+
+# buffered post views, see newspaper_app/view_counter.py
+VIEW_COUNTER = {
+    "FLUSH_INTERVAL": 10,
+    "FLUSH_THRESHOLD": 100,
+    "FLUSH_TIMER": True,
+}
+
+# leaderboards of newspaper_app/trending.py, updated by the update_trending
+# command from cron
+TRENDING = {
+    "LEADERBOARD_SIZE": 100,
+    "MIN_SCORE": 0.01,
+}
+
+# The cached pages, navigation, feeds and fragments are dropped by bumping
+# a version number in the cache, see newspaper_app/versioning.py. Every
+# worker has to see the bump, so the cache has to be shared by all of them:
+# the files are shared by the processes of one host, set REDIS_URL (and
+# pip install redis) when the site runs on more than one.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": BASE_DIR / "cache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+# each test run gets an in-memory cache of its own, see
+# newspaper_app/test_runner.py
+TEST_RUNNER = "newspaper_app.test_runner.TestRunner"
+
+# seconds a navigation snapshot lives, it is also dropped on any
+# Post/Category/Tag change, see newspaper_app/navigation.py
+NAVIGATION_CACHE_TIMEOUT = 300
+
+# seconds an anonymous page stays cached, publishing, editing or deleting
+# a post drops it earlier, see newspaper_app/page_cache.py
+PAGE_CACHE_TIMEOUT = 600
+
+# seconds the {% fragment %} template fragments are cached, a post, category
+# or tag change drops them sooner, see newspaper_app/fragments.py
+FRAGMENT_CACHE_TIMEOUT = 600
+
+# posts per sitemap page, the pages split the posts by id ranges
+SITEMAP_PAGE_SIZE = 5000
+
+# comments on the detail page and per "load more"
+COMMENTS_PAGE_SIZE = 20
+
+# featured image sizes (name => width), rendered next to the original by a
+# pool of POST_IMAGE_RENDITION_WORKERS processes, 0 renders in the request
+POST_IMAGE_RENDITIONS = {
+    "small": 320,
+    "medium": 640,
+    "large": 1024,
+}
+POST_IMAGE_RENDITION_WORKERS = 2
+
+# may read /metrics/ without logging in as staff, leave it empty when a
+# proxy on the same host forwards the public traffic
+INTERNAL_IPS = ["127.0.0.1", "::1"]
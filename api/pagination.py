@@ -0,0 +1,87 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from newspaper_app.comments import COMMENT_ORDERING, get_page_size
+from newspaper_app.pagination import InvalidCursor, KeysetPaginator
+
+
+class KeysetPagination(BasePagination):
+    """
+    `?cursor=` pagination on (published_at, id).
+    `?page_size=` picks the page size, `?count=false` skips the COUNT(*).
+    """
+
+    page_size = 10
+    max_page_size = 100
+    ordering = ("-published_at", "-id")
+    count_by_default = True
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        with_count = request.query_params.get("count")
+        if with_count is None:
+            with_count = self.count_by_default
+        else:
+            with_count = with_count.lower() not in ("0", "false")
+        self.paginator = KeysetPaginator(
+            queryset,
+            self.get_page_size(request),
+            ordering=self.ordering,
+            count=with_count,
+            count_queryset=getattr(view, "count_queryset", None),
+        )
+        try:
+            self.page = self.paginator.page(request.query_params.get("cursor"))
+        except InvalidCursor:
+            raise NotFound("Invalid cursor.")
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, "cursor", cursor)
+
+    def get_paginated_response(self, data):
+        response = {
+            "next": self.get_link(self.page.next_cursor),
+            "previous": self.get_link(self.page.previous_cursor),
+            "results": data,
+        }
+        if self.paginator.count is not None:
+            response = {"count": self.paginator.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "count": {"type": "integer"},
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class CommentPagination(KeysetPagination):
+    """
+    The comments of a post, oldest first on (created_at, id). No count by
+    default, it is on the post.
+    """
+
+    ordering = COMMENT_ORDERING
+    count_by_default = False
+
+    @property
+    def page_size(self):
+        return get_page_size()
@@ -1,6 +1,10 @@
 from django.contrib.auth.models import Group, User
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import OuterRef, Prefetch, Subquery
 from rest_framework import serializers
 
+from newspaper_app import renditions
 from newspaper_app.models import Category, Comment, Newsletter, Post, Tag
 
 
@@ -38,12 +42,95 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
+COMMENTS_EMBED_MODES = ("none", "count", "latest", "all")
+DEFAULT_COMMENTS_EMBED = ("all", None)
+
+
+def parse_comments_embed(value):
+    """
+    `none`, `count`, `latest:N` or `all` => (mode, N or None)
+    """
+    if not value:
+        return DEFAULT_COMMENTS_EMBED
+    mode, _, limit = value.partition(":")
+    if mode not in COMMENTS_EMBED_MODES or bool(limit) != (mode == "latest"):
+        raise serializers.ValidationError(
+            {"comments": "Must be one of none, count, latest:N or all."}
+        )
+    if mode != "latest":
+        return mode, None
+    if not limit.isdigit() or not 0 < int(limit) <= 100:
+        raise serializers.ValidationError(
+            {"comments": "latest:N needs N between 1 and 100."}
+        )
+    return mode, int(limit)
+
+
+def embed_comments(queryset, embed):
+    """
+    Fetch everything PostSerializer needs for `embed` with a fixed number of
+    queries per page: comments are one prefetch.
+    """
+    mode, limit = embed
+    queryset = queryset.prefetch_related("tag")
+    if mode in ("none", "count"):
+        # the count is stored on the post
+        return queryset
+    comments = Comment.objects.order_by("-created_at", "-id")
+    if mode == "latest":
+        latest_ids = Comment.objects.filter(post=OuterRef("post")).order_by(
+            "-created_at", "-id"
+        )[:limit]
+        comments = comments.filter(pk__in=Subquery(latest_ids.values("pk")))
+    return queryset.prefetch_related(
+        Prefetch("comment_set", queryset=comments, to_attr="embedded_comments")
+    )
+
+
 class PostSerializer(serializers.ModelSerializer):
     comments = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        mode, _ = self.comments_embed
+        if mode in ("none", "count"):
+            self.fields.pop("comments", None)
+        if mode == "none":
+            self.fields.pop("comment_count", None)
+
+    @property
+    def comments_embed(self):
+        return self.context.get("comments_embed", DEFAULT_COMMENTS_EMBED)
 
     def get_comments(self, obj):
-        comments = Comment.objects.filter(post=obj).values()
-        return comments
+        comments = getattr(obj, "embedded_comments", None)
+        if comments is None:
+            # not fetched by embed_comments(), e.g. a single published post
+            mode, limit = self.comments_embed
+            comments = Comment.objects.filter(post=obj).order_by("-created_at", "-id")
+            if mode == "latest":
+                comments = comments[:limit]
+        return CommentSerializer(comments, many=True).data
+
+    def get_renditions(self, obj):
+        # the sizes rendered so far, clients fall back to featured_image
+        request = self.context.get("request")
+        data = {}
+        for size in renditions.get_renditions():
+            urls = {
+                "url": renditions.rendition_url(obj.featured_image, size),
+                "webp": renditions.rendition_url(obj.featured_image, size, webp=True),
+            }
+            if urls["url"] == obj.featured_image.url:
+                continue
+            if request is not None:
+                urls = {
+                    key: request.build_absolute_uri(url) if url else None
+                    for key, url in urls.items()
+                }
+            data[size] = urls
+        return data
 
     class Meta:
         model = Post
@@ -51,13 +138,19 @@ class PostSerializer(serializers.ModelSerializer):
             "id",
             "title",
             "content",
+            "body_html",
+            "excerpt",
+            "word_count",
+            "reading_time",
             "featured_image",
+            "renditions",
             "views_count",
             "status",
             "published_at",
             "category",
             "tag",
             "author",
+            "comment_count",
             "comments",
         ]
         extra_kwargs = {
@@ -71,10 +164,168 @@ class PostSerializer(serializers.ModelSerializer):
         return data
 
 
+class PostSearchSerializer(PostSerializer):
+    rank = serializers.FloatField(source="search_rank", read_only=True)
+    snippet = serializers.CharField(source="search_snippet", read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ["rank", "snippet"]
+
+
+class PostCardSerializer(serializers.ModelSerializer):
+    """
+    What a card shows of a post, without the body, tags or comments.
+    """
+
+    class Meta:
+        model = Post
+        fields = [
+            "id",
+            "title",
+            "excerpt",
+            "reading_time",
+            "featured_image",
+            "views_count",
+            "published_at",
+            "category",
+            "author",
+        ]
+
+
 class PostPublishSerializer(serializers.Serializer):
     post = serializers.IntegerField()
 
 
+# items per bulk request, validation and writes take a fixed number of
+# queries, the cap keeps the request size and the transaction short
+BULK_MAX_ITEMS = 500
+
+
+def missing_pk_errors(field, pks, existing):
+    missing = [pk for pk in pks if pk not in existing]
+    if not missing:
+        return {}
+    return {field: [f'Invalid pk "{pk}" - object does not exist.' for pk in missing]}
+
+
+def raise_item_errors(errors):
+    # one entry per item, empty for the valid ones, like many=True does
+    if any(errors):
+        raise serializers.ValidationError(errors)
+
+
+class PostBulkItemSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=250)
+    content = serializers.CharField()
+    # name of an image already in the media storage
+    featured_image = serializers.CharField(max_length=100)
+    status = serializers.ChoiceField(choices=Post.STATUS_CHOICES, default="active")
+    category = serializers.IntegerField()
+    tag = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+
+def media_exists(name):
+    try:
+        return default_storage.exists(name)
+    except SuspiciousFileOperation:
+        return False  # e.g. ../x.jpg, outside of MEDIA_ROOT
+
+
+class PostBulkCreateSerializer(serializers.Serializer):
+    posts = PostBulkItemSerializer(
+        many=True, allow_empty=False, max_length=BULK_MAX_ITEMS
+    )
+
+    def validate_posts(self, items):
+        # checked here rather than per field, so a batch reports the missing
+        # images, categories and tags of every item at once. Two queries for
+        # the whole batch instead of one per related pk.
+        images = {
+            name
+            for name in {item["featured_image"] for item in items}
+            if media_exists(name)
+        }
+        categories = set(
+            Category.objects.filter(
+                pk__in={item["category"] for item in items}
+            ).values_list("pk", flat=True)
+        )
+        tags = set(
+            Tag.objects.filter(
+                pk__in={pk for item in items for pk in item["tag"]}
+            ).values_list("pk", flat=True)
+        )
+        raise_item_errors(
+            [
+                {
+                    **missing_pk_errors("category", [item["category"]], categories),
+                    **(
+                        {}
+                        if item["featured_image"] in images
+                        else {"featured_image": ["No such file in the media storage."]}
+                    ),
+                    **missing_pk_errors("tag", item["tag"], tags),
+                }
+                for item in items
+            ]
+        )
+        return items
+
+
+class PostBulkPublishSerializer(serializers.Serializer):
+    posts = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
+
+    def validate_posts(self, pks):
+        existing = set(Post.objects.filter(pk__in=pks).values_list("pk", flat=True))
+        # keyed by position, like ListField reports its child errors
+        errors = {
+            i: [f'Invalid pk "{pk}" - object does not exist.']
+            for i, pk in enumerate(pks)
+            if pk not in existing
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+        return list(dict.fromkeys(pks))
+
+
+class PostBulkTagItemSerializer(serializers.Serializer):
+    post = serializers.IntegerField()
+    tags = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class PostBulkTagSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=["add", "remove"])
+    items = PostBulkTagItemSerializer(
+        many=True, allow_empty=False, max_length=BULK_MAX_ITEMS
+    )
+
+    def validate_items(self, items):
+        posts = set(
+            Post.objects.filter(pk__in={item["post"] for item in items}).values_list(
+                "pk", flat=True
+            )
+        )
+        tags = set(
+            Tag.objects.filter(
+                pk__in={pk for item in items for pk in item["tags"]}
+            ).values_list("pk", flat=True)
+        )
+        raise_item_errors(
+            [
+                {
+                    **missing_pk_errors("post", [item["post"]], posts),
+                    **missing_pk_errors("tags", item["tags"], tags),
+                }
+                for item in items
+            ]
+        )
+        return items
+
+
 class NewsletterSerializer(serializers.ModelSerializer):
     class Meta:
         model = Newsletter
@@ -1,3 +1,610 @@
-from django.test import TestCase
+import asyncio
+import json
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from newspaper_app.asgi import ASGIHandler
+from newspaper_app.models import Category, Comment, Newsletter, Post, Tag
+from newspaper_app.page_cache import category_version
+from newspaper_app.versioning import get_version
+
+
+def create_post(author, category, **kwargs):
+    kwargs.setdefault("title", "Post")
+    kwargs.setdefault("content", "<p>content</p>")
+    kwargs.setdefault("featured_image", "post_images/test.jpg")
+    kwargs.setdefault("published_at", timezone.now())
+    return Post.objects.create(author=author, category=category, **kwargs)
+
+
+class PostSearchApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        for i in range(3):
+            create_post(self.user, self.category, title=f"Budget speech {i}")
+        create_post(self.user, self.category, title="Cricket")
+
+    def test_search(self):
+        response = self.client.get(
+            reverse("post-search-api"), {"query": "budget", "limit": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIn("<mark>", response.data["results"][0]["snippet"])
+        self.assertIn("rank", response.data["results"][0])
+
+    def test_search_query_count_is_bounded(self):
+        # count + index page + posts + tags + comments
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("post-search-api"), {"query": "budget"})
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(response.data["results"][0]["comments"], [])
+
+    def test_search_without_query(self):
+        response = self.client.get(reverse("post-search-api"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 0)
+
+
+class PostCommentsEmbedTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.tag = Tag.objects.create(name="nepal")
+        for i in range(5):
+            post = create_post(self.user, self.category, title=f"Post {i}")
+            post.tag.add(self.tag)
+            for j in range(i):
+                Comment.objects.create(
+                    post=post, comment=f"comment {j}", name="reader", email="r@a.com"
+                )
+
+    def get(self, url, **params):
+        response = self.client.get(url, {"count": "false", **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data.get("results", response.data)
+
+    def comment_counts(self, data):
+        return {post["title"]: post["comment_count"] for post in data}
+
+    def test_query_count_does_not_grow_with_posts(self):
+        url = reverse("posts-list")
+        # validators + posts + tags prefetch + comments prefetch
+        with self.assertNumQueries(4):
+            data = self.get(url)
+        self.assertEqual(len(data), 5)
+        self.assertEqual(self.comment_counts(data)["Post 4"], 4)
+        by_title = {post["title"]: post for post in data}
+        self.assertEqual(len(by_title["Post 4"]["comments"]), 4)
+
+        with self.assertNumQueries(3):
+            self.get(reverse("post-by-category-api", args=[self.category.pk]))
+        with self.assertNumQueries(3):
+            self.get(reverse("post-by-tag-api", args=[self.tag.pk]))
+
+    def test_none(self):
+        with self.assertNumQueries(3):
+            data = self.get(reverse("posts-list"), comments="none")
+        self.assertNotIn("comments", data[0])
+        self.assertNotIn("comment_count", data[0])
+
+    def test_count(self):
+        with self.assertNumQueries(3):
+            data = self.get(reverse("posts-list"), comments="count")
+        self.assertNotIn("comments", data[0])
+        self.assertEqual(
+            self.comment_counts(data),
+            {"Post 0": 0, "Post 1": 1, "Post 2": 2, "Post 3": 3, "Post 4": 4},
+        )
+
+    def test_latest(self):
+        with self.assertNumQueries(4):
+            data = self.get(reverse("posts-list"), comments="latest:2")
+        by_title = {post["title"]: post for post in data}
+        self.assertEqual(by_title["Post 4"]["comment_count"], 4)
+        self.assertEqual(
+            [comment["comment"] for comment in by_title["Post 4"]["comments"]],
+            ["comment 3", "comment 2"],
+        )
+        self.assertEqual(len(by_title["Post 1"]["comments"]), 1)
+
+    def test_retrieve(self):
+        post = Post.objects.get(title="Post 3")
+        data = self.get(reverse("posts-detail", args=[post.pk]), comments="latest:1")
+        self.assertEqual(data["comment_count"], 3)
+        self.assertEqual(len(data["comments"]), 1)
+
+    def test_comment_api_updates_the_count(self):
+        post = Post.objects.get(title="Post 1")
+        response = self.client.post(
+            reverse("comments-api", args=[post.pk]),
+            {"comment": "new", "name": "reader", "email": "r@a.com"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        data = self.get(reverse("posts-detail", args=[post.pk]), comments="count")
+        self.assertEqual(data["comment_count"], 2)
+
+    def test_invalid_mode(self):
+        for value in ("some", "latest", "latest:0", "latest:x", "all:3"):
+            response = self.client.get(reverse("posts-list"), {"comments": value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+class PostKeysetPaginationApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        published_at = timezone.now()
+        # same published_at for all, the id breaks the tie
+        self.posts = [
+            create_post(self.user, self.category, published_at=published_at)
+            for _ in range(5)
+        ]
+        create_post(self.user, self.category, published_at=None)
+
+    def test_walk_forward_and_back(self):
+        response = self.client.get(reverse("posts-list"), {"page_size": 2})
+        self.assertEqual(response.data["count"], 5)
+        self.assertIsNone(response.data["previous"])
+        seen = [post["id"] for post in response.data["results"]]
+        pages = [seen]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            pages.append([post["id"] for post in response.data["results"]])
+        self.assertEqual(sum(pages, []), [post.pk for post in reversed(self.posts)])
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([post["id"] for post in response.data["results"]], pages[1])
+
+    def test_without_count(self):
+        with self.assertNumQueries(4):  # validators + posts + tags + comments
+            response = self.client.get(
+                reverse("posts-list"), {"count": "false", "page_size": 2}
+            )
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("posts-list"), {"cursor": "nope"})
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentPaginationApiTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("author", password="password")
+        self.post = create_post(user, Category.objects.create(name="News"))
+        for i in range(5):
+            Comment.objects.create(
+                post=self.post, comment=f"comment {i}", name="reader", email="r@a.com"
+            )
+
+    def test_pages_oldest_first(self):
+        url = reverse("comments-api", args=[self.post.pk]) + "?page_size=2"
+        pages = []
+        while url:
+            # validators + page, no COUNT(*)
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            pages.append([comment["comment"] for comment in response.data["data"]])
+            url = response.data["next"]
+        self.assertEqual(
+            pages,
+            [["comment 0", "comment 1"], ["comment 2", "comment 3"], ["comment 4"]],
+        )
+
+    def test_invalid_cursor(self):
+        url = reverse("comments-api", args=[self.post.pk])
+        self.assertEqual(self.client.get(url, {"cursor": "nope"}).status_code, 404)
+
+
+class ConditionalGetApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.tag = Tag.objects.create(name="nepal")
+        self.post = create_post(self.user, self.category, title="First story")
+
+    def assertNotModified(self, url, response):
+        # nothing but the validator aggregate runs
+        with self.assertNumQueries(1):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def assertModified(self, url, response):
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], response["ETag"])
+        return again
+
+    def test_post_list_and_detail(self):
+        for url in (
+            reverse("posts-list"),
+            reverse("posts-detail", args=[self.post.pk]),
+        ):
+            response = self.client.get(url)
+            self.assertIn("Last-Modified", response)
+            self.assertNotModified(url, response)
+            if_modified_since = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+            self.assertEqual(if_modified_since.status_code, 304)
+
+    def test_post_changes(self):
+        url = reverse("posts-list")
+        response = self.client.get(url)
+        Comment.objects.create(
+            post=self.post, comment="first", name="reader", email="r@a.com"
+        )
+        response = self.assertModified(url, response)
+        self.post.tag.add(self.tag)
+        response = self.assertModified(url, response)
+        self.post.delete()
+        self.assertModified(url, response)
+
+    def test_comments(self):
+        url = reverse("comments-api", args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertNotModified(url, response)
+        comment = Comment.objects.create(
+            post=self.post, comment="first", name="reader", email="r@a.com"
+        )
+        response = self.assertModified(url, response)
+        comment.delete()
+        self.assertModified(url, response)
+
+    def test_tags_and_categories(self):
+        for url, obj in (
+            ("/api/v1/tags/", self.tag),
+            (f"/api/v1/categories/{self.category.pk}/", self.category),
+        ):
+            response = self.client.get(url)
+            self.assertNotModified(url, response)
+            obj.name = "renamed"
+            obj.save()
+            self.assertModified(url, response)
+
+    def test_missing_object(self):
+        self.assertEqual(
+            self.client.get(reverse("posts-detail", args=[0])).status_code, 404
+        )
+        self.assertEqual(self.client.get("/api/v1/tags/abc/").status_code, 404)
+
+
+class PostBulkApiTest(TestCase):
+    image = "post_images/2023/02/08/thumb.jpeg"
+
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name="News")
+        self.tags = [Tag.objects.create(name=f"tag {i}") for i in range(3)]
+
+    def items(self, count, **kwargs):
+        return [
+            {
+                "title": f"Bulk {i}",
+                "content": "<p>Budget speech</p>",
+                "featured_image": self.image,
+                "category": self.category.pk,
+                "tag": [tag.pk for tag in self.tags[:2]],
+                **kwargs,
+            }
+            for i in range(count)
+        ]
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, content_type="application/json")
+
+    def count_queries(self, name, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(name, data)
+        self.assertLess(response.status_code, 300, response.data)
+        return len(queries)
+
+    def test_create(self):
+        response = self.post("post-bulk-create-api", {"posts": self.items(3)})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["data"]), 3)
+        posts = Post.objects.filter(title__startswith="Bulk")
+        self.assertEqual(posts.count(), 3)
+        post = posts.first()
+        self.assertEqual(post.author, self.user)
+        self.assertIsNone(post.published_at)
+        self.assertEqual(set(post.tag.all()), set(self.tags[:2]))
+        # rendered although bulk_create skips pre_save
+        self.assertEqual(response.data["data"][0]["excerpt"], "Budget speech")
+        self.assertEqual(post.body_html, "<p>Budget speech</p>")
+
+    def test_create_reports_every_invalid_item(self):
+        items = self.items(3)
+        items[1]["category"] = 0
+        items[2]["tag"] = [self.tags[0].pk, 0]
+        items[2]["featured_image"] = "post_images/missing.jpg"
+        response = self.post("post-bulk-create-api", {"posts": items})
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["posts"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("category", errors[1])
+        self.assertEqual(set(errors[2]), {"tag", "featured_image"})
+        self.assertFalse(Post.objects.exists())
+
+    def test_create_rejects_paths_outside_the_media_storage(self):
+        items = self.items(2)
+        items[1]["featured_image"] = "../x.jpg"
+        response = self.post("post-bulk-create-api", {"posts": items})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data["posts"][1]), {"featured_image"})
+
+    def test_create_query_count_does_not_grow_with_items(self):
+        self.assertEqual(
+            self.count_queries("post-bulk-create-api", {"posts": self.items(5)}),
+            self.count_queries("post-bulk-create-api", {"posts": self.items(50)}),
+        )
+
+    def test_publish(self):
+        drafts = [
+            create_post(self.user, self.category, title=f"Draft {i}", published_at=None)
+            for i in range(3)
+        ]
+        drafts[0].tag.add(self.tags[0])
+        published = create_post(self.user, self.category)
+        response = self.post(
+            "post-bulk-publish-api",
+            {"posts": [drafts[0].pk, drafts[1].pk, published.pk, drafts[0].pk]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["data"]["published"], [drafts[0].pk, drafts[1].pk]
+        )
+        self.assertEqual(response.data["data"]["unchanged"], [published.pk])
+        self.assertEqual(
+            Post.objects.filter(published_at__isnull=True).get(), drafts[2]
+        )
+        search = self.client.get(reverse("post-search-api"), {"query": "draft"})
+        self.assertEqual(search.data["count"], 2)
+
+    def test_publish_updates_the_sections(self):
+        url = reverse("sections-api")
+        params = {"categories": str(self.category.pk)}
+        create_post(self.user, self.category, title="Older")
+        draft = create_post(self.user, self.category, title="Fresh", published_at=None)
+        # cached without the draft
+        self.assertEqual(len(self.client.get(url, params).data["data"][0]["posts"]), 1)
+        self.assertEqual(
+            self.post("post-bulk-publish-api", {"posts": [draft.pk]}).status_code, 200
+        )
+        posts = self.client.get(url, params).data["data"][0]["posts"]
+        self.assertEqual([post["title"] for post in posts], ["Fresh", "Older"])
+
+    def test_publish_unknown_post(self):
+        draft = create_post(self.user, self.category, published_at=None)
+        response = self.post("post-bulk-publish-api", {"posts": [draft.pk, 0]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data["posts"]), [1])
+        draft.refresh_from_db()
+        self.assertIsNone(draft.published_at)
+
+    def test_publish_query_count_does_not_grow_with_items(self):
+        def publish(count):
+            drafts = [
+                create_post(self.user, self.category, published_at=None)
+                for _ in range(count)
+            ]
+            for draft in drafts:
+                draft.tag.add(*self.tags)
+            data = {"posts": [draft.pk for draft in drafts]}
+            return self.count_queries("post-bulk-publish-api", data)
+
+        # with a published neighbour to repoint both times
+        create_post(self.user, self.category)
+        self.assertEqual(publish(5), publish(50))
+
+    def test_add_and_remove_tags(self):
+        posts = [create_post(self.user, self.category) for _ in range(2)]
+        posts[0].tag.add(self.tags[0])
+        items = [
+            {"post": post.pk, "tags": [tag.pk for tag in self.tags]} for post in posts
+        ]
+        response = self.post("post-bulk-tag-api", {"action": "add", "items": items})
+        self.assertEqual(response.status_code, 200)
+        for post in posts:
+            self.assertEqual(set(post.tag.all()), set(self.tags))
+
+        items = [
+            {"post": posts[0].pk, "tags": [self.tags[0].pk]},
+            {"post": posts[1].pk, "tags": [self.tags[1].pk, self.tags[2].pk]},
+        ]
+        response = self.post("post-bulk-tag-api", {"action": "remove", "items": items})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(posts[0].tag.all()), set(self.tags[1:]))
+        self.assertEqual(set(posts[1].tag.all()), {self.tags[0]})
+
+    def test_tagging_invalidates_the_category_pages(self):
+        post = create_post(self.user, self.category)
+        version = get_version(category_version(self.category.pk))
+        items = [{"post": post.pk, "tags": [self.tags[0].pk]}]
+        response = self.post("post-bulk-tag-api", {"action": "add", "items": items})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(get_version(category_version(self.category.pk)), version)
+
+    def test_tag_errors(self):
+        post = create_post(self.user, self.category)
+        items = [{"post": post.pk, "tags": [self.tags[0].pk]}, {"post": 0, "tags": [0]}]
+        response = self.post("post-bulk-tag-api", {"action": "add", "items": items})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data["items"][1]), {"post", "tags"})
+        self.assertFalse(post.tag.exists())
+
+    def test_tag_query_count_does_not_grow_with_items(self):
+        posts = [create_post(self.user, self.category) for _ in range(50)]
+
+        def tag(action, count):
+            items = [
+                {"post": post.pk, "tags": [tag.pk for tag in self.tags]}
+                for post in posts[:count]
+            ]
+            return self.count_queries(
+                "post-bulk-tag-api", {"action": action, "items": items}
+            )
+
+        self.assertEqual(tag("add", 5), tag("add", 50))
+        self.assertEqual(tag("remove", 5), tag("remove", 50))
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.post("post-bulk-publish-api", {"posts": [1]})
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.post = create_post(self.user, self.category, title="First story")
+
+    def test_staff_only(self):
+        url = reverse("export-api", args=["posts"])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_export(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("export-api", args=["posts"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])["title"], "First story")
+
+        response = self.client.get(
+            reverse("export-api", args=["posts"]),
+            {"output": "csv", "since": "2999-01-01"},
+        )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('filename="posts.csv"', response["Content-Disposition"])
+
+        for params in ({"output": "xml"}, {"since": "yesterday"}):
+            response = self.client.get(reverse("export-api", args=["posts"]), params)
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("export-api", args=["users"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportAsgiTest(TransactionTestCase):
+    # the export streams from a thread of its own, the rows have to be
+    # committed
+
+    def get(self, url, cookie):
+        messages = []
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": url,
+            "raw_path": url.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        # how many times another task ran, when each message was sent
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        async def send(message):
+            messages.append((ticks, message))
+
+        async def serve():
+            ticker = asyncio.create_task(tick())
+            try:
+                await ASGIHandler()(scope, receive, send)
+            finally:
+                ticker.cancel()
+
+        asyncio.run(serve())
+        return messages
+
+    def export(self):
+        Newsletter.objects.create(email="reader@example.com")
+        user = User.objects.create_user("staff", password="password", is_staff=True)
+        self.client.force_login(user)
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        return self.get(
+            reverse("export-api", args=["newsletters"]),
+            f"{settings.SESSION_COOKIE_NAME}={session}",
+        )
+
+    def test_streams_under_asgi(self):
+        messages = [message for _, message in self.export()]
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        self.assertEqual(json.loads(body)["email"], "reader@example.com")
+
+    def test_event_loop_runs_while_streaming(self):
+        messages = self.export()
+        (started, _), (finished, _) = messages[0], messages[-1]
+        self.assertGreater(finished, started)
+
+
+class SectionsApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.sports = Category.objects.create(name="Sports")
+        self.politics = Category.objects.create(name="Politics")
+        for category in (self.sports, self.politics):
+            for i in range(3):
+                create_post(self.user, category, title=f"{category.name} {i}")
+        create_post(self.user, self.sports, title="Draft", published_at=None)
+
+    def test_sections(self):
+        response = self.client.get(
+            reverse("sections-api"),
+            {"categories": f"{self.politics.pk},{self.sports.pk},999", "limit": 2},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(
+            [section["category"]["name"] for section in data["data"]],
+            ["Politics", "Sports"],
+        )
+        self.assertEqual(
+            [post["title"] for post in data["data"][1]["posts"]],
+            ["Sports 2", "Sports 1"],
+        )
+        self.assertNotIn("content", data["data"][1]["posts"][0])
+
+    def test_default_categories(self):
+        response = self.client.get(reverse("sections-api"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]), 2)
+
+    def test_invalid_params(self):
+        url = reverse("sections-api")
+        self.assertEqual(self.client.get(url, {"limit": 0}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"limit": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"categories": "a"}).status_code, 400)
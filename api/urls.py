@@ -25,6 +25,11 @@ urlpatterns = [
         views.PostByTagListViewSet.as_view(),
         name="post-by-tag-api",
     ),
+    path(
+        "post-search/",
+        views.PostSearchViewSet.as_view(),
+        name="post-search-api",
+    ),
     path(
         "draft-list/",
         views.DraftListViewSet.as_view(),
@@ -35,6 +40,31 @@ urlpatterns = [
         views.PostPublishViewSet.as_view(),
         name="post-publish-api",
     ),
+    path(
+        "post-bulk-create/",
+        views.PostBulkCreateViewSet.as_view(),
+        name="post-bulk-create-api",
+    ),
+    path(
+        "post-bulk-publish/",
+        views.PostBulkPublishViewSet.as_view(),
+        name="post-bulk-publish-api",
+    ),
+    path(
+        "post-bulk-tag/",
+        views.PostBulkTagViewSet.as_view(),
+        name="post-bulk-tag-api",
+    ),
+    path(
+        "sections/",
+        views.SectionsViewSet.as_view(),
+        name="sections-api",
+    ),
+    path(
+        "export/<str:name>/",
+        views.ExportViewSet.as_view(),
+        name="export-api",
+    ),
     path(
         "post/<int:post_id>/comments/",
         views.CommentViewSet.as_view(),
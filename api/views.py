@@ -1,22 +1,45 @@
 from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404
 from django.shortcuts import render
 from django.utils import timezone
 from rest_framework import permissions, status, viewsets, exceptions
 from rest_framework.generics import ListAPIView
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from api.pagination import CommentPagination, KeysetPagination
 from api.serializers import (
     CategorySerializer,
     CommentSerializer,
     GroupSerializer,
     NewsletterSerializer,
+    PostBulkCreateSerializer,
+    PostBulkPublishSerializer,
+    PostBulkTagSerializer,
+    PostCardSerializer,
     PostPublishSerializer,
+    PostSearchSerializer,
     PostSerializer,
     TagSerializer,
     UserSerializer,
+    embed_comments,
+    parse_comments_embed,
 )
+from newspaper_app import adjacency, export, rendering, renditions, search
+from newspaper_app.asgi import AsyncStreamingHttpResponse
+from newspaper_app.conditional import ConditionalGetMixin
+from newspaper_app.fragments import FRAGMENTS_VERSION
 from newspaper_app.models import Category, Comment, Newsletter, Post, Tag
+from newspaper_app.navigation import NAVIGATION_VERSION
+from newspaper_app.page_cache import invalidate_listing_pages, invalidate_post_pages
+from newspaper_app.search import search_posts
+from newspaper_app.sections import MAX_SECTION_POSTS, SECTION_POSTS, get_sections
+from newspaper_app.signals import touch_posts
+from newspaper_app.versioning import bump_version
 
 # application developers
 # framework / library developers
@@ -42,7 +65,29 @@ class GroupViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class ConditionalViewSetMixin(ConditionalGetMixin):
+    """
+    ETag/Last-Modified on list and retrieve, a 304 skips the serialization.
+    """
+
+    def get_validator_querysets(self):
+        queryset = self.get_queryset()
+        if self.action == "retrieve":
+            lookup = self.lookup_url_kwarg or self.lookup_field
+            try:
+                queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup]})
+            except (TypeError, ValueError, ValidationError):
+                raise Http404
+        return [queryset]
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class TagViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows tags to be viewed or edited.
     """
@@ -59,7 +104,7 @@ class TagViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows tags to be viewed or edited.
     """
@@ -76,7 +121,35 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class CommentsEmbedMixin:
+    """
+    `?comments=none|count|latest:N|all` picks how comments are embedded in
+    the serialized posts, fetched with a fixed number of queries per page.
+    """
+
+    @property
+    def comments_embed(self):
+        if not hasattr(self, "_comments_embed"):
+            self._comments_embed = parse_comments_embed(
+                self.request.query_params.get("comments")
+            )
+        return self._comments_embed
+
+    def filter_queryset(self, queryset):
+        qs = super().filter_queryset(queryset)
+        if self.request.method in permissions.SAFE_METHODS:
+            # paginators count this one, without the comment prefetches
+            self.count_queryset = qs
+            qs = embed_comments(qs, self.comments_embed)
+        return qs
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["comments_embed"] = self.comments_embed
+        return context
+
+
+class PostViewSet(ConditionalViewSetMixin, CommentsEmbedMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows tags to be viewed or edited.
     """
@@ -84,6 +157,7 @@ class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -98,8 +172,17 @@ class PostViewSet(viewsets.ModelViewSet):
             ]
         return super().get_permissions()
 
+    def perform_update(self, serializer):
+        invalidate_post_pages(serializer.instance)
+        super().perform_update(serializer)
+        invalidate_post_pages(serializer.instance)
+
+    def perform_destroy(self, instance):
+        invalidate_post_pages(instance)
+        super().perform_destroy(instance)
 
-# class PostByCategoryListViewSet(ListAPIView):
+
+# class PostByCategoryListViewSet(CommentsEmbedMixin, ListAPIView):
 #     serializer_class = PostSerializer
 #     permission_classes = [permissions.AllowAny]
 
@@ -110,10 +193,11 @@ class PostViewSet(viewsets.ModelViewSet):
 #         return qs
 
 
-class PostByTagListViewSet(ListAPIView):
+class PostByTagListViewSet(CommentsEmbedMixin, ListAPIView):
     serializer_class = PostSerializer
     queryset = Post.objects.all()
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -123,10 +207,11 @@ class PostByTagListViewSet(ListAPIView):
         return qs
 
 
-class PostByCategoryListViewSet(ListAPIView):
+class PostByCategoryListViewSet(CommentsEmbedMixin, ListAPIView):
     serializer_class = PostSerializer
     queryset = Post.objects.all()
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -136,7 +221,32 @@ class PostByCategoryListViewSet(ListAPIView):
         return qs
 
 
-class DraftListViewSet(ListAPIView):
+class SearchPagination(LimitOffsetPagination):
+    default_limit = 10
+    max_limit = 50
+
+
+class PostSearchViewSet(CommentsEmbedMixin, ListAPIView):
+    """
+    Full-text search over published posts, best match first.
+    """
+
+    serializer_class = PostSearchSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        return search_posts(
+            self.request.query_params.get("query", "").strip(),
+            queryset=embed_comments(Post.objects.all(), self.comments_embed),
+        )
+
+    def filter_queryset(self, queryset):
+        # search results are not a QuerySet, embed_comments() is applied above
+        return queryset
+
+
+class DraftListViewSet(CommentsEmbedMixin, ListAPIView):
     serializer_class = PostSerializer
     queryset = Post.objects.all()
     permission_classes = [permissions.IsAuthenticated]
@@ -160,6 +270,7 @@ class PostPublishViewSet(APIView):
             post = Post.objects.get(pk=data["post"])
             post.published_at = timezone.now()
             post.save()
+            invalidate_post_pages(post)
 
             serialized_post = PostSerializer(post)
             return Response(
@@ -171,6 +282,265 @@ class PostPublishViewSet(APIView):
             )
 
 
+class PostBulkCreateViewSet(APIView):
+    """
+    Creates up to BULK_MAX_ITEMS draft posts with their tags in one
+    transaction. `featured_image` names an image already in the media
+    storage. Validation and the inserts take a fixed number of queries.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PostBulkCreateSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["posts"]
+
+        Through = Post.tag.through
+        with transaction.atomic():
+            posts = [
+                Post(
+                    title=item["title"],
+                    content=item["content"],
+                    featured_image=item["featured_image"],
+                    status=item["status"],
+                    category_id=item["category"],
+                    author=request.user,
+                )
+                for item in items
+            ]
+            # bulk_create sends no pre_save either
+            for post in posts:
+                rendering.render_post(post)
+            posts = Post.objects.bulk_create(posts)
+            Through.objects.bulk_create(
+                Through(post_id=post.pk, tag_id=tag_id)
+                for post, item in zip(posts, items)
+                for tag_id in dict.fromkeys(item["tag"])
+            )
+            # bulk_create sends no post_save, drafts are on no cached page
+            # and not searchable
+            for image in {
+                post.featured_image.name: post.featured_image for post in posts
+            }.values():
+                renditions.schedule_renditions(image)
+        bump_version(NAVIGATION_VERSION)
+        bump_version(FRAGMENTS_VERSION)
+
+        posts = (
+            Post.objects.filter(pk__in=[post.pk for post in posts])
+            .order_by("pk")
+            .prefetch_related("tag")
+        )
+        serialized_posts = PostSerializer(
+            posts,
+            many=True,
+            context={"request": request, "comments_embed": ("none", None)},
+        )
+        return Response(
+            {
+                "success": "Posts were successfully created.",
+                "data": serialized_posts.data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class PostBulkPublishViewSet(APIView):
+    """
+    Publishes the drafts among up to BULK_MAX_ITEMS post ids with a single
+    UPDATE, published posts are left as they are.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PostBulkPublishSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pks = serializer.validated_data["posts"]
+
+        now = timezone.now()
+        with transaction.atomic():
+            drafts = list(
+                Post.objects.filter(pk__in=pks, published_at__isnull=True).only(
+                    "pk", "title", "content", "status", "category"
+                )
+            )
+            Post.objects.filter(
+                pk__in=[post.pk for post in drafts], published_at__isnull=True
+            ).update(published_at=now, updated_at=now)
+            for post in drafts:
+                post.published_at = now
+            # what the post_save receivers would have done for each post
+            search.index_posts(drafts)
+            post_ids = [post.pk for post in drafts]
+            adjacency.link_posts(post_ids)
+            tag_ids = Post.tag.through.objects.filter(post_id__in=post_ids).values_list(
+                "tag_id", flat=True
+            )
+            invalidate_listing_pages(
+                [post.category_id for post in drafts], tag_ids, post_ids
+            )
+        bump_version(NAVIGATION_VERSION)
+        bump_version(FRAGMENTS_VERSION)
+
+        published = set(post_ids)
+        return Response(
+            {
+                "success": "Posts were successfully published.",
+                "data": {
+                    "published": [pk for pk in pks if pk in published],
+                    "unchanged": [pk for pk in pks if pk not in published],
+                },
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class PostBulkTagViewSet(APIView):
+    """
+    `{"action": "add" | "remove", "items": [{"post": id, "tags": [id, ...]}]}`
+    adds or removes the tags straight on the M2M through table, one
+    statement for the whole batch.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PostBulkTagSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        action = serializer.validated_data["action"]
+        items = serializer.validated_data["items"]
+
+        Through = Post.tag.through
+        post_ids = sorted({item["post"] for item in items})
+        tag_ids = {tag_id for item in items for tag_id in item["tags"]}
+        with transaction.atomic():
+            if action == "add":
+                Through.objects.bulk_create(
+                    (
+                        Through(post_id=item["post"], tag_id=tag_id)
+                        for item in items
+                        for tag_id in item["tags"]
+                    ),
+                    ignore_conflicts=True,
+                )
+            else:
+                condition = Q()
+                for item in items:
+                    condition |= Q(post_id=item["post"], tag_id__in=item["tags"])
+                Through.objects.filter(condition).delete()
+            # no m2m_changed either
+            touch_posts(post_ids)
+            # updated_at is the lastmod of the sitemaps, the category pages
+            # show the tags on the cards
+            category_ids = Post.objects.filter(pk__in=post_ids).values_list(
+                "category_id", flat=True
+            )
+            invalidate_listing_pages(category_ids, tag_ids, post_ids)
+
+        return Response(
+            {
+                "success": f"Tags were successfully {'added' if action == 'add' else 'removed'}.",
+                "data": {"posts": post_ids},
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class SectionsViewSet(APIView):
+    """
+    The latest published posts of each category, the tabs of "What's New"
+    on the home page by default. `?categories=1,2` picks the categories and
+    their order, `?limit=` the posts per category, up to MAX_SECTION_POSTS.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        limit = self.get_limit(request)
+        categories = request.query_params.get("categories")
+        if categories is not None:
+            ids = self.get_category_ids(categories)
+            by_id = Category.objects.in_bulk(ids)
+            categories = [by_id[pk] for pk in ids if pk in by_id]
+        sections = get_sections(categories, limit)
+        context = {"request": request}
+        return Response(
+            {
+                "success": True,
+                "data": [
+                    {
+                        "category": CategorySerializer(category).data,
+                        "posts": PostCardSerializer(
+                            posts, many=True, context=context
+                        ).data,
+                    }
+                    for category, posts in sections.items()
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def get_limit(self, request):
+        limit = request.query_params.get("limit")
+        if limit is None:
+            return SECTION_POSTS
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_SECTION_POSTS:
+            raise exceptions.ValidationError(
+                {"limit": [f"Must be between 1 and {MAX_SECTION_POSTS}."]}
+            )
+        return limit
+
+    def get_category_ids(self, categories):
+        try:
+            ids = [int(pk) for pk in categories.split(",")]
+        except ValueError:
+            raise exceptions.ValidationError(
+                {"categories": ["Must be comma separated category ids."]}
+            )
+        return list(dict.fromkeys(ids))
+
+
+class ExportViewSet(APIView):
+    """
+    Streams every row of `name` (posts, comments, newsletters, contacts) as
+    NDJSON, or CSV with `?output=csv`, oldest change first. `?since=` an ISO
+    8601 date or datetime only exports the rows updated at or after it.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, name, *args, **kwargs):
+        if name not in export.EXPORTS:
+            raise Http404
+        output = request.query_params.get("output", "ndjson")
+        if output not in export.FORMATS:
+            raise exceptions.ValidationError(
+                {"output": [f"Must be one of {', '.join(export.FORMATS)}."]}
+            )
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = export.parse_since(since)
+            except ValueError as e:
+                raise exceptions.ValidationError({"since": [str(e)]})
+        # read a chunk at a time off the event loop under ASGI
+        response = AsyncStreamingHttpResponse(
+            export.export_lines(name, output, since or None),
+            content_type=export.FORMATS[output],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{name}.{output}"'
+        return response
+
+
 class NewsletterViewSet(viewsets.ModelViewSet):
     """
     1. allows admin to view newsletter.
@@ -193,17 +563,34 @@ class NewsletterViewSet(viewsets.ModelViewSet):
         raise exceptions.MethodNotAllowed(request.method)
 
 
-class CommentViewSet(APIView):
+class CommentViewSet(ConditionalGetMixin, APIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = CommentSerializer
 
+    def get_validator_querysets(self):
+        # new, edited and deleted comments touch the post's updated_at, one
+        # row instead of the whole thread
+        return [Post.objects.filter(pk=self.kwargs["post_id"])]
+
     def get(self, request, post_id, *args, **kwargs):
-        comments = Comment.objects.filter(post=post_id).order_by("-created_at")
+        return self.conditional(self.list, request, post_id, *args, **kwargs)
+
+    def list(self, request, post_id, *args, **kwargs):
+        """
+        A page of comments, oldest first. `?cursor=` from `next` for the
+        following page, `?page_size=` up to 100.
+        """
+        paginator = CommentPagination()
+        comments = paginator.paginate_queryset(
+            Comment.objects.filter(post=post_id), request, view=self
+        )
         serializer = self.serializer_class(comments, many=True)
         return Response(
             {
                 "success": "Comment was successfully fetched.",
                 "data": serializer.data,
+                "next": paginator.get_link(paginator.page.next_cursor),
+                "previous": paginator.get_link(paginator.page.previous_cursor),
             },
             status=status.HTTP_200_OK,
         )
@@ -0,0 +1,175 @@
+"""
+Previous/next links of the detail page, over all the published posts and
+within the post's category, in id order. PostAdjacency stores them for every
+published post so the detail page reads them along with the post. They are
+updated when posts get published, unpublished, moved to another category or
+deleted, with a fixed number of queries however many posts change at once.
+"""
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import Lag, Lead
+
+from newspaper_app.models import Post, PostAdjacency
+
+NEIGHBOURS = ("previous", "next", "previous_in_category", "next_in_category")
+NEIGHBOUR_ANNOTATIONS = [f"{name}_neighbour" for name in NEIGHBOURS]
+
+
+def listed_posts(posts=None):
+    if posts is None:
+        posts = Post.objects.all()
+    return posts.filter(status="active", published_at__isnull=False)
+
+
+def is_listed(post):
+    return post.status == "active" and post.published_at is not None
+
+
+def first_post(queryset, order):
+    return Subquery(queryset.order_by(order).values("post")[:1])
+
+
+def refresh(post_ids):
+    """
+    Work out and store the neighbours of the rows of `post_ids`. Two
+    queries, returns the ids of the neighbours.
+
+    The neighbours are looked up among the rows rather than the posts: the
+    primary key and adjacency_category_idx give them with one index seek
+    each, where the posts table would be sorted by id for every one.
+    """
+    before = PostAdjacency.objects.filter(post__lt=OuterRef("post"))
+    after = PostAdjacency.objects.filter(post__gt=OuterRef("post"))
+    rows = (
+        PostAdjacency.objects.filter(post__in=post_ids)
+        .annotate(
+            previous_neighbour=first_post(before, "-post"),
+            next_neighbour=first_post(after, "post"),
+            previous_in_category_neighbour=first_post(
+                before.filter(category=OuterRef("category")), "-post"
+            ),
+            next_in_category_neighbour=first_post(
+                after.filter(category=OuterRef("category")), "post"
+            ),
+        )
+        .values_list("post", "category", *NEIGHBOUR_ANNOTATIONS)
+    )
+    adjacencies = [
+        PostAdjacency(
+            post_id=post_id,
+            category_id=category_id,
+            **{f"{name}_id": neighbour for name, neighbour in zip(NEIGHBOURS, row)},
+        )
+        for post_id, category_id, *row in rows
+    ]
+    PostAdjacency.objects.bulk_create(
+        adjacencies,
+        update_conflicts=True,
+        unique_fields=["post"],
+        update_fields=NEIGHBOURS,
+    )
+    return {
+        getattr(adjacency, f"{name}_id")
+        for adjacency in adjacencies
+        for name in NEIGHBOURS
+    } - {None}
+
+
+@transaction.atomic
+def link_posts(post_ids):
+    """
+    `post_ids` just got published: add their rows, link them and repoint
+    their neighbours.
+    """
+    post_ids = set(post_ids)
+    PostAdjacency.objects.bulk_create(
+        [
+            PostAdjacency(post_id=post_id, category_id=category_id)
+            for post_id, category_id in listed_posts()
+            .filter(pk__in=post_ids)
+            .values_list("id", "category_id")
+        ],
+        update_conflicts=True,
+        unique_fields=["post"],
+        update_fields=["category"],
+    )
+    refresh(refresh(post_ids) - post_ids)
+
+
+@transaction.atomic
+def unlink_posts(post_ids):
+    """
+    `post_ids` are no longer published or about to be deleted: drop their
+    rows and link their neighbours to each other.
+    """
+    post_ids = set(post_ids)
+    rows = PostAdjacency.objects.filter(post__in=post_ids)
+    neighbours = {
+        neighbour
+        for row in rows.values_list(*(f"{name}_id" for name in NEIGHBOURS))
+        for neighbour in row
+    }
+    rows.delete()
+    refresh(neighbours - post_ids - {None})
+
+
+@transaction.atomic
+def sync_post(post):
+    """
+    After `post` was saved, (un)link it if it got published, unpublished
+    or moved to another category. One query when nothing changed.
+    """
+    category_id = (
+        PostAdjacency.objects.filter(post=post)
+        .values_list("category", flat=True)
+        .first()
+    )
+    if is_listed(post) and category_id == post.category_id:
+        return
+    if category_id is not None:
+        unlink_posts([post.pk])
+    if is_listed(post):
+        link_posts([post.pk])
+
+
+def get_neighbours(post):
+    # read with select_related("adjacency__previous", ...)
+    try:
+        adjacency = post.adjacency
+    except PostAdjacency.DoesNotExist:
+        return dict.fromkeys(NEIGHBOURS)
+    return {name: getattr(adjacency, name) for name in NEIGHBOURS}
+
+
+def rebuild(batch_size=2000, posts=None, model=PostAdjacency):
+    """
+    Rebuild every row from scratch with one window query, returns the
+    number of published posts. The migration passes its own `posts` and
+    `model`.
+    """
+    by_id = {"order_by": F("id").asc()}
+    in_category = {**by_id, "partition_by": [F("category")]}
+    rows = (
+        listed_posts(posts=posts)
+        .annotate(
+            previous_neighbour=Window(Lag("id"), **by_id),
+            next_neighbour=Window(Lead("id"), **by_id),
+            previous_in_category_neighbour=Window(Lag("id"), **in_category),
+            next_in_category_neighbour=Window(Lead("id"), **in_category),
+        )
+        .values_list("id", "category_id", *NEIGHBOUR_ANNOTATIONS)
+    )
+    model.objects.all().delete()
+    adjacencies = model.objects.bulk_create(
+        (
+            model(
+                post_id=post_id,
+                category_id=category_id,
+                **{f"{name}_id": neighbour for name, neighbour in zip(NEIGHBOURS, row)},
+            )
+            for post_id, category_id, *row in rows
+        ),
+        batch_size=batch_size,
+    )
+    return len(adjacencies)
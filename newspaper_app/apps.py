@@ -1,6 +1,19 @@
+import atexit
+
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class NewspaperAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "newspaper_app"
+
+    def ready(self):
+        from newspaper_app import signals  # noqa: F401
+        from newspaper_app.metrics import install_query_wrapper
+        from newspaper_app.view_counter import view_counter
+
+        connection_created.connect(install_query_wrapper)
+
+        # write whatever is still buffered when the process shuts down
+        atexit.register(view_counter.flush)
@@ -0,0 +1,77 @@
+"""
+Streaming responses that don't block the event loop, for NEWSPAPER/asgi.py.
+
+Django 4.1's ASGIHandler iterates a StreamingHttpResponse on the event loop,
+so every chunk it reads (rows of an export) holds up every other request of
+the worker, and the ORM refuses to run there at all. The handler here
+iterates an AsyncStreamingHttpResponse with `async for` instead: each chunk
+is read by sync_to_async() in the request's own thread, the same one each
+time for the open cursor. Under WSGI the response streams like any other.
+"""
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+from django.http import StreamingHttpResponse
+
+# next() can't raise StopIteration through sync_to_async
+_done = object()
+
+
+class AsyncIterator:
+    """`iterable` read one step at a time with sync_to_async()."""
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await sync_to_async(next, thread_sensitive=True)(self.iterator, _done)
+        if chunk is _done:
+            raise StopAsyncIteration
+        return chunk
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    def __aiter__(self):
+        # the middleware may have replaced streaming_content, this goes
+        # through whatever it is now
+        return AsyncIterator(self)
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    async def send_response(self, response, send):
+        if not isinstance(response, AsyncStreamingHttpResponse):
+            return await super().send_response(response, send)
+        headers = [
+            (header.encode("ascii"), value.encode("latin1"))
+            for header, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": headers,
+            }
+        )
+        try:
+            async for part in response:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            await send({"type": "http.response.body"})
+        finally:
+            # closes the cursor and the connection of the request's thread
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIHandler()
@@ -0,0 +1,11 @@
+"""
+Helpers for the async views. Django 4.1 runs every async ORM call through
+thread-sensitive sync_to_async: the queries of a request still run one at
+a time on a single thread, gathering them gains nothing. What the async
+views gain is an event loop that serves other requests, e.g. slow clients,
+while the queries run.
+"""
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
@@ -0,0 +1,249 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from newspaper_app.metrics import registry
+
+# GET on these changes data, never hit them
+UNSAFE_URL_NAMES = {
+    "post-delete",
+    "post-publish",
+    "tag-delete",
+    "category-delete",
+    "logout",
+}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def iter_patterns(patterns, prefix=""):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(
+                pattern.url_patterns, prefix + str(pattern.pattern)
+            )
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), pattern
+
+
+def named_urls(modules):
+    """
+    (name, route) of every named URL whose view lives in one of `modules`.
+    """
+    seen = set()
+    for route, pattern in iter_patterns(get_resolver().url_patterns):
+        view = getattr(pattern.callback, "view_class", pattern.callback)
+        if (
+            pattern.name
+            and pattern.name not in seen
+            and view.__module__.split(".")[0] in modules
+        ):
+            seen.add(pattern.name)
+            yield pattern.name, route
+
+
+def render_seconds():
+    # what MetricsMiddleware recorded rendering templates, all views
+    with registry.lock:
+        return sum(row[-2] for row in registry.render_time.values.values())
+
+
+def measure(client, url, runs, setup=None):
+    """
+    Request `url` `runs` times, returns latency and template render time
+    percentiles in milliseconds, the queries and bytes of the last response.
+    `setup` runs before every request, outside of the timing.
+    """
+    timings = []
+    render_timings = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        with CaptureQueriesContext(connection) as queries:
+            rendered = render_seconds()
+            start = time.perf_counter()
+            response = client.get(url)
+            if getattr(response, "streaming", False):
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            timings.append((time.perf_counter() - start) * 1000)
+            render_timings.append((render_seconds() - rendered) * 1000)
+    return {
+        "url": url,
+        "status": response.status_code,
+        "runs": runs,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "render_p50_ms": round(percentile(render_timings, 50), 3),
+        "queries": len(queries),
+        "query_ms": round(
+            sum(float(query["time"] or 0) for query in queries.captured_queries) * 1000,
+            3,
+        ),
+        "bytes": size,
+    }
+
+
+def benchmark_client(user=None):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def allow_test_client():
+    # the test client sends Host: testserver
+    return override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+
+
+def summarize(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+    }
+
+
+def split_url(url):
+    path, _, query_string = url.partition("?")
+    return path, query_string
+
+
+def wsgi_throughput(application, urls, requests, workers, client_delay=0):
+    """
+    `requests` GETs spread over `urls`, served by `workers` threads like a
+    threaded WSGI server. A slow client holds its worker while it reads,
+    `client_delay` seconds per response.
+    """
+    statuses = set()
+
+    def call(url):
+        path, query_string = split_url(url)
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "QUERY_STRING": query_string,
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "HTTP_HOST": "testserver",
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.url_scheme": "http",
+            "wsgi.input": BytesIO(),
+            "wsgi.errors": sys.stderr,
+        }
+        start = time.perf_counter()
+        response = application(
+            environ, lambda status, headers: statuses.add(int(status.split()[0]))
+        )
+        try:
+            for chunk in response:
+                time.sleep(client_delay)
+        finally:
+            response.close()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(call, (urls[i % len(urls)] for i in range(requests))))
+    return {**summarize(latencies, time.perf_counter() - start), "statuses": statuses}
+
+
+async def asgi_throughput(application, urls, requests, concurrency, client_delay=0):
+    """
+    The same GETs through the ASGI application on one event loop, with up
+    to `concurrency` connections open at once.
+    """
+    statuses = set()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(url):
+        path, query_string = split_url(url)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query_string.encode(),
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.add(message["status"])
+            elif message["type"] == "http.response.body":
+                await asyncio.sleep(client_delay)
+
+        async with semaphore:
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(
+        *(call(urls[i % len(urls)]) for i in range(requests))
+    )
+    return {**summarize(latencies, time.perf_counter() - start), "statuses": statuses}
+
+
+def database_throughput(alias, operations, workers, close_connections=True):
+    """
+    Run `operations`, callables taking a database alias, on `workers`
+    threads like the requests of a threaded server. With
+    `close_connections` each one ends the way a request does, closing the
+    connection unless CONN_MAX_AGE keeps it. "database is locked" and other
+    database errors are counted, not raised.
+    """
+    errors = Counter()
+
+    def call(operation):
+        start = time.perf_counter()
+        try:
+            operation(alias)
+        except DatabaseError as e:
+            errors[str(e)] += 1
+        finally:
+            if close_connections:
+                connections[alias].close_if_unusable_or_obsolete()
+        return (time.perf_counter() - start) * 1000
+
+    # one call per thread, each waits for the others so none takes two
+    barrier = threading.Barrier(workers)
+
+    def close(_):
+        barrier.wait()
+        connections[alias].close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(call, operations))
+        elapsed = time.perf_counter() - start
+        list(pool.map(close, range(workers)))
+    return {**summarize(latencies, elapsed), "errors": dict(errors)}
@@ -0,0 +1,74 @@
+"""
+Comment threads are read a page at a time, oldest first on (created_at, id)
+with KeysetPaginator, each page is a range scan of comment_thread_idx.
+
+Post.comment_count keeps the number of comments of a post so the listings
+don't count them per post. The Comment signals add and remove one as comments
+are created and deleted; bulk writes skip signals, reconcile_comment_counts()
+(the `reconcile_comment_counts` command) repairs the counts afterwards.
+"""
+
+from django.conf import settings
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from newspaper_app.models import Comment, Post
+from newspaper_app.pagination import KeysetPaginator
+
+COMMENT_ORDERING = ("created_at", "id")
+
+
+def get_page_size():
+    return getattr(settings, "COMMENTS_PAGE_SIZE", 20)
+
+
+def comment_paginator(post_id, per_page=None):
+    # no COUNT(*), the count is on the post
+    return KeysetPaginator(
+        Comment.objects.filter(post=post_id),
+        per_page or get_page_size(),
+        ordering=COMMENT_ORDERING,
+        count=False,
+    )
+
+
+def count_comments(post_ids, delta):
+    # also touches updated_at, the API and detail page validators read it
+    Post.objects.filter(pk__in=post_ids).update(
+        # never below 0, even after drifting
+        comment_count=Greatest(F("comment_count") + delta, 0),
+        updated_at=timezone.now(),
+    )
+
+
+def reconcile_comment_counts(batch_size=10000, posts=None, comments=None):
+    """
+    Recount the comments of every post, one UPDATE per `batch_size` ids that
+    only writes the posts whose count drifted. Returns how many were fixed.
+    The migration passes its own `posts` and `comments`.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    if comments is None:
+        comments = Comment.objects.all()
+    actual = Coalesce(
+        Subquery(
+            comments.filter(post=OuterRef("pk"))
+            .order_by()
+            .values("post")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+    last_id = posts.aggregate(last=Max("id"))["last"] or 0
+    fixed = 0
+    now = timezone.now()
+    for start in range(0, last_id, batch_size):
+        fixed += (
+            posts.filter(id__gt=start, id__lte=start + batch_size)
+            .exclude(comment_count=actual)
+            .update(comment_count=actual, updated_at=now)
+        )
+    return fixed
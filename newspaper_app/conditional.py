@@ -0,0 +1,105 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+VALIDATOR_AGGREGATES = {"last_updated": Max("updated_at"), "count": Count("pk")}
+
+
+def get_validators(querysets, extra=()):
+    """
+    (ETag, Last-Modified timestamp) of a response built from `querysets`,
+    from one MAX(updated_at)/COUNT(*) aggregate each, no row is loaded.
+    The count catches deletes, `extra` anything else the response shows.
+    Last-Modified is None when every queryset is empty.
+    """
+    return make_validators(
+        [
+            queryset.order_by().aggregate(**VALIDATOR_AGGREGATES)
+            for queryset in querysets
+        ],
+        extra,
+    )
+
+
+async def aget_validators(querysets, extra=()):
+    aggregates = [
+        await queryset.order_by().aaggregate(**VALIDATOR_AGGREGATES)
+        for queryset in querysets
+    ]
+    return make_validators(aggregates, extra)
+
+
+def make_validators(aggregates, extra):
+    parts = [str(value) for value in extra]
+    last_modified = None
+    for aggregate in aggregates:
+        last_updated = aggregate["last_updated"]
+        parts += [last_updated.isoformat() if last_updated else "", aggregate["count"]]
+        if last_updated and (last_modified is None or last_updated > last_modified):
+            last_modified = last_updated
+    etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+    return etag, last_modified and int(last_modified.timestamp())
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET with 304 Not Modified when the If-None-Match or
+    If-Modified-Since of the request still match, before the view fetches,
+    renders or serializes anything. Views list the querysets the response
+    is built from in `get_validator_querysets()`.
+    """
+
+    # off for responses that also depend on `get_validator_extra()`,
+    # a bare If-Modified-Since can't see those change
+    send_last_modified = True
+
+    def get_validator_querysets(self):
+        return []
+
+    def get_validator_extra(self):
+        return []
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = get_validators(
+            self.get_validator_querysets(), self.get_validator_extra()
+        )
+        if not self.send_last_modified:
+            last_modified = None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+        return self.set_validators(
+            handler(request, *args, **kwargs), etag, last_modified
+        )
+
+    async def aconditional(self, handler, request, *args, **kwargs):
+        # the extra values may read request.user, loaded from the database
+        extra = await sync_to_async(self.get_validator_extra)()
+        etag, last_modified = await aget_validators(
+            self.get_validator_querysets(), extra
+        )
+        if not self.send_last_modified:
+            last_modified = None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+        return self.set_validators(
+            await handler(request, *args, **kwargs), etag, last_modified
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        if response.status_code == 200 and not response.has_header("ETag"):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        return self.conditional(super().get, request, *args, **kwargs)
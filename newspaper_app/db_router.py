@@ -0,0 +1,128 @@
+"""
+Read replicas. The reads of a request go to one of DATABASE_REPLICAS, writes
+and everything outside of requests (commands, background threads) to
+`default`.
+
+A replica lags behind the primary, so a client reads from the primary:
+
+- for the rest of a request once it wrote anything, a GET included (e.g.
+  publishing a post),
+- for the whole of a POST/PUT/PATCH/DELETE request,
+- for REPLICA_MAX_LAG seconds after such a request, through a cookie, so
+  the page it redirects to shows the new comment or post.
+
+Shared page caches can't stick to the primary. For REPLICA_MAX_LAG seconds
+after a version bump, the pages and snapshots cached are only kept that long,
+see snapshot_timeout() in versioning.py.
+
+Without DATABASE_REPLICAS everything reads from `default`.
+"""
+
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PRIMARY = "default"
+PRIMARY_COOKIE = "use_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# the routing of the request being served, None outside of a request
+_current = ContextVar("db_routing", default=None)
+
+
+def get_replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def get_max_lag():
+    return getattr(settings, "REPLICA_MAX_LAG", 5)
+
+
+class Routing:
+    def __init__(self, use_primary=False):
+        self.use_primary = use_primary
+        self.wrote = False
+        # picked on the first read, the request reads from the same replica
+        # throughout instead of one at random per query
+        self.replica = None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        routing = _current.get()
+        # commands and background threads read what they are about to write
+        if not replicas or routing is None or routing.use_primary:
+            return PRIMARY
+        if routing.replica is None:
+            routing.replica = random.choice(replicas)
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            # what this request reads next has to see the write
+            routing.use_primary = routing.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every database holds the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas copy the primary's schema
+        return db == PRIMARY
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Pins requests that write, and the requests of the same client in the
+    next REPLICA_MAX_LAG seconds, to the primary. Works under WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.get_routing(request)
+        token = _current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.stick(routing, response)
+
+    async def __acall__(self, request):
+        routing = self.get_routing(request)
+        token = _current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.stick(routing, response)
+
+    def get_routing(self, request):
+        return Routing(
+            use_primary=request.method not in SAFE_METHODS
+            or PRIMARY_COOKIE in request.COOKIES
+        )
+
+    def stick(self, routing, response):
+        if routing.wrote and get_replicas():
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                "1",
+                max_age=get_max_lag(),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,135 @@
+"""
+Streaming exports of the posts, comments, newsletter subscribers and contact
+messages as NDJSON or CSV, used by the export API and the `export_data`
+command. Rows are read with QuerySet.iterator() a chunk at a time and every
+chunk is written out before the next one is read, so memory use stays the
+same whatever the number of rows.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from newspaper_app.models import Comment, Contact, Newsletter, Post
+
+EXPORT_CHUNK_SIZE = 2000
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# name => (model, columns), "tags" of the posts comes from the through table
+EXPORTS = {
+    "posts": (
+        Post,
+        (
+            "id",
+            "title",
+            "content",
+            "featured_image",
+            "status",
+            "published_at",
+            "views_count",
+            "author_id",
+            "category_id",
+            "tags",
+            "created_at",
+            "updated_at",
+        ),
+    ),
+    "comments": (
+        Comment,
+        ("id", "post_id", "comment", "name", "email", "created_at", "updated_at"),
+    ),
+    "newsletters": (Newsletter, ("id", "email", "created_at", "updated_at")),
+    "contacts": (
+        Contact,
+        ("id", "subject", "message", "name", "email", "created_at", "updated_at"),
+    ),
+}
+
+
+def parse_since(value):
+    """
+    The `since` filter from an ISO 8601 date or datetime, naive values are
+    in the current time zone. Raises ValueError on anything else.
+    """
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(f"{value!r} is not an ISO 8601 date or datetime.")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_chunks(name, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Lists of up to `chunk_size` row dicts of `name`, oldest change first,
+    only the rows updated at or after `since` when given. `since` is
+    inclusive: start the next export from the last `updated_at` seen, rows
+    sharing that timestamp come again rather than being missed.
+    """
+    model, columns = EXPORTS[name]
+    fields = [column for column in columns if column != "tags"]
+    # (updated_at, id) index
+    queryset = model.objects.order_by("updated_at", "id").values(*fields)
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        if "tags" in columns:
+            add_tags(chunk)
+        yield chunk
+
+
+def add_tags(posts):
+    # one query per chunk
+    tags = {post["id"]: [] for post in posts}
+    through = (
+        Post.tag.through.objects.filter(post_id__in=tags)
+        .order_by("post_id", "tag_id")
+        .values_list("post_id", "tag_id")
+    )
+    for post_id, tag_id in through:
+        tags[post_id].append(tag_id)
+    for post in posts:
+        post["tags"] = tags[post["id"]]
+
+
+def to_csv(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(str(item) for item in value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class Echo:
+    # csv.writer target that hands the line back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def export_lines(name, output="ndjson", since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    The export of `name` in the `output` format, one string per chunk of
+    rows. CSV starts with the column names.
+    """
+    columns = EXPORTS[name][1]
+    if output == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for chunk in export_chunks(name, since, chunk_size):
+            yield "".join(
+                writer.writerow([to_csv(row[column]) for column in columns])
+                for row in chunk
+            )
+    else:
+        for chunk in export_chunks(name, since, chunk_size):
+            yield "".join(
+                json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in chunk
+            )
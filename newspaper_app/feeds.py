@@ -0,0 +1,125 @@
+from functools import partial
+
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse, reverse_lazy
+from django.utils.feedgenerator import Atom1Feed
+
+from newspaper_app.models import Category, Post, Tag
+from newspaper_app.page_cache import (
+    LAYOUT_VERSION,
+    PAGES_VERSION,
+    cached_response,
+    category_version,
+    tag_version,
+)
+
+FEED_ITEMS = 20
+
+
+class PostFeed(Feed):
+    """
+    The latest published posts. The feeds are the same for every reader and
+    cached under the versions of the pages listing the same posts, so
+    publishing, editing or deleting a post only drops the feeds it is on.
+    """
+
+    title = "NewsPaper"
+    link = reverse_lazy("post-list")
+    description = "The latest news."
+
+    def __call__(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            self.get_cache_versions(*args, **kwargs),
+            partial(super().__call__, request, *args, **kwargs),
+            "feed",
+        )
+
+    def get_cache_versions(self, *args, **kwargs):
+        # the items list the tag names
+        return [LAYOUT_VERSION, PAGES_VERSION]
+
+    def get_queryset(self, obj):
+        return Post.objects.filter(status="active", published_at__isnull=False)
+
+    def items(self, obj):
+        return (
+            self.get_queryset(obj)
+            .select_related("author")
+            .prefetch_related("tag")
+            .order_by("-published_at", "-id")[:FEED_ITEMS]
+        )
+
+    def item_title(self, post):
+        return post.title
+
+    def item_description(self, post):
+        return post.excerpt
+
+    def item_link(self, post):
+        return reverse("post-detail", args=[post.pk])
+
+    def item_pubdate(self, post):
+        return post.published_at
+
+    def item_updateddate(self, post):
+        return post.updated_at
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return [tag.name for tag in post.tag.all()]
+
+
+class CategoryPostFeed(PostFeed):
+    def get_object(self, request, cat_id):
+        return get_object_or_404(Category, pk=cat_id)
+
+    def get_cache_versions(self, cat_id):
+        return [LAYOUT_VERSION, category_version(cat_id)]
+
+    def get_queryset(self, category):
+        return super().get_queryset(category).filter(category=category)
+
+    def title(self, category):
+        return f"NewsPaper: {category.name}"
+
+    def link(self, category):
+        return reverse("post-by-category", args=[category.pk])
+
+    def description(self, category):
+        return f"The latest {category.name} news."
+
+
+class TagPostFeed(PostFeed):
+    def get_object(self, request, tag_id):
+        return get_object_or_404(Tag, pk=tag_id)
+
+    def get_cache_versions(self, tag_id):
+        return [LAYOUT_VERSION, tag_version(tag_id)]
+
+    def get_queryset(self, tag):
+        return super().get_queryset(tag).filter(tag=tag)
+
+    def title(self, tag):
+        return f"NewsPaper: {tag.name}"
+
+    def link(self, tag):
+        return reverse("post-by-tag", args=[tag.pk])
+
+    def description(self, tag):
+        return f"The latest news tagged {tag.name}."
+
+
+class AtomPostFeed(PostFeed):
+    feed_type = Atom1Feed
+
+
+class AtomCategoryPostFeed(CategoryPostFeed):
+    feed_type = Atom1Feed
+
+
+class AtomTagPostFeed(TagPostFeed):
+    feed_type = Atom1Feed
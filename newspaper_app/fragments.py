@@ -0,0 +1,57 @@
+"""
+Template fragments that are the same on many pages, cached with the
+{% fragment %} tag of templatetags/fragments.py:
+
+    {% fragment "popular" recent_posts %} ... {% endfragment %}
+
+The key is the fragment's name, FRAGMENTS_VERSION and the values it varies
+on, posts and categories by primary key. The signals bump FRAGMENTS_VERSION
+whenever a post, category or tag is saved or deleted. A hit skips the
+rendering and the queries of the attributes the loops read (e.g.
+`post.category.name`).
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model, QuerySet
+
+from newspaper_app.metrics import record_cache
+from newspaper_app.versioning import get_version, snapshot_timeout
+
+FRAGMENTS_VERSION = "fragments"
+
+
+def get_timeout():
+    return getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 600)
+
+
+def vary_value(value):
+    if isinstance(value, Model):
+        return value.pk
+    if isinstance(value, (list, tuple, QuerySet)):
+        return [vary_value(item) for item in value]
+    return value
+
+
+def fragment_key(name, vary_on):
+    values = repr([vary_value(value) for value in vary_on])
+    digest = hashlib.md5(values.encode()).hexdigest()
+    return f"fragment:{name}:{get_version(FRAGMENTS_VERSION)}:{digest}"
+
+
+def cached_fragment(name, vary_on, render):
+    """
+    The cached fragment `name` for `vary_on`, rendered with `render()` on a
+    miss.
+    """
+    key = fragment_key(name, vary_on)
+    content = cache.get(key)
+    record_cache("fragment", content is not None)
+    if content is None:
+        content = render()
+        timeout = snapshot_timeout([FRAGMENTS_VERSION], get_timeout())
+        if timeout > 0:
+            cache.set(key, content, timeout)
+    return content
@@ -0,0 +1,144 @@
+import json
+import logging
+import re
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from newspaper_app.benchmark import (
+    UNSAFE_URL_NAMES,
+    allow_test_client,
+    benchmark_client,
+    measure,
+    named_urls,
+)
+from newspaper_app.models import Category, Comment, Newsletter, Post, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every URL of newspaper_app and api through the test client "
+        "and report p50/p95 latency, query count and bytes per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument(
+            "--user",
+            help="Username to log in as for the pages that need it, "
+            "defaults to the first staff user.",
+        )
+        parser.add_argument(
+            "--cold", action="store_true", help="Clear the cache before each request."
+        )
+        parser.add_argument("--only", help="Regex the URL names must match.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def get_sample_kwargs(self):
+        def first_pk(model, **filters):
+            return model.objects.filter(**filters).values_list("pk", flat=True).first()
+
+        post_id = first_pk(Post, status="active", published_at__isnull=False)
+        tag_id = first_pk(Tag)
+        category_id = first_pk(Category)
+        return {
+            "pk": post_id,
+            "post_id": (
+                Comment.objects.order_by("-id").values_list("post", flat=True).first()
+                or post_id
+            ),
+            "cat_id": category_id,
+            "tag_id": tag_id,
+            "section": "posts",
+            # per URL name
+            "draft-detail": {"pk": first_pk(Post, published_at__isnull=True)},
+            "tag-update": {"pk": tag_id},
+            "tag-detail": {"pk": tag_id},
+            "category-update": {"pk": category_id},
+            "category-detail": {"pk": category_id},
+            "user-detail": {"pk": first_pk(User)},
+            "group-detail": {"pk": first_pk(Group)},
+            "newsletter-detail": {"pk": first_pk(Newsletter)},
+        }
+
+    def build_url(self, name, route, samples):
+        samples = {**samples, **samples.get(name, {})}
+
+        def value(match):
+            key = match.group("key")
+            if samples.get(key) is None:
+                raise LookupError(key)
+            return str(samples[key])
+
+        url = "/" + route.replace("^", "").replace("$", "").replace("\\Z", "")
+        try:
+            # router regex groups (?P<pk>[^/.]+) and path converters <int:pk>
+            url = re.sub(r"\(\?P<(?P<key>\w+)>[^)]*\)", value, url)
+            url = re.sub(r"<(?:\w+:)?(?P<key>\w+)>", value, url)
+        except LookupError:
+            return None
+        if name in ("post-search", "post-search-api"):
+            url += "?query=nepal"
+        return url
+
+    def handle(self, *args, **options):
+        # 403/405 probes would log a warning each
+        logger = logging.getLogger("django.request")
+        level = logger.level
+        logger.setLevel(logging.ERROR)
+        try:
+            with allow_test_client():
+                self.run(**options)
+        finally:
+            logger.setLevel(level)
+
+    def run(self, **options):
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']}.")
+        else:
+            user = User.objects.filter(is_staff=True).order_by("pk").first()
+
+        samples = self.get_sample_kwargs()
+        anonymous, logged_in = benchmark_client(), benchmark_client(user)
+        only = re.compile(options["only"]) if options["only"] else None
+
+        results = []
+        for name, route in named_urls({"newspaper_app", "api"}):
+            if name in UNSAFE_URL_NAMES or (only and not only.search(name)):
+                continue
+            url = self.build_url(name, route, samples)
+            if url is None:
+                self.stderr.write(f"Skipped {name}: no sample data for {route}")
+                continue
+            client = anonymous
+            status = anonymous.get(url).status_code
+            # the login-only pages redirect anonymous visitors, log in for them
+            if user is not None and status in (302, 401, 403):
+                client = logged_in
+                status = client.get(url).status_code
+            if status == 405:
+                continue  # POST only
+            if options["cold"]:
+                result = measure(client, url, options["runs"], setup=cache.clear)
+            else:
+                client.get(url)  # warm up
+                result = measure(client, url, options["runs"])
+            result["name"] = name
+            result["logged_in"] = client is logged_in
+            results.append(result)
+            self.stdout.write(
+                f"{name:<24} {result['status']} p50 {result['p50_ms']:>9.2f}ms "
+                f"p95 {result['p95_ms']:>9.2f}ms "
+                f"render {result['render_p50_ms']:>8.2f}ms "
+                f"{result['queries']:>4} queries "
+                f"{result['bytes']:>9} bytes"
+            )
+
+        report = {"runs": options["runs"], "cold": options["cold"], "results": results}
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
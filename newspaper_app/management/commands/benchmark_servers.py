@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+from newspaper_app.asgi import ASGIHandler
+from newspaper_app.benchmark import allow_test_client, asgi_throughput, wsgi_throughput
+from newspaper_app.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of the WSGI and ASGI applications under many "
+        "concurrent connections, in process, without a network in between."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=100,
+            help="Connections open at once on the ASGI event loop.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="WSGI worker threads, a request holds one until it is sent.",
+        )
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0,
+            help="Milliseconds a slow client takes to read a response.",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Use the dummy cache so every request runs the view.",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def get_urls(self):
+        post = (
+            Post.objects.filter(status="active", published_at__isnull=False)
+            .order_by("-published_at")
+            .first()
+        )
+        if post is None:
+            raise CommandError("No published post, run seed_data first.")
+        return [
+            reverse("home"),
+            reverse("post-detail", args=[post.pk]),
+            reverse("post-list"),
+            reverse("post-search") + "?query=nepal",
+            reverse("posts-list") + "?count=false",
+            reverse("comments-api", args=[post.pk]),
+        ]
+
+    def handle(self, *args, **options):
+        settings = {}
+        if options["no_cache"]:
+            settings["CACHES"] = {
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            }
+        with allow_test_client(), override_settings(**settings):
+            report = self.run(**options)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def run(self, **options):
+        urls = self.get_urls()
+        delay = options["client_delay"] / 1000
+        results = {
+            "wsgi": wsgi_throughput(
+                WSGIHandler(), urls, options["requests"], options["workers"], delay
+            ),
+            "asgi": asyncio.run(
+                asgi_throughput(
+                    ASGIHandler(),
+                    urls,
+                    options["requests"],
+                    options["concurrency"],
+                    delay,
+                )
+            ),
+        }
+        for name, result in results.items():
+            result["statuses"] = sorted(result["statuses"])
+            self.stdout.write(
+                f"{name}  {result['requests_per_second']:>8} req/s  "
+                f"p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+                f"statuses {result['statuses']}"
+            )
+        return {
+            "urls": urls,
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "workers": options["workers"],
+            "client_delay_ms": options["client_delay"],
+            "results": results,
+        }
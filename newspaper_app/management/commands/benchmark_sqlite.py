@@ -0,0 +1,177 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.db.utils import ConnectionHandler
+
+from newspaper_app.benchmark import database_throughput
+from newspaper_app.models import Comment, Newsletter, Post, PostView
+
+# the plain backend with a connection per request, then the tuned one
+PROFILES = {
+    "before": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "CONN_MAX_AGE": 0,
+        "journal_mode": "delete",
+    },
+    "after": {
+        "ENGINE": "newspaper_app.sqlite",
+        "CONN_MAX_AGE": 600,
+        "journal_mode": "wal",
+    },
+}
+
+
+def read_post(alias, post_id):
+    # the detail page: the post and its first comments
+    Post.objects.using(alias).select_related("author", "category").filter(
+        pk=post_id
+    ).first()
+    list(Comment.objects.using(alias).filter(post=post_id).order_by("created_at")[:20])
+
+
+def read_listing(alias, post_id):
+    list(
+        Post.objects.using(alias)
+        .filter(status="active", published_at__isnull=False)
+        .order_by("-published_at")
+        .values("id", "title", "excerpt")[:10]
+    )
+
+
+def write_comment(alias, post_id):
+    # reads the post, then writes, like the comment form and the count
+    with transaction.atomic(using=alias):
+        post = Post.objects.using(alias).only("id").get(pk=post_id)
+        Comment.objects.using(alias).bulk_create(
+            [Comment(post=post, comment="Benchmark", name="Bench", email="b@b.com")]
+        )
+        Post.objects.using(alias).filter(pk=post_id).update(
+            comment_count=F("comment_count") + 1
+        )
+
+
+def write_newsletter(alias, post_id):
+    Newsletter.objects.using(alias).bulk_create(
+        [Newsletter(email=f"bench{post_id}@example.com")]
+    )
+
+
+def write_views(alias, post_id):
+    # a view counter flush
+    with transaction.atomic(using=alias):
+        Post.objects.using(alias).filter(pk=post_id).update(
+            views_count=F("views_count") + 1
+        )
+        PostView.objects.using(alias).bulk_create([PostView(post_id=post_id, views=1)])
+
+
+def call(operation, post_id, alias):
+    operation(alias, post_id)
+
+
+READS = [read_post, read_listing]
+WRITES = [write_comment, write_newsletter, write_views]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of concurrent reads and writes on a copy of "
+        "the database, with Django's SQLite backend and a connection per "
+        "request (before) and with the tuned backend of newspaper_app.sqlite "
+        "and persistent connections (after)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operations", type=int, default=2000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Threads running operations at once, like server threads.",
+        )
+        parser.add_argument(
+            "--writes",
+            type=float,
+            default=0.2,
+            help="Share of the operations that write.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != "sqlite":
+            raise CommandError("The default database is not SQLite.")
+        post_ids = list(Post.objects.values_list("id", flat=True)[:1000])
+        if not post_ids:
+            raise CommandError("No posts, run seed_data first.")
+        tasks = self.get_tasks(post_ids, **options)
+
+        results = {}
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "bench.sqlite3")
+                self.copy(source, path, profile["journal_mode"])
+                results[name] = self.run(name, path, profile, tasks, options["workers"])
+            self.stdout.write(
+                f"{name:<6}  {results[name]['requests_per_second']:>8} ops/s  "
+                f"p50 {results[name]['p50_ms']:>8.2f}ms  "
+                f"p95 {results[name]['p95_ms']:>8.2f}ms  "
+                f"errors {sum(results[name]['errors'].values())}"
+            )
+        report = {
+            "operations": options["operations"],
+            "workers": options["workers"],
+            "writes": options["writes"],
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def get_tasks(self, post_ids, **options):
+        # the same operations in the same order for both profiles
+        rng = random.Random(options["seed"])
+        tasks = []
+        for _ in range(options["operations"]):
+            kinds = WRITES if rng.random() < options["writes"] else READS
+            operation, post_id = rng.choice(kinds), rng.choice(post_ids)
+            tasks.append(partial(call, operation, post_id))
+        return tasks
+
+    def copy(self, source, path, journal_mode):
+        start = time.perf_counter()
+        source.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            source.connection.backup(target)
+            target.execute(f"PRAGMA journal_mode = {journal_mode}")
+        finally:
+            target.close()
+        self.stdout.write(f"Copied the database in {time.perf_counter() - start:.1f}s")
+
+    def run(self, alias, path, profile, tasks, workers):
+        database = ConnectionHandler(
+            {
+                DEFAULT_DB_ALIAS: {
+                    "ENGINE": profile["ENGINE"],
+                    "NAME": path,
+                    "CONN_MAX_AGE": profile["CONN_MAX_AGE"],
+                }
+            }
+        ).settings[DEFAULT_DB_ALIAS]
+        # a second alias of `connections` for the ORM's using()
+        connections.settings[alias] = database
+        try:
+            return database_throughput(alias, tasks, workers)
+        finally:
+            del connections.settings[alias]
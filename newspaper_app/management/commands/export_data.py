@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from newspaper_app.export import (
+    EXPORT_CHUNK_SIZE,
+    EXPORTS,
+    FORMATS,
+    export_lines,
+    parse_since,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream posts, comments, newsletter subscribers or contact messages "
+        "as NDJSON or CSV, oldest change first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+        parser.add_argument(
+            "--since",
+            help="Only the rows updated at or after this ISO 8601 date or datetime.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument("--output", help="Write to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = parse_since(options["since"])
+            except ValueError as e:
+                raise CommandError(e)
+        lines = export_lines(
+            options["name"], options["format"], since, options["chunk_size"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                f.writelines(lines)
+        else:
+            for text in lines:
+                self.stdout.write(text, ending="")
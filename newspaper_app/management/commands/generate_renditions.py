@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from newspaper_app.models import Post
+from newspaper_app.renditions import generate_renditions, has_renditions
+
+
+class Command(BaseCommand):
+    help = "Render the missing featured image sizes of existing posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Render images that have them too."
+        )
+
+    def handle(self, *args, **options):
+        rendered = 0
+        images = Post.objects.values_list("featured_image", flat=True).distinct()
+        for name in images.iterator():
+            image = Post(featured_image=name).featured_image
+            if not image or (has_renditions(image) and not options["force"]):
+                continue
+            try:
+                generate_renditions(image)
+            except OSError as e:
+                self.stderr.write(f"Skipped {name}: {e}")
+                continue
+            rendered += 1
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} images."))
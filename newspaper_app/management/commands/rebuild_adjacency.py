@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from newspaper_app import adjacency
+
+
+class Command(BaseCommand):
+    help = "Rebuild the previous/next links of the published posts from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        linked = adjacency.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} posts."))
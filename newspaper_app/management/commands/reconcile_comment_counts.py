@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from newspaper_app.comments import reconcile_comment_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the comments of every post and fix the stored counts that "
+        "drifted, e.g. after comments were bulk loaded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        fixed = reconcile_comment_counts(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} posts."))
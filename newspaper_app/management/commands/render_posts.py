@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from newspaper_app.rendering import render_posts
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the sanitized HTML, excerpt, word count and reading time of "
+        "the posts that have none, e.g. after a bulk import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Render every post again, e.g. after the allowed tags changed.",
+        )
+
+    def handle(self, *args, **options):
+        rendered = render_posts(
+            batch_size=options["batch_size"], everything=options["all"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} posts."))
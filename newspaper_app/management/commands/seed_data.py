@@ -0,0 +1,238 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from newspaper_app import adjacency, comments, rendering, search, trending
+from newspaper_app.fragments import FRAGMENTS_VERSION
+from newspaper_app.models import (
+    Category,
+    Comment,
+    Contact,
+    Newsletter,
+    Post,
+    PostView,
+    Tag,
+)
+from newspaper_app.navigation import NAVIGATION_VERSION
+from newspaper_app.page_cache import LAYOUT_VERSION, PAGES_VERSION
+from newspaper_app.versioning import bump_version
+
+WORDS = (
+    "nepal kathmandu election budget cricket stadium mayor river festival "
+    "parliament minister school hospital road bridge earthquake tourism trek "
+    "himalaya monsoon farmer market price energy hydro airport student court "
+    "police report council village city football league science health"
+).split()
+
+SEED_IMAGE = "post_images/2023/02/08/thumb.jpeg"
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a generated dataset. The same --seed always "
+        "gives the same rows, dates are relative to the time of the run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=6)
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--categories", type=int, default=12)
+        parser.add_argument("--tags", type=int, default=60)
+        parser.add_argument("--posts", type=int, default=100_000)
+        parser.add_argument("--comments", type=int, default=300_000)
+        parser.add_argument("--newsletters", type=int, default=20_000)
+        parser.add_argument("--contacts", type=int, default=2_000)
+        parser.add_argument(
+            "--views",
+            type=int,
+            default=20_000,
+            help="Recent view batches for the trending scores.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2_000)
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete the existing content first."
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+
+        with transaction.atomic():
+            if options["clear"]:
+                self.clear()
+            users = self.create_users(options["users"])
+            categories = Category.objects.bulk_create(
+                Category(name=f"{self.word().title()} {i}")
+                for i in range(options["categories"])
+            )
+            tags = Tag.objects.bulk_create(
+                Tag(name=f"{self.word()}-{i}") for i in range(options["tags"])
+            )
+            post_ids = self.create_posts(options["posts"], users, categories, tags)
+            self.create_comments(options["comments"], post_ids)
+            self.create_views(options["views"], post_ids)
+            self.bulk_create(
+                Newsletter,
+                (
+                    Newsletter(email=f"reader{i}@example.com")
+                    for i in range(options["newsletters"])
+                ),
+            )
+            self.bulk_create(
+                Contact,
+                (
+                    Contact(
+                        subject=self.sentence(4),
+                        message=self.sentence(30),
+                        name=f"Reader {i}",
+                        email=f"contact{i}@example.com",
+                    )
+                    for i in range(options["contacts"])
+                ),
+            )
+
+        # bulk_create sends no signals
+        indexed = search.rebuild_index(batch_size=self.batch_size)
+        adjacency.rebuild(batch_size=self.batch_size)
+        comments.reconcile_comment_counts()
+        trending.update_trending()
+        for version in (
+            NAVIGATION_VERSION,
+            FRAGMENTS_VERSION,
+            LAYOUT_VERSION,
+            PAGES_VERSION,
+        ):
+            bump_version(version)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(users)} users, {len(categories)} categories, "
+                f"{len(tags)} tags, {len(post_ids)} posts, "
+                f"{options['comments']} comments, "
+                f"{options['newsletters']} newsletters. Indexed {indexed} posts."
+            )
+        )
+
+    def word(self):
+        return self.random.choice(WORDS)
+
+    def sentence(self, words):
+        return " ".join(self.word() for _ in range(words)).capitalize()
+
+    def bulk_create(self, model, objs):
+        batch = []
+        created = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                created += model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            created += model.objects.bulk_create(batch)
+        return created
+
+    def clear(self):
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        Category.objects.all().delete()
+        Tag.objects.all().delete()
+        Newsletter.objects.all().delete()
+        Contact.objects.all().delete()
+        PostView.objects.all().delete()
+        User.objects.filter(username__startswith="seed-user-").delete()
+
+    def create_users(self, count):
+        # hashing is slow, every seeded user gets the password "password"
+        password = make_password("password")
+        return self.bulk_create(
+            User,
+            (
+                User(
+                    username=f"seed-user-{i}",
+                    first_name=self.word().title(),
+                    last_name=self.word().title(),
+                    email=f"seed-user-{i}@example.com",
+                    password=password,
+                    is_staff=i == 0,
+                )
+                for i in range(count)
+            ),
+        )
+
+    def create_posts(self, count, users, categories, tags):
+        post_ids = []
+        Through = Post.tag.through
+        for start in range(0, count, self.batch_size):
+            posts = []
+            for _ in range(start, min(start + self.batch_size, count)):
+                # one in twenty is a draft, the rest spread over two years
+                published_at = None
+                if self.random.random() >= 0.05:
+                    published_at = self.now - timedelta(
+                        minutes=self.random.randint(0, 2 * 365 * 24 * 60)
+                    )
+                posts.append(
+                    Post(
+                        title=self.sentence(self.random.randint(4, 10)),
+                        content="".join(
+                            f"<p>{self.sentence(self.random.randint(20, 60))}.</p>"
+                            for _ in range(self.random.randint(3, 8))
+                        ),
+                        featured_image=SEED_IMAGE,
+                        author=self.random.choice(users),
+                        published_at=published_at,
+                        status="active" if self.random.random() < 0.95 else "in_active",
+                        views_count=int(self.random.paretovariate(1.2) * 10),
+                        category=self.random.choice(categories),
+                    )
+                )
+            for post in posts:
+                rendering.render_post(post)
+            posts = Post.objects.bulk_create(posts)
+            Through.objects.bulk_create(
+                Through(post_id=post.pk, tag_id=tag.pk)
+                for post in posts
+                for tag in self.random.sample(
+                    tags, min(len(tags), self.random.randint(1, 3))
+                )
+            )
+            post_ids += [post.pk for post in posts]
+        return post_ids
+
+    def create_views(self, count, post_ids):
+        if not post_ids:
+            return
+        self.bulk_create(
+            PostView,
+            (
+                PostView(
+                    post_id=self.random.choice(post_ids),
+                    views=int(self.random.paretovariate(1.2)),
+                )
+                for _ in range(count)
+            ),
+        )
+
+    def create_comments(self, count, post_ids):
+        if not post_ids:
+            return
+        # a few posts get most of the comments
+        weights = [1 / (rank + 1) for rank in range(len(post_ids))]
+        commented = self.random.choices(post_ids, weights=weights, k=count)
+        self.bulk_create(
+            Comment,
+            (
+                Comment(
+                    post_id=post_id,
+                    comment=self.sentence(self.random.randint(5, 40)),
+                    name=f"Reader {i}",
+                    email=f"reader{i}@example.com",
+                )
+                for i, post_id in enumerate(commented)
+            ),
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from newspaper_app.db_router import PRIMARY, get_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the SQLite replicas, a stand-in "
+        "for replication to try DATABASE_REPLICAS locally. With --interval the "
+        "replicas lag behind by up to that many seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep copying every that many seconds instead of once.",
+        )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError("DATABASE_REPLICAS is empty.")
+        for alias in [PRIMARY, *replicas]:
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"{alias} is not an SQLite database.")
+        while True:
+            for alias in replicas:
+                self.copy(alias)
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+
+    def copy(self, alias):
+        primary, replica = connections[PRIMARY], connections[alias]
+        primary.ensure_connection()
+        replica.ensure_connection()
+        start = time.perf_counter()
+        # the backup API copies a consistent snapshot, readers of the
+        # replica wait for it to finish
+        primary.connection.backup(replica.connection)
+        self.stdout.write(
+            f"Copied {PRIMARY} into {alias} in "
+            f"{(time.perf_counter() - start) * 1000:.0f}ms."
+        )
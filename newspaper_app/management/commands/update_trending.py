@@ -0,0 +1,22 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from newspaper_app.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the post views recorded since the last run into the trending "
+        "scores. Run it every few minutes, e.g. from cron."
+    )
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            self.stderr.write(
+                "The cache is local to this process, the cached pages won't "
+                "show the new leaderboard until they expire. Configure a "
+                "shared cache in CACHES."
+            )
+        views = update_trending()
+        self.stdout.write(self.style.SUCCESS(f"Added {views} views."))
@@ -0,0 +1,308 @@
+"""
+Per view request metrics, kept in process memory and exposed in the
+Prometheus text format by `views.MetricsView`. Every worker process keeps its
+own numbers, Prometheus sums them up across the scraped targets.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# the numbers of the request being served, None outside of a request
+_current = ContextVar("request_metrics", default=None)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DEFAULT_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, **extra):
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name + format_labels(self.labels, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        # labels => [count per bucket..., sum, count]
+        self.values = {}
+
+    def observe(self, labels, value):
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def samples(self):
+        for labels, row in sorted(self.values.items()):
+            for bound, count in zip(
+                (*self.buckets, float("inf")), (*row[:-2], row[-1])
+            ):
+                yield (
+                    self.name
+                    + "_bucket"
+                    + format_labels(self.labels, labels, le=format_number(bound)),
+                    count,
+                )
+            yield self.name + "_sum" + format_labels(self.labels, labels), row[-2]
+            yield self.name + "_count" + format_labels(self.labels, labels), row[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        latency_buckets = getattr(
+            settings, "METRICS_LATENCY_BUCKETS", DEFAULT_LATENCY_BUCKETS
+        )
+        self.requests = Counter(
+            "newspaper_requests_total",
+            "Requests by view, method and status code.",
+            ("view", "method", "status"),
+        )
+        self.latency = Histogram(
+            "newspaper_request_duration_seconds",
+            "Time spent serving a request, by view.",
+            ("view",),
+            latency_buckets,
+        )
+        self.queries = Histogram(
+            "newspaper_db_queries",
+            "SQL queries run by one request, by view.",
+            ("view",),
+            getattr(settings, "METRICS_QUERY_BUCKETS", DEFAULT_QUERY_BUCKETS),
+        )
+        self.query_time = Counter(
+            "newspaper_db_query_duration_seconds_total",
+            "Time spent running SQL queries, by view.",
+            ("view",),
+        )
+        self.render_time = Histogram(
+            "newspaper_render_duration_seconds",
+            "Time spent rendering template (and API) responses, by view.",
+            ("view",),
+            latency_buckets,
+        )
+        self.cache = Counter(
+            "newspaper_cache_requests_total",
+            "Cache lookups by view, cache and result (hit or miss).",
+            ("view", "cache", "result"),
+        )
+        self.metrics = (
+            self.requests,
+            self.latency,
+            self.queries,
+            self.query_time,
+            self.render_time,
+            self.cache,
+        )
+
+    def record(self, stats, view, method, status, duration):
+        with self.lock:
+            self.requests.inc((view, method, str(status)))
+            self.latency.observe((view,), duration)
+            self.queries.observe((view,), stats.queries)
+            self.query_time.inc((view,), stats.query_time)
+            if stats.render_time is not None:
+                self.render_time.observe((view,), stats.render_time)
+            for (cache, hit), count in stats.cache.items():
+                self.cache.inc((view, cache, "hit" if hit else "miss"), count)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for name, value in metric.samples():
+                    lines.append(f"{name} {format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+
+registry = Registry()
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "render_time", "cache")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = None
+        # (cache name, hit) => count
+        self.cache = {}
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper, installed on every connection. Outside of a
+    request it only costs the context variable lookup.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_time += time.perf_counter() - start
+        stats.queries += 1
+
+
+def install_query_wrapper(connection, **kwargs):
+    # connection_created receiver, connections are per thread and it also
+    # fires when the same connection reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_cache(cache, hit):
+    """
+    Count a lookup of `cache` ("page", "navigation", ...) on the current
+    request, does nothing outside of one.
+    """
+    stats = _current.get()
+    if stats is not None:
+        key = (cache, bool(hit))
+        stats.cache[key] = stats.cache.get(key, 0) + 1
+
+
+def render_response(response):
+    """
+    Render a template response, adding the time it took to the current
+    request.
+    """
+    if response.is_rendered:
+        return response
+    start = time.perf_counter()
+    response.render()
+    stats = _current.get()
+    if stats is not None:
+        stats.render_time = (stats.render_time or 0) + time.perf_counter() - start
+    return response
+
+
+# the `method` label, anything else a client sends is "other" so made-up
+# methods can't add label values without end
+HTTP_METHODS = {
+    "GET",
+    "HEAD",
+    "POST",
+    "PUT",
+    "PATCH",
+    "DELETE",
+    "OPTIONS",
+    "CONNECT",
+    "TRACE",
+}
+
+
+def get_method(request):
+    return request.method if request.method in HTTP_METHODS else "other"
+
+
+def get_view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.view_name:
+        return "unmatched"
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL queries, render time and cache lookups of every
+    request under the name of the URL it resolved to. Works under WSGI and
+    ASGI, the async views keep an async chain under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, start)
+        return response
+
+    def record(self, request, response, stats, start):
+        registry.record(
+            stats,
+            get_view_name(request),
+            get_method(request),
+            response.status_code,
+            time.perf_counter() - start,
+        )
+
+    def process_template_response(self, request, response):
+        # runs last, render here so the time is recorded, Django skips
+        # rendering an already rendered response
+        return render_response(response)
+
+
+def is_metrics_client(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    return request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from newspaper_app import search
+
+
+def create_index(apps, schema_editor):
+    if not search.is_available(schema_editor.connection):
+        return
+    search.create_index_table(schema_editor.connection)
+    Post = apps.get_model("newspaper_app", "Post")
+    search.rebuild_index(Post.objects.all(), using=schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    if search.is_available(schema_editor.connection):
+        search.drop_index_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0004_comment"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
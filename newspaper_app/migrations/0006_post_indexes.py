@@ -0,0 +1,57 @@
+# Generated by Django 4.1.6 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0005_post_fts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(
+                    ("published_at__isnull", False), ("status", "active")
+                ),
+                fields=["-published_at", "-id"],
+                name="post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(
+                    ("published_at__isnull", False), ("status", "active")
+                ),
+                fields=["-views_count", "-id"],
+                name="post_popular_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(
+                    ("published_at__isnull", False), ("status", "active")
+                ),
+                fields=["category", "-published_at", "-id"],
+                name="post_category_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["category", "views_count"], name="post_category_views_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("published_at__isnull", True)),
+                fields=["-created_at"],
+                name="post_draft_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.6 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0006_post_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(
+                    ("published_at__isnull", False), ("status", "active")
+                ),
+                fields=["status", "published_at", "updated_at"],
+                name="post_validators_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.6 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0007_post_validators_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["updated_at", "id"], name="comment_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="contact",
+            index=models.Index(fields=["updated_at", "id"], name="contact_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="newsletter",
+            index=models.Index(
+                fields=["updated_at", "id"], name="newsletter_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["updated_at", "id"], name="post_updated_idx"),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.1.6 on 2026-10-18 09:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0008_export_updated_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "window",
+                    models.CharField(
+                        choices=[
+                            ("hourly", "Hourly"),
+                            ("daily", "Daily"),
+                            ("weekly", "Weekly"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("decayed_at", models.DateTimeField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trending_scores",
+                        to="newspaper_app.post",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PostView",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("views", models.PositiveIntegerField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="newspaper_app.post",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="trendingscore",
+            index=models.Index(
+                fields=["window", "-score", "-post"], name="trending_top_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="trendingscore",
+            constraint=models.UniqueConstraint(
+                fields=("window", "post"), name="trending_window_post_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.1.6 on 2026-10-18 09:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from newspaper_app import adjacency
+
+
+def link_posts(apps, schema_editor):
+    adjacency.rebuild(
+        posts=apps.get_model("newspaper_app", "Post").objects.all(),
+        model=apps.get_model("newspaper_app", "PostAdjacency"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0009_trending"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostAdjacency",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="adjacency",
+                        serialize=False,
+                        to="newspaper_app.post",
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="newspaper_app.category",
+                    ),
+                ),
+                (
+                    "next",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="newspaper_app.post",
+                    ),
+                ),
+                (
+                    "next_in_category",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="newspaper_app.post",
+                    ),
+                ),
+                (
+                    "previous",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="newspaper_app.post",
+                    ),
+                ),
+                (
+                    "previous_in_category",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="newspaper_app.post",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["category", "post"], name="adjacency_category_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(link_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.6 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+from newspaper_app import comments
+
+
+def count_comments(apps, schema_editor):
+    comments.reconcile_comment_counts(
+        posts=apps.get_model("newspaper_app", "Post").objects.all(),
+        comments=apps.get_model("newspaper_app", "Comment").objects.all(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0010_post_adjacency"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
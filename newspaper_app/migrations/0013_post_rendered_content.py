@@ -0,0 +1,43 @@
+# Generated by Django 4.1.6 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+from newspaper_app import rendering
+
+
+def render_posts(apps, schema_editor):
+    rendering.render_posts(posts=apps.get_model("newspaper_app", "Post").objects.all())
+
+
+class Migration(migrations.Migration):
+    # each batch of render_posts commits on its own instead of one transaction
+    # holding the write lock for the whole table
+    atomic = False
+
+    dependencies = [
+        ("newspaper_app", "0012_comment_thread_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="body_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="reading_time",
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop, atomic=False),
+    ]
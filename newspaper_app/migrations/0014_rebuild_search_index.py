@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from newspaper_app import search
+
+
+def rebuild_index(apps, schema_editor):
+    # the index ran the first word of every paragraph into the last word of
+    # the one before
+    if not search.is_available(schema_editor.connection):
+        return
+    Post = apps.get_model("newspaper_app", "Post")
+    search.rebuild_index(Post.objects.all(), using=schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("newspaper_app", "0013_post_rendered_content"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+from newspaper_app.sqlite.base import enable_wal
+
+
+def enable(apps, schema_editor):
+    # once for good, instead of rewriting the header on every connection
+    enable_wal(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    # the journal mode can't change inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("newspaper_app", "0014_rebuild_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(enable, migrations.RunPython.noop, atomic=False),
+    ]
@@ -35,18 +35,59 @@ class Post(TimeStampModel):
     published_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
     views_count = models.PositiveBigIntegerField(default=0)
+    # maintained by newspaper_app/comments.py
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # rendered from content on save, see newspaper_app/rendering.py
+    body_html = models.TextField(blank=True, editable=False)
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=1, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     tag = models.ManyToManyField(Tag)
 
+    class Meta:
+        # published_at/views_count orderings of the public pages, only over
+        # the active, published posts they read
+        indexes = [
+            models.Index(
+                fields=["-published_at", "-id"],
+                condition=models.Q(status="active", published_at__isnull=False),
+                name="post_published_idx",
+            ),
+            models.Index(
+                fields=["-views_count", "-id"],
+                condition=models.Q(status="active", published_at__isnull=False),
+                name="post_popular_idx",
+            ),
+            models.Index(
+                fields=["category", "-published_at", "-id"],
+                condition=models.Q(status="active", published_at__isnull=False),
+                name="post_category_published_idx",
+            ),
+            # covers the per category views_count totals of the navigation
+            models.Index(
+                fields=["category", "views_count"],
+                name="post_category_views_idx",
+            ),
+            models.Index(
+                fields=["-created_at"],
+                condition=models.Q(published_at__isnull=True),
+                name="post_draft_idx",
+            ),
+            # MAX(updated_at)/COUNT(*) of the conditional GET validators
+            # straight from the index
+            models.Index(
+                fields=["status", "published_at", "updated_at"],
+                condition=models.Q(status="active", published_at__isnull=False),
+                name="post_validators_idx",
+            ),
+            # the since= filter and order of the exports
+            models.Index(fields=["updated_at", "id"], name="post_updated_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
-    # Fat model and thin Views
-    @property
-    def latest_comments(self):
-        comments = Comment.objects.filter(post=self).order_by("-created_at")
-        return comments
-
 
 class Contact(TimeStampModel):
     subject = models.CharField(max_length=200)
@@ -54,6 +95,11 @@ class Contact(TimeStampModel):
     name = models.CharField(max_length=50)
     email = models.EmailField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="contact_updated_idx"),
+        ]
+
     def __str__(self):
         return self.subject
 
@@ -61,20 +107,134 @@ class Contact(TimeStampModel):
 class Newsletter(TimeStampModel):
     email = models.EmailField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="newsletter_updated_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
 
 class Comment(TimeStampModel):
-    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    # comment_thread_idx starts with the post
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, db_index=False)
     comment = models.TextField()
     name = models.CharField(max_length=50)
     email = models.EmailField()
 
+    class Meta:
+        indexes = [
+            # the pages of a thread, see newspaper_app/comments.py
+            models.Index(
+                fields=["post", "created_at", "id"], name="comment_thread_idx"
+            ),
+            models.Index(fields=["updated_at", "id"], name="comment_updated_idx"),
+        ]
+
     def __str__(self):
         return self.comment[:50]
 
 
+class PostAdjacency(models.Model):
+    """
+    Neighbours of a published post among the published posts, in id order,
+    kept up to date by newspaper_app/adjacency.py. One row per published
+    post.
+    """
+
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE, primary_key=True, related_name="adjacency"
+    )
+    # the rows are the published posts, neighbours are looked up among them
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    # adjacency.py repoints the neighbours before a post goes, nothing looks
+    # rows up by these
+    previous = models.ForeignKey(
+        Post,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="+",
+    )
+    next = models.ForeignKey(
+        Post,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="+",
+    )
+    previous_in_category = models.ForeignKey(
+        Post,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="+",
+    )
+    next_in_category = models.ForeignKey(
+        Post,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="+",
+    )
+
+    class Meta:
+        indexes = [
+            # neighbours in the same category
+            models.Index(fields=["category", "post"], name="adjacency_category_idx"),
+        ]
+
+
+class PostView(models.Model):
+    # views flushed by the view counter, waiting for update_trending(). No
+    # foreign key constraint, a post deleted in the meantime must not fail
+    # the flush, its rows are dropped with the rest.
+    post = models.ForeignKey(
+        Post, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    views = models.PositiveIntegerField()
+
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed views of a post over one window, the leaderboard only
+    keeps the top posts of each window, see newspaper_app/trending.py.
+    """
+
+    WINDOW_CHOICES = [
+        ("hourly", "Hourly"),
+        ("daily", "Daily"),
+        ("weekly", "Weekly"),
+    ]
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="trending_scores"
+    )
+    window = models.CharField(max_length=10, choices=WINDOW_CHOICES)
+    score = models.FloatField()
+    decayed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["window", "post"], name="trending_window_post_unique"
+            ),
+        ]
+        indexes = [
+            # top N of a window
+            models.Index(fields=["window", "-score", "-post"], name="trending_top_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.window} {self.post_id}: {self.score:.2f}"
+
+
 ## 1 - 1 Relationship
 # 1 user can have one 1 profile   => 1
 # 1 profile is associated to one 1 user  => 1
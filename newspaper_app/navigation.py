@@ -1,42 +1,52 @@
-from django.db.models import F, Sum, Case, When
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils.functional import SimpleLazyObject
 
+from newspaper_app.metrics import record_cache
 from newspaper_app.models import Category, Post, Tag
+from newspaper_app.versioning import get_version, snapshot_timeout
 
+NAVIGATION_VERSION = "navigation"
 
-def navigation(request):
-    categories = Category.objects.all()
-    tags = Tag.objects.all()[:10]
-    # Get the post with the highest views_count of posts in each category
-    top_categories = (
-        Post.objects.values("category__pk", "category__name")
-        .annotate(
-            pk=F("category__pk"), name=F("category__name"), max_views=Sum("views_count")
-        )
-        .order_by("-views_count")
-        .values("pk", "name", "max_views")
-    )
-    print(top_categories)
-    category_ids = [top_category["pk"] for top_category in top_categories]  # [2,6,5,6]
-    order_by_max_views = Case(
-        *[
-            When(
-                id=category["pk"], then=category["max_views"]
-            )  # When(id=2, then=11), When(id=6,then=2)
-            for category in top_categories
-        ]
-    )
-    whats_new_categories = Category.objects.filter(pk__in=category_ids).order_by(
-        -order_by_max_views
-    )[:4]
-    top_categories = Category.objects.filter(pk__in=category_ids).order_by(
-        -order_by_max_views
-    )[:4]
-
-    print(top_categories)
 
+def build_navigation():
+    categories = list(Category.objects.all())
+    tags = list(Tag.objects.all()[:10])
+    # categories ordered by the total views_count of their posts
+    top_category_ids = list(
+        Post.objects.values("category")
+        .annotate(total_views=Sum("views_count"))
+        .order_by("-total_views", "category")
+        .values_list("category", flat=True)[:4]
+    )
+    categories_by_id = {category.pk: category for category in categories}
+    top_categories = [
+        categories_by_id[pk] for pk in top_category_ids if pk in categories_by_id
+    ]
     return {
         "categories": categories,
         "tags": tags,
         "top_categories": top_categories,
-        "whats_new_categories": whats_new_categories,
+        "whats_new_categories": top_categories,
+    }
+
+
+def get_navigation():
+    key = f"navigation:{get_version(NAVIGATION_VERSION)}"
+    snapshot = cache.get(key)
+    record_cache("navigation", snapshot is not None)
+    if snapshot is None:
+        snapshot = build_navigation()
+        timeout = getattr(settings, "NAVIGATION_CACHE_TIMEOUT", 300)
+        cache.set(key, snapshot, snapshot_timeout([NAVIGATION_VERSION], timeout))
+    return snapshot
+
+
+def navigation(request):
+    # nothing is fetched until a template actually reads one of the values
+    snapshot = SimpleLazyObject(get_navigation)
+    return {
+        name: SimpleLazyObject(lambda name=name: snapshot[name])
+        for name in ("categories", "tags", "top_categories", "whats_new_categories")
     }
@@ -0,0 +1,178 @@
+import hashlib
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from newspaper_app.metrics import record_cache, render_response
+from newspaper_app.sitemaps import sitemap_page
+from newspaper_app.versioning import bump_version, get_version, snapshot_timeout
+
+# header/sidebar category and tag lists, on every page
+LAYOUT_VERSION = "layout"
+# pages listing the latest posts
+PAGES_VERSION = "pages"
+
+# the forms on every page carry a csrf token, it is swapped for a
+# placeholder in the cache and for the visitor's own token on every hit
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CSRF_PLACEHOLDER = "__page_cache_csrf_token__"
+
+# headers kept by cached_response()
+CACHED_HEADERS = ("Content-Type", "Last-Modified", "X-Robots-Tag")
+
+
+def category_version(category_id):
+    return f"{PAGES_VERSION}:category:{category_id}"
+
+
+def tag_version(tag_id):
+    return f"{PAGES_VERSION}:tag:{tag_id}"
+
+
+def sitemap_version(page):
+    return f"{PAGES_VERSION}:sitemap:{page}"
+
+
+def invalidate_post_pages(post):
+    """
+    Drop the cached pages that can show `post`: home/about/latest news,
+    its category listing and its tag listings. Drafts are on none of them.
+    """
+    if post.published_at is None:
+        return
+    invalidate_listing_pages(
+        [post.category_id], post.tag.values_list("id", flat=True), [post.pk]
+    )
+
+
+def invalidate_listing_pages(category_ids=(), tag_ids=(), post_ids=()):
+    # the latest news pages, feeds, the given category and tag listings and
+    # the sitemap pages of the given posts
+    bump_version(PAGES_VERSION)
+    for category_id in set(category_ids):
+        bump_version(category_version(category_id))
+    for tag_id in set(tag_ids):
+        bump_version(tag_version(tag_id))
+    for page in {sitemap_page(post_id) for post_id in post_ids}:
+        bump_version(sitemap_version(page))
+
+
+def get_page_cache_timeout():
+    return getattr(settings, "PAGE_CACHE_TIMEOUT", 600)
+
+
+def page_cache_key(request, versions):
+    versions = ".".join(str(get_version(name)) for name in versions)
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"page:{versions}:{url}"
+
+
+def cached_response(request, versions, get_response, cache_name="page"):
+    """
+    The cached copy of what `get_response()` returns for this URL, for the
+    responses that are the same for every visitor (feeds, sitemaps). Keyed
+    like the pages, on the URL and `versions`.
+    """
+    key = page_cache_key(request, versions)
+    cached = cache.get(key)
+    record_cache(cache_name, cached is not None)
+    if cached is not None:
+        content, headers = cached
+        response = HttpResponse(content)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    response = get_response()
+    if response.status_code == 200 and not response.streaming:
+        if hasattr(response, "render"):
+            render_response(response)
+        headers = {
+            header: response[header]
+            for header in CACHED_HEADERS
+            if response.has_header(header)
+        }
+        cache.set(
+            key,
+            (response.content, headers),
+            snapshot_timeout(versions, get_page_cache_timeout()),
+        )
+    return response
+
+
+class CachedPageMixin:
+    """
+    Serves anonymous GET requests from the cache. The key varies on the full
+    URL and on the versions from `get_page_cache_versions()`, so bumping any
+    of them drops the page.
+    """
+
+    page_cache_timeout = None
+
+    def get_page_cache_versions(self):
+        return [LAYOUT_VERSION, PAGES_VERSION]
+
+    def get_page_cache_timeout(self, response):
+        if self.page_cache_timeout is not None:
+            return self.page_cache_timeout
+        return get_page_cache_timeout()
+
+    def get_page_cache_key(self, request):
+        return page_cache_key(request, self.get_page_cache_versions())
+
+    def is_page_cacheable(self, request):
+        return request.method == "GET" and not request.user.is_authenticated
+
+    def get_cached_page(self, request):
+        key = self.get_page_cache_key(request)
+        cached = cache.get(key)
+        record_cache("page", cached is not None)
+        if cached is None:
+            return key, None
+        content, content_type = cached
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+        return key, HttpResponse(content, content_type=content_type)
+
+    def store_page(self, key, response):
+        if response.status_code == 200 and not response.streaming:
+            if hasattr(response, "render"):
+                render_response(response)
+            content = CSRF_INPUT.sub(
+                f'name="csrfmiddlewaretoken" value="{CSRF_PLACEHOLDER}"',
+                response.content.decode(response.charset),
+            )
+            timeout = snapshot_timeout(
+                self.get_page_cache_versions(), self.get_page_cache_timeout(response)
+            )
+            if timeout > 0:
+                cache.set(key, (content, response["Content-Type"]), timeout)
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch(request, *args, **kwargs)
+        if not self.is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        # kwargs are needed to work out the versions
+        self.request, self.args, self.kwargs = request, args, kwargs
+        key, cached = self.get_cached_page(request)
+        if cached is not None:
+            return cached
+        return self.store_page(key, super().dispatch(request, *args, **kwargs))
+
+    async def adispatch(self, request, *args, **kwargs):
+        # request.user and the rendering (lazy navigation) hit the database
+        if not await sync_to_async(self.is_page_cacheable)(request):
+            return await super().dispatch(request, *args, **kwargs)
+
+        self.request, self.args, self.kwargs = request, args, kwargs
+        key, cached = self.get_cached_page(request)
+        if cached is not None:
+            return cached
+        response = await super().dispatch(request, *args, **kwargs)
+        return await sync_to_async(self.store_page)(key, response)
@@ -0,0 +1,219 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404
+
+from newspaper_app.async_orm import alist
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_value(value):
+    # full isoformat, DjangoJSONEncoder would drop the microseconds
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Cannot put {type(value).__name__} in a cursor.")
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], reverse=False)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], reverse=True)
+
+
+class KeysetPaginator:
+    """
+    Paginates on the values of `ordering` instead of an OFFSET, every page is
+    an index range scan no matter how deep it is. Pages are addressed with
+    opaque cursors, `count` can be turned off to skip the COUNT(*) query.
+    `count_queryset` counts without the annotations the page query needs.
+    """
+
+    def __init__(
+        self,
+        queryset,
+        per_page,
+        ordering=("-published_at", "-id"),
+        count=True,
+        count_queryset=None,
+    ):
+        self.queryset = queryset
+        self.count_queryset = queryset if count_queryset is None else count_queryset
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.fields = [field.lstrip("-") for field in ordering]
+        self.descending = ordering[0].startswith("-")
+        self.with_count = count
+        self._count = None
+
+    @property
+    def count(self):
+        if not self.with_count:
+            return None
+        if self._count is None:
+            self._count = self.count_queryset.order_by().count()
+        return self._count
+
+    def encode_cursor(self, obj, reverse):
+        position = {
+            "v": [getattr(obj, field) for field in self.fields],
+            "r": reverse,
+        }
+        data = json.dumps(position, default=encode_value, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            position = json.loads(data)
+            values = position["v"]
+            if len(values) != len(self.fields):
+                raise ValueError
+            opts = self.queryset.model._meta
+            values = [
+                opts.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+            return values, bool(position["r"])
+        except (
+            binascii.Error,
+            ValueError,
+            TypeError,
+            KeyError,
+            FieldDoesNotExist,
+            ValidationError,
+        ) as e:
+            raise InvalidCursor("Invalid cursor.") from e
+
+    def _after(self, values, reverse):
+        # (f1, f2) after (v1, v2) => f1 > v1 OR (f1 = v1 AND f2 > v2)
+        lookup = "gt" if self.descending == reverse else "lt"
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            step = Q(**{f"{field}__{lookup}": values[i]})
+            for previous_field, value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{previous_field: value})
+            condition |= step
+        return condition
+
+    def _page_queryset(self, cursor):
+        qs = self.queryset
+        reverse = False
+        if cursor:
+            values, reverse = self.decode_cursor(cursor)
+            qs = qs.filter(self._after(values, reverse))
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+        return qs.order_by(*ordering)[: self.per_page + 1], reverse
+
+    def page(self, cursor=None):
+        qs, reverse = self._page_queryset(cursor)
+        return self._make_page(list(qs), cursor, reverse)
+
+    async def apage(self, cursor=None):
+        """
+        page() for async views.
+        """
+        qs, reverse = self._page_queryset(cursor)
+        rows = await alist(qs)
+        if self.with_count and self._count is None:
+            self._count = await self.count_queryset.order_by().acount()
+        return self._make_page(rows, cursor, reverse)
+
+    def _make_page(self, rows, cursor, reverse):
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+            return KeysetPage(self, rows, has_next=True, has_previous=has_more)
+        return KeysetPage(self, rows, has_next=has_more, has_previous=bool(cursor))
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin, `?cursor=` instead of `?page=` and an optional
+    `?page_size=` up to `max_paginate_by`. The view is async, the page is
+    fetched with KeysetPaginator.apage() before get_context_data().
+    """
+
+    paginate_by = 10
+    max_paginate_by = 50
+    paginate_count = True
+    ordering = ("-published_at", "-id")
+
+    def get_paginate_by(self, queryset):
+        try:
+            page_size = int(self.request.GET.get("page_size", self.paginate_by))
+        except ValueError:
+            page_size = self.paginate_by
+        return max(1, min(page_size, self.max_paginate_by))
+
+    keyset_page = None
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        paginator = KeysetPaginator(
+            self.object_list,
+            self.get_paginate_by(self.object_list),
+            ordering=self.ordering,
+            count=self.paginate_count,
+        )
+        try:
+            self.keyset_page = await paginator.apage(request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return self.render_to_response(self.get_context_data())
+
+    def paginate_queryset(self, queryset, page_size):
+        page = self.keyset_page
+        if page is None:
+            paginator = KeysetPaginator(
+                queryset, page_size, ordering=self.ordering, count=self.paginate_count
+            )
+            try:
+                page = paginator.page(self.request.GET.get("cursor"))
+            except InvalidCursor:
+                raise Http404("Invalid cursor.")
+        return (page.paginator, page, page.object_list, page.has_other_pages())
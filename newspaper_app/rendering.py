@@ -0,0 +1,154 @@
+"""
+What the pages show of a post's content, worked out once when the post is
+saved instead of on every render: the Summernote HTML cleaned down to the
+tags the theme styles, a plain-text excerpt for the cards and feeds, the
+word count and the reading time.
+
+The pre_save signal renders every saved post, bulk_create skips it: call
+render_post() on the instances first, or run the `render_posts` command.
+The posts saved before these fields existed are rendered by the migration
+that added them, batch by batch.
+"""
+
+import html
+import math
+import re
+
+import bleach
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from newspaper_app.fragments import FRAGMENTS_VERSION
+from newspaper_app.models import Post
+from newspaper_app.page_cache import LAYOUT_VERSION, PAGES_VERSION
+from newspaper_app.versioning import bump_version
+
+ALLOWED_TAGS = [
+    "a",
+    "b",
+    "blockquote",
+    "br",
+    "code",
+    "div",
+    "em",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "i",
+    "img",
+    "li",
+    "ol",
+    "p",
+    "pre",
+    "s",
+    "span",
+    "strike",
+    "strong",
+    "sub",
+    "sup",
+    "table",
+    "tbody",
+    "td",
+    "th",
+    "thead",
+    "tr",
+    "u",
+    "ul",
+]
+ALLOWED_ATTRIBUTES = {
+    "a": ["href", "title", "target", "rel"],
+    "img": ["src", "alt", "title", "width", "height"],
+    "td": ["colspan", "rowspan"],
+    "th": ["colspan", "rowspan"],
+}
+ALLOWED_PROTOCOLS = ["http", "https", "mailto"]
+
+# words, for the cards, search results and feed descriptions
+EXCERPT_WORDS = 50
+WORDS_PER_MINUTE = 200
+
+# the words of two paragraphs must not run together in the plain text
+BLOCK_BOUNDARY = re.compile(
+    r"</?(?:p|div|br|hr|li|h[1-6]|blockquote|pre|tr|td|th|table|ul|ol)\b[^>]*>",
+    re.IGNORECASE,
+)
+
+# bleach strips the tags but keeps their text, drop these whole
+SCRIPT_OR_STYLE = re.compile(
+    r"<(script|style)\b.*?(?:</\1\s*>|$)", re.IGNORECASE | re.DOTALL
+)
+
+RENDERED_FIELDS = ["body_html", "excerpt", "word_count", "reading_time"]
+
+
+def sanitize(content):
+    return bleach.clean(
+        SCRIPT_OR_STYLE.sub("", content or ""),
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=ALLOWED_PROTOCOLS,
+        strip=True,
+        strip_comments=True,
+    )
+
+
+def to_plain_text(body_html):
+    text = html.unescape(strip_tags(BLOCK_BOUNDARY.sub(" ", body_html)))
+    return " ".join(text.split())
+
+
+def render_content(content):
+    """
+    RENDERED_FIELDS => their values for `content`.
+    """
+    body_html = sanitize(content)
+    text = to_plain_text(body_html)
+    word_count = len(text.split())
+    return {
+        "body_html": body_html,
+        "excerpt": Truncator(text).words(EXCERPT_WORDS),
+        "word_count": word_count,
+        "reading_time": max(1, math.ceil(word_count / WORDS_PER_MINUTE)),
+    }
+
+
+def render_post(post):
+    for field, value in render_content(post.content).items():
+        setattr(post, field, value)
+
+
+def render_posts(batch_size=500, everything=False, posts=None):
+    """
+    Render the posts saved before the rendered fields existed, or every post
+    with `everything` (e.g. after ALLOWED_TAGS changed), in batches of
+    `batch_size`. Returns the number of posts rendered. `updated_at` moves
+    along, the validators, sitemaps and exports see the new bodies.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    if not everything:
+        posts = posts.filter(body_html="").exclude(content="")
+    posts = posts.order_by("id").only("id", "content")
+    rendered = 0
+    last_id = 0
+    while True:
+        batch = list(posts.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        now = timezone.now()
+        for post in batch:
+            render_post(post)
+            post.updated_at = now
+        posts.model.objects.bulk_update(batch, [*RENDERED_FIELDS, "updated_at"])
+        rendered += len(batch)
+        last_id = batch[-1].pk
+    if rendered:
+        # bulk_update sends no signals, every cached page may show them
+        for version in (FRAGMENTS_VERSION, LAYOUT_VERSION, PAGES_VERSION):
+            bump_version(version)
+    return rendered
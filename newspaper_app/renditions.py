@@ -0,0 +1,169 @@
+import logging
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_renditions():
+    # name => width in pixels
+    return getattr(
+        settings,
+        "POST_IMAGE_RENDITIONS",
+        {"small": 320, "medium": 640, "large": 1024},
+    )
+
+
+def rendition_name(name, size, webp=False):
+    """
+    post_images/2023/02/08/thumb.jpeg => post_images/2023/02/08/thumb.small.jpeg
+    """
+    root, ext = posixpath.splitext(name)
+    return f"{root}.{size}{'.webp' if webp else ext}"
+
+
+def render_image(source, targets):
+    """
+    Runs in a worker process, only needs Pillow and the file system.
+    `targets` is a list of (width, path, format), files are written to a
+    temporary name first so a half written rendition is never served.
+    """
+    written = []
+    with Image.open(source) as image:
+        for width, path, image_format in targets:
+            if width >= image.width:
+                continue  # never upscale, the original is used instead
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            if image_format in ("JPEG", "WEBP") and resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+            tmp_path = f"{path}.tmp"
+            resized.save(tmp_path, format=image_format, quality=82, optimize=True)
+            os.replace(tmp_path, path)
+            written.append(path)
+    return written
+
+
+def get_targets(image):
+    # same format as the original, from the extension, the file is not opened
+    ext = posixpath.splitext(image.name)[1].lower()
+    image_format = Image.registered_extensions().get(ext, "JPEG")
+    targets = []
+    for size, width in get_renditions().items():
+        targets.append(
+            (
+                width,
+                default_storage.path(rendition_name(image.name, size)),
+                image_format,
+            )
+        )
+        targets.append(
+            (
+                width,
+                default_storage.path(rendition_name(image.name, size, webp=True)),
+                "WEBP",
+            )
+        )
+    return targets
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, "POST_IMAGE_RENDITION_WORKERS", 2)
+        )
+    return _executor
+
+
+def shutdown_executor(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def generate_renditions(image):
+    """
+    Render every size of `image` in this process, returns the written paths.
+    """
+    return render_image(default_storage.path(image.name), get_targets(image))
+
+
+def schedule_renditions(image):
+    """
+    Queue the renditions of `image` on the process pool once the current
+    transaction commits. POST_IMAGE_RENDITION_WORKERS = 0 renders inline.
+    """
+    if not image or not default_storage.exists(image.name) or has_renditions(image):
+        return
+
+    def submit():
+        if getattr(settings, "POST_IMAGE_RENDITION_WORKERS", 2) == 0:
+            generate_renditions(image)
+        else:
+            future = get_executor().submit(
+                render_image, default_storage.path(image.name), get_targets(image)
+            )
+            future.add_done_callback(partial(log_failure, image.name))
+
+    transaction.on_commit(submit)
+
+
+def log_failure(name, future):
+    # the worker's exception is only seen here
+    error = future.exception()
+    if error is not None:
+        logger.error("Rendering %s failed", name, exc_info=error)
+
+
+def has_renditions(image):
+    """
+    Whether every size narrower than `image` is rendered, the wider ones
+    never are.
+    """
+    try:
+        # reads the header only
+        with Image.open(default_storage.path(image.name)) as original:
+            width = original.width
+    except OSError:
+        return True  # not an image Pillow reads, nothing to render
+    return all(
+        default_storage.exists(rendition_name(image.name, size, webp=True))
+        for size, size_width in get_renditions().items()
+        if size_width < width
+    )
+
+
+def rendition_url(image, size, webp=False):
+    """
+    URL of a rendition, the original image while it is not rendered yet.
+    """
+    if not image:
+        return ""
+    name = rendition_name(image.name, size, webp=webp)
+    if default_storage.exists(name):
+        return default_storage.url(name)
+    return "" if webp else image.url
+
+
+def rendition_srcset(image, webp=False):
+    if not image:
+        return ""
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for name, width in (
+            (rendition_name(image.name, size, webp=webp), width)
+            for size, width in get_renditions().items()
+        )
+        if default_storage.exists(name)
+    )
@@ -0,0 +1,232 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from newspaper_app import rendering
+from newspaper_app.models import Post
+
+FTS_TABLE = "newspaper_app_post_fts"
+
+# bm25() weights for the (title, body) columns, a hit in the title counts more
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# snippet() markers, control characters cannot appear in the indexed text so
+# the snippet can be escaped first and highlighted afterwards
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+SNIPPET_TOKENS = 24
+
+
+def is_available(using=connection):
+    return using.vendor == "sqlite"
+
+
+def create_index_table(using=connection):
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            "USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_index_table(using=connection):
+    with using.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def is_searchable(post):
+    return post.status == "active" and post.published_at is not None
+
+
+def indexed_text(content):
+    # the plain text of the cards, the words of two paragraphs don't run
+    # together and each is found on its own
+    return (
+        rendering.to_plain_text(content or "")
+        .replace(MATCH_START, "")
+        .replace(MATCH_END, "")
+    )
+
+
+def index_post(post):
+    if not is_available():
+        return
+    if not is_searchable(post):
+        remove_post(post.pk)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+            [post.pk, post.title, indexed_text(post.content)],
+        )
+
+
+def index_posts(posts):
+    """
+    index_post() for many posts at once, two statements whatever the count.
+    """
+    if not is_available():
+        return
+    searchable = [post for post in posts if is_searchable(post)]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[post.pk] for post in posts]
+        )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+            [[post.pk, post.title, indexed_text(post.content)] for post in searchable],
+        )
+
+
+def remove_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def rebuild_index(posts=None, batch_size=500, using=connection):
+    """
+    Drop everything from the index and re-add the searchable posts.
+    Returns the number of indexed posts.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    posts = posts.filter(status="active", published_at__isnull=False).values_list(
+        "pk", "title", "content"
+    )
+    indexed = 0
+    with using.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        batch = []
+        for pk, title, content in posts.iterator(chunk_size=batch_size):
+            batch.append((pk, title, indexed_text(content)))
+            if len(batch) >= batch_size:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                    batch,
+                )
+                indexed += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                batch,
+            )
+            indexed += len(batch)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def to_match_expression(query):
+    # every word has to match, as a prefix so "elect" finds "election".
+    # quoting keeps user input from being read as FTS5 query syntax.
+    words = re.findall(r"\w+", query or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+    )
+
+
+class SearchResults:
+    """
+    Lazy, sliceable list of posts matching `query`, best match first.
+
+    Works with Django's Paginator and DRF paginators, each slice runs a
+    LIMIT/OFFSET query on the full-text index and one query for the posts.
+    Every post gets `search_rank` and `search_snippet` attributes, posts are
+    loaded from `queryset` so callers can add their prefetches.
+    """
+
+    def __init__(self, query, queryset=None):
+        self.query = query
+        self.queryset = Post.objects.all() if queryset is None else queryset
+        self.match = to_match_expression(query)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.match:
+                self._count = 0
+            elif not is_available():
+                self._count = self._fallback_queryset().count()
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                        [self.match],
+                    )
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0 : self.count()])
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            results = self[index : index + 1]
+            if not results:
+                raise IndexError(index)
+            return results[0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        if not self.match or stop <= start:
+            return []
+        if not is_available():
+            return list(self._fallback_queryset()[start:stop])
+        return self._fetch(start, stop - start)
+
+    def _fetch(self, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({FTS_TABLE}, %s, %s) AS rank, "
+                f"snippet({FTS_TABLE}, -1, %s, %s, %s, %s) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                "ORDER BY rank LIMIT %s OFFSET %s",
+                [
+                    TITLE_WEIGHT,
+                    BODY_WEIGHT,
+                    MATCH_START,
+                    MATCH_END,
+                    "…",
+                    SNIPPET_TOKENS,
+                    self.match,
+                    limit,
+                    offset,
+                ],
+            )
+            rows = cursor.fetchall()
+        posts = self.queryset.filter(
+            status="active", published_at__isnull=False
+        ).in_bulk([row[0] for row in rows])
+        results = []
+        for pk, rank, snippet in rows:
+            post = posts.get(pk)
+            if post is None:  # unpublished since it was indexed
+                continue
+            post.search_rank = rank
+            post.search_snippet = highlight(snippet)
+            results.append(post)
+        return results
+
+    def _fallback_queryset(self):
+        # other databases have no FTS5, plain substring search
+        return self.queryset.filter(
+            (Q(status="active") & Q(published_at__isnull=False))
+            & (Q(title__icontains=self.query) | Q(content__icontains=self.query)),
+        ).order_by("-published_at")
+
+
+def search_posts(query, queryset=None):
+    return SearchResults(query, queryset)
@@ -0,0 +1,83 @@
+"""
+The latest published posts of several categories in one query, for the
+tabs of "What's New" and the sections of the API.
+
+A ROW_NUMBER() window partitioned by category ranks the posts. On its own
+SQLite numbers every post of the categories before keeping the first few,
+so each category's `limit` newest posts are picked first with an index
+seek of post_category_published_idx and only those get ranked.
+"""
+
+from django.core.cache import cache
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from newspaper_app.fragments import FRAGMENTS_VERSION, get_timeout
+from newspaper_app.metrics import record_cache
+from newspaper_app.models import Post
+from newspaper_app.navigation import get_navigation
+from newspaper_app.versioning import get_version, snapshot_timeout
+
+SECTION_POSTS = 6
+# the API's ?limit=
+MAX_SECTION_POSTS = 20
+
+NEWEST_FIRST = [F("published_at").desc(), F("id").desc()]
+
+
+def latest_posts(category_ids, limit=SECTION_POSTS):
+    """
+    The `limit` latest published posts of each of `category_ids`, by
+    category then newest first, each with its `row_number` in its category.
+    """
+    published = Post.objects.filter(status="active", published_at__isnull=False)
+    candidates = Q(pk__in=[])
+    for category_id in category_ids:
+        candidates |= Q(
+            pk__in=published.filter(category=category_id)
+            .order_by(*NEWEST_FIRST)
+            .values("pk")[:limit]
+        )
+    # no status filter out here: the candidates are published already and
+    # SQLite would scan the index of status instead of seeking per category
+    return (
+        Post.objects.filter(candidates)
+        # the cards show the excerpt, not the body
+        .defer("content", "body_html")
+        .annotate(
+            row_number=Window(
+                RowNumber(), partition_by=[F("category")], order_by=NEWEST_FIRST
+            )
+        )
+        .order_by("category", "row_number")
+    )
+
+
+def build_sections(categories, limit=SECTION_POSTS):
+    sections = {category: [] for category in categories}
+    by_id = {category.pk: category for category in sections}
+    for post in latest_posts(list(by_id), limit):
+        # the card names the category without another query
+        post.category = by_id[post.category_id]
+        sections[post.category].append(post)
+    return sections
+
+
+def get_sections(categories=None, limit=SECTION_POSTS):
+    """
+    Category => its latest posts, in the order of `categories`, the tabs of
+    "What's New" by default. Cached as a whole until a post, category or tag
+    changes, like the fragments.
+    """
+    if categories is None:
+        categories = get_navigation()["whats_new_categories"]
+    ids = ",".join(str(category.pk) for category in categories)
+    key = f"sections:{get_version(FRAGMENTS_VERSION)}:{limit}:{ids}"
+    sections = cache.get(key)
+    record_cache("sections", sections is not None)
+    if sections is None:
+        sections = build_sections(categories, limit)
+        timeout = snapshot_timeout([FRAGMENTS_VERSION], get_timeout())
+        if timeout > 0:
+            cache.set(key, sections, timeout)
+    return sections
@@ -0,0 +1,140 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from newspaper_app import adjacency, rendering, renditions, search
+from newspaper_app.comments import count_comments
+from newspaper_app.fragments import FRAGMENTS_VERSION
+from newspaper_app.models import Category, Comment, Post, Tag
+from newspaper_app.navigation import NAVIGATION_VERSION
+from newspaper_app.page_cache import LAYOUT_VERSION
+from newspaper_app.versioning import bump_version
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_navigation(sender, **kwargs):
+    bump_version(NAVIGATION_VERSION)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_fragments(sender, **kwargs):
+    # the cached header, trending, what's new and popular posts fragments
+    bump_version(FRAGMENTS_VERSION)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_layout(sender, **kwargs):
+    # every cached page shows the category and tag names
+    bump_version(LAYOUT_VERSION)
+
+
+@receiver(pre_save, sender=Post)
+def render_content(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "content" in update_fields:
+        rendering.render_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def sync_adjacency(sender, instance, **kwargs):
+    adjacency.sync_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def unlink_adjacency(sender, instance, **kwargs):
+    # while the neighbours are still known
+    adjacency.unlink_posts([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def render_featured_image(sender, instance, **kwargs):
+    renditions.schedule_renditions(instance.featured_image)
+
+
+def touch_posts(post_ids):
+    # the API and detail page validators read Post.updated_at, bump it when
+    # something shown with the post changes without saving it
+    Post.objects.filter(pk__in=post_ids).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Comment)
+def remember_commented_post(sender, instance, raw, **kwargs):
+    # a comment moved to another post (admin) leaves the old one
+    if instance.pk and not raw:
+        instance._previous_post_id = (
+            Comment.objects.filter(pk=instance.pk)
+            .values_list("post", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if raw:
+        return  # loaddata, the fixture has the counts
+    previous_post_id = getattr(instance, "_previous_post_id", None)
+    if created:
+        count_comments([instance.post_id], 1)
+    elif previous_post_id not in (None, instance.post_id):
+        count_comments([previous_post_id], -1)
+        count_comments([instance.post_id], 1)
+    else:
+        touch_posts([instance.post_id])
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post(sender, instance, origin=None, **kwargs):
+    # every post of the deletion gets its pre_delete before the first
+    # comment is deleted, whether it started from a post, a category or a
+    # queryset
+    if origin is not None:
+        if not hasattr(origin, "_deleted_post_ids"):
+            origin._deleted_post_ids = set()
+        origin._deleted_post_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    if instance.post_id in getattr(origin, "_deleted_post_ids", ()):
+        return  # deleted along with its post
+    count_comments([instance.post_id], -1)
+
+
+@receiver(m2m_changed, sender=Post.tag.through)
+def touch_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            touch_posts([instance.pk])
+    elif action == "pre_clear":
+        # tag.post_set.clear(), the post ids are gone afterwards
+        touch_posts(instance.post_set.values("pk"))
+    elif action in ("post_add", "post_remove") and pk_set:
+        touch_posts(pk_set)
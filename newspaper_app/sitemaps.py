@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+from newspaper_app.models import Category, Post, Tag
+
+
+def get_page_size():
+    return getattr(settings, "SITEMAP_PAGE_SIZE", 5000)
+
+
+def sitemap_page(post_id):
+    # the page of the posts sitemap listing `post_id`
+    return (post_id - 1) // get_page_size() + 1
+
+
+class IdRangePaginator(Paginator):
+    """
+    Page n lists the ids in ((n - 1) * per_page, n * per_page]. A page keeps
+    its posts whatever gets published or deleted elsewhere, so a change only
+    drops the cached copy of one page. Pages can be short, or empty.
+    """
+
+    @cached_property
+    def num_pages(self):
+        # the highest id of all posts, straight from the primary key
+        last_id = self.object_list.model.objects.aggregate(last=Max("id"))["last"]
+        return max(1, -(-(last_id or 0) // self.per_page))
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list.filter(id__gt=bottom, id__lte=bottom + self.per_page),
+            number,
+            self,
+        )
+
+
+class PostSitemap(Sitemap):
+    def items(self):
+        return (
+            Post.objects.filter(status="active", published_at__isnull=False)
+            .order_by("id")
+            .only("id", "updated_at")
+        )
+
+    @property
+    def limit(self):
+        return get_page_size()
+
+    @property
+    def paginator(self):
+        return IdRangePaginator(self.items(), self.limit)
+
+    def location(self, post):
+        return reverse("post-detail", args=[post.pk])
+
+    def lastmod(self, post):
+        return post.updated_at
+
+    def get_latest_lastmod(self):
+        # instead of looping over every post
+        return self.items().aggregate(last=Max("updated_at"))["last"]
+
+
+class CategorySitemap(Sitemap):
+    def items(self):
+        return Category.objects.order_by("id").only("id")
+
+    def location(self, category):
+        return reverse("post-by-category", args=[category.pk])
+
+
+class TagSitemap(Sitemap):
+    def items(self):
+        return Tag.objects.order_by("id").only("id")
+
+    def location(self, tag):
+        return reverse("post-by-tag", args=[tag.pk])
+
+
+class StaticSitemap(Sitemap):
+    def items(self):
+        return ["home", "post-list", "about", "contact"]
+
+    def location(self, name):
+        return reverse(name)
+
+
+SITEMAPS = {
+    "pages": StaticSitemap,
+    "categories": CategorySitemap,
+    "tags": TagSitemap,
+    "posts": PostSitemap,
+}
@@ -0,0 +1,131 @@
+"""
+Django's SQLite backend tuned for a site serving many requests at once, set
+as the ENGINE of `default` in settings.py.
+
+- WAL lets readers and the writer work at the same time. It is a setting of
+  the database file, turned on once by a migration (enable_wal()) instead of
+  on every connection.
+- The SQLITE["PRAGMAS"] run on every new connection: busy_timeout makes a
+  writer wait for the lock instead of failing.
+- Transactions start with BEGIN IMMEDIATE. A deferred transaction that reads
+  before it writes gets "database is locked" right away when another
+  connection wrote in between, without waiting for busy_timeout. Every
+  atomic() block of the site writes; one that only reads (e.g. for a
+  consistent snapshot) can start deferred inside read_only() and won't hold
+  up the writers.
+- A statement outside of a transaction, or the BEGIN of one, that still
+  finds the database locked is retried SQLITE["LOCK_RETRIES"] times,
+  doubling the wait each time. A statement inside a transaction is not: the
+  transaction already holds the lock.
+
+Connections are kept between requests with CONN_MAX_AGE.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.sqlite3 import base
+from django.db.backends.sqlite3.base import Database
+
+
+def get_config():
+    config = {
+        "PRAGMAS": {
+            # enough with WAL: a crash never corrupts the database, at worst
+            # it loses the last transactions before a checkpoint
+            "synchronous": "normal",
+            "mmap_size": 256 * 1024 * 1024,  # bytes
+            "cache_size": -64 * 1024,  # KiB when negative, i.e. 64MB
+            "busy_timeout": 5000,  # milliseconds
+        },
+        "LOCK_RETRIES": 5,
+        "LOCK_BACKOFF": 0.05,  # seconds before the first retry
+    }
+    overrides = getattr(settings, "SQLITE", {})
+    pragmas = {**config["PRAGMAS"], **overrides.get("PRAGMAS", {})}
+    config.update(overrides)
+    config["PRAGMAS"] = pragmas
+    return config
+
+
+def enable_wal(connection):
+    """
+    Switch the database of `connection` to WAL. It stays on for every later
+    connection, the -wal and -shm files live next to the database.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        # not possible inside a transaction
+        cursor.execute("PRAGMA journal_mode = wal")
+
+
+@contextmanager
+def read_only(using=DEFAULT_DB_ALIAS):
+    """
+    The transactions started inside begin deferred instead of taking the
+    write lock, for the atomic() blocks that only read.
+    """
+    connection = connections[using]
+    immediate = getattr(connection, "begin_immediate", True)
+    connection.begin_immediate = False
+    try:
+        yield
+    finally:
+        connection.begin_immediate = immediate
+
+
+def is_locked(error):
+    return "database is locked" in str(error)
+
+
+def retry_on_lock(func, *args):
+    retries = delay = None
+    while True:
+        try:
+            return func(*args)
+        except Database.OperationalError as e:
+            if not is_locked(e):
+                raise
+            if retries is None:
+                config = get_config()
+                retries, delay = config["LOCK_RETRIES"], config["LOCK_BACKOFF"]
+            if retries <= 0:
+                raise
+        retries -= 1
+        # jitter, the writers that collided don't all come back at once
+        time.sleep(delay * random.uniform(0.5, 1.5))
+        delay *= 2
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    def execute(self, query, params=None):
+        if self.connection.in_transaction:
+            return super().execute(query, params)
+        return retry_on_lock(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        if self.connection.in_transaction:
+            return super().executemany(query, param_list)
+        # a generator can only be read once
+        return retry_on_lock(super().executemany, query, list(param_list))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # False inside read_only()
+    begin_immediate = True
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in get_config()["PRAGMAS"].items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def create_cursor(self, name=None):
+        return self.connection.cursor(factory=SQLiteCursorWrapper)
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE" if self.begin_immediate else "BEGIN")
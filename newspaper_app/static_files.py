@@ -0,0 +1,286 @@
+"""
+The static files as the production server sends them. `collectstatic`:
+
+- collects only the theme files the templates use, and the fonts and
+  images their stylesheets point to (ThemeFinder), out of the full aznews
+  theme in static/,
+- fingerprints them, the hash of the content goes into the file name and
+  staticfiles.json maps the names to it (ManifestStaticFilesStorage),
+- writes a gzip and a brotli copy next to every file that compresses.
+
+StaticFilesMiddleware serves STATIC_ROOT, the compressed copy the client
+accepts and far-future cache headers for the fingerprinted names: the name
+changes whenever the content does.
+"""
+
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+from pathlib import Path
+
+import brotli
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.finders import FileSystemFinder
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage,
+    staticfiles_storage,
+)
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.template.autoreload import get_template_directories
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# `{% static "..." %}` with a literal path
+STATIC_TAG = re.compile(r"""{%\s*static\s+(["'])(?P<name>[^"']+)\1""")
+# the references ManifestStaticFilesStorage rewrites in stylesheets and
+# scripts, the referenced files have to be collected along
+REFERENCES = {
+    ".css": [
+        re.compile(r"""url\(\s*(["']?)(?P<name>.*?)\1\s*\)"""),
+        re.compile(r"""@import\s*(["'])(?P<name>.*?)\1"""),
+        re.compile(r"""/\*#\s*sourceMappingURL=(?P<name>[^\s*]+)"""),
+    ],
+    ".js": [re.compile(r"""//#\s*sourceMappingURL=(?P<name>\S+)""")],
+}
+EXTERNAL = re.compile(r"^(?:[a-z]+:|//|#|/)", re.IGNORECASE)
+
+# text compresses, images and woff fonts already are
+COMPRESSED_EXTENSIONS = {
+    ".css",
+    ".eot",
+    ".html",
+    ".ico",
+    ".js",
+    ".json",
+    ".map",
+    ".svg",
+    ".ttf",
+    ".txt",
+    ".xml",
+}
+# (Content-Encoding, file suffix), the best first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+FOREVER = 365 * 24 * 60 * 60
+
+
+def get_max_age():
+    # the names that aren't fingerprinted, e.g. when the manifest is missing
+    return getattr(settings, "STATIC_MAX_AGE", 60 * 60)
+
+
+def template_references():
+    names = set()
+    for directory in get_template_directories():
+        for path in Path(directory).rglob("*.html"):
+            names.update(
+                match.group("name")
+                for match in STATIC_TAG.finditer(path.read_text(errors="ignore"))
+            )
+    return names
+
+
+def file_references(name, content):
+    """
+    The static names the stylesheet or script `name` points to.
+    """
+    for pattern in REFERENCES.get(posixpath.splitext(name)[1], []):
+        for match in pattern.finditer(content):
+            reference = match.group("name").split("?")[0].split("#")[0]
+            if reference and not EXTERNAL.match(reference):
+                yield posixpath.normpath(
+                    posixpath.join(posixpath.dirname(name), reference)
+                )
+
+
+class ThemeFinder(FileSystemFinder):
+    """
+    STATICFILES_DIRS, minus the theme files no page uses: the SCSS sources,
+    the demo images and the plugins the templates don't load.
+    """
+
+    def list(self, ignore_patterns):
+        files = {}
+        for path, storage in super().list(ignore_patterns):
+            name = path.replace(os.sep, "/")
+            if getattr(storage, "prefix", None):
+                name = posixpath.join(storage.prefix, name)
+            files[name] = (path, storage)
+        for name in self.used(files):
+            yield files[name]
+
+    def used(self, files):
+        used = set()
+        pending = [name for name in template_references() if name in files]
+        while pending:
+            name = pending.pop()
+            if name in used:
+                continue
+            used.add(name)
+            path, storage = files[name]
+            if posixpath.splitext(name)[1] in REFERENCES:
+                with storage.open(path) as f:
+                    content = f.read().decode(errors="ignore")
+                pending.extend(
+                    reference
+                    for reference in file_references(name, content)
+                    if reference in files
+                )
+        return used
+
+
+def compress(content):
+    """
+    Encoding => the compressed `content`, the encodings that make it smaller.
+    """
+    variants = {
+        "br": brotli.compress(content),
+        "gzip": gzip.compress(content, compresslevel=9, mtime=0),
+    }
+    return {
+        encoding: compressed
+        for encoding, compressed in variants.items()
+        if len(compressed) < len(content)
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    suffixes = dict(ENCODINGS)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = {*paths, *self.hashed_files.values()}
+        for name in sorted(names):
+            if posixpath.splitext(name)[1] not in COMPRESSED_EXTENSIONS:
+                continue
+            with self.open(name) as f:
+                content = f.read()
+            for encoding, compressed in compress(content).items():
+                variant = name + self.suffixes[encoding]
+                if self.exists(variant):
+                    self.delete(variant)
+                self._save(variant, ContentFile(compressed))
+                yield name, variant, True
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # the theme's stylesheets point to a few files it doesn't
+                # ship, those stay as broken as they were
+                return matchobj.group(0)
+
+        return convert
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # not in the manifest: collectstatic never ran here (tests, a
+            # checkout), or a template points to a file the theme doesn't
+            # ship, that 404s as it did before
+            return name
+
+
+def accepted_encodings(header):
+    """
+    The encodings of an Accept-Encoding header with a q-value above 0.
+    """
+    accepted = set()
+    for part in header.split(","):
+        encoding, _, params = part.strip().partition(";")
+        if not encoding:
+            continue
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serves the collected files of STATIC_ROOT before the rest of the stack
+    runs, for deployments without a web server in front. Works under WSGI
+    and ASGI; the other requests, and every request without STATIC_ROOT,
+    pass through.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.root = settings.STATIC_ROOT and os.path.realpath(settings.STATIC_ROOT)
+        self.prefix = "/" + settings.STATIC_URL.lstrip("/")
+        # the fingerprinted names, cached for ever
+        storage = staticfiles_storage
+        self.immutable = set(getattr(storage, "hashed_files", {}).values())
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def find(self, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def serve(self, request):
+        if (
+            not self.root
+            or request.method not in ("GET", "HEAD")
+            or not request.path.startswith(self.prefix)
+        ):
+            return None
+        name = request.path[len(self.prefix) :]
+        path = self.find(name)
+        if path is None:
+            return None
+
+        stat = os.stat(path)
+        if not was_modified_since(
+            request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime
+        ):
+            return HttpResponseNotModified()
+
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            variant = self.find(name + suffix)
+            if candidate in accepted and variant is not None:
+                encoding, path = candidate, variant
+                break
+
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+        # FileResponse names the file, the .gz one included
+        del response.headers["Content-Disposition"]
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Last-Modified"] = http_date(stat.st_mtime)
+        if name in self.immutable:
+            response.headers["Cache-Control"] = f"public, max-age={FOREVER}, immutable"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={get_max_age()}"
+        return response
@@ -0,0 +1,41 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from newspaper_app.fragments import cached_fragment
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        return mark_safe(
+            cached_fragment(
+                self.name.resolve(context),
+                [value.resolve(context) for value in self.vary_on],
+                lambda: self.nodelist.render(context),
+            )
+        )
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    {% fragment "trending_right" posts %} ... {% endfragment %}
+    Cached until a post, category or tag changes, per name and values of the
+    variables after it.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a name.")
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
@@ -0,0 +1,40 @@
+from django import template
+
+from newspaper_app import renditions
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition_url(image, size, webp=False):
+    """
+    {% rendition_url post.featured_image "small" %}
+    """
+    return renditions.rendition_url(image, size, webp=webp)
+
+
+@register.simple_tag
+def rendition_srcset(image, webp=False):
+    """
+    {% rendition_srcset post.featured_image webp=True as webp_srcset %}
+    Empty while no rendition of the image exists.
+    """
+    return renditions.rendition_srcset(image, webp=webp)
+
+
+@register.inclusion_tag("aznews/picture.html")
+def picture(image, size, alt="", sizes="100vw", width=None, height=None):
+    """
+    <picture> with the WebP renditions first, falls back to the original.
+
+    {% picture post.featured_image "small" alt=post.title sizes="160px" %}
+    """
+    return {
+        "src": renditions.rendition_url(image, size),
+        "srcset": renditions.rendition_srcset(image),
+        "webp_srcset": renditions.rendition_srcset(image, webp=True),
+        "alt": alt,
+        "sizes": sizes,
+        "width": width,
+        "height": height,
+    }
@@ -1,3 +1,1872 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import Future
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, router
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from newspaper_app.adjacency import get_neighbours
+from newspaper_app.conditional import get_validators
+from newspaper_app.db_router import PRIMARY_COOKIE, PrimaryStickinessMiddleware
+from newspaper_app.metrics import registry
+from newspaper_app.models import (
+    Category,
+    Comment,
+    Newsletter,
+    Post,
+    PostAdjacency,
+    PostView,
+    Tag,
+    TrendingScore,
+)
+from newspaper_app.navigation import navigation
+from newspaper_app.page_cache import CSRF_PLACEHOLDER, LAYOUT_VERSION, PAGES_VERSION
+from newspaper_app.renditions import (
+    has_renditions,
+    log_failure,
+    rendition_name,
+    rendition_url,
+    shutdown_executor,
+)
+from newspaper_app.pagination import InvalidCursor, KeysetPaginator
+from newspaper_app.search import FTS_TABLE, search_posts
+from newspaper_app.sections import get_sections, latest_posts
+from newspaper_app.sqlite.base import enable_wal, read_only, retry_on_lock
+from newspaper_app.static_files import ThemeFinder, accepted_encodings
+from newspaper_app.trending import trending_posts, update_trending
+from newspaper_app.versioning import bump_version, snapshot_timeout
+from newspaper_app.view_counter import ViewCounter, view_counter
+from newspaper_app.views import ADJACENCY_RELATED
+
+
+def create_post(author, category, **kwargs):
+    kwargs.setdefault("title", "Post")
+    kwargs.setdefault("content", "<p>content</p>")
+    kwargs.setdefault("featured_image", "post_images/test.jpg")
+    kwargs.setdefault("published_at", timezone.now())
+    return Post.objects.create(author=author, category=category, **kwargs)
+
+
+# the shared counter's timer would flush into whatever test runs by then
+no_flush_timer = override_settings(VIEW_COUNTER={"FLUSH_TIMER": False})
+
+
+def setUpModule():
+    no_flush_timer.enable()
+
+
+def tearDownModule():
+    # the detail pages buffer views, flush them while the test database is
+    # still there instead of at exit, into the development database
+    view_counter.flush()
+    no_flush_timer.disable()
+
+
+class ViewCounterTest(TransactionTestCase):
+    def setUp(self):
+        # drop hits other tests left in the shared counter
+        view_counter.flush()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.post = create_post(self.user, self.category)
+
+    def test_flush_writes_buffered_hits_in_one_update(self):
+        counter = ViewCounter(flush_interval=3600, flush_threshold=1000)
+        for _ in range(5):
+            counter.hit(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 0)
+
+        # BEGIN + a single UPDATE + the INSERT of the trending activity
+        with self.assertNumQueries(3):
+            self.assertEqual(counter.flush(), 5)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 5)
+        self.assertEqual(
+            list(PostView.objects.values_list("post", "views")), [(self.post.pk, 5)]
+        )
+
+    def test_flush_does_not_touch_updated_at(self):
+        updated_at = self.post.updated_at
+        counter = ViewCounter(flush_interval=3600, flush_threshold=1000)
+        counter.hit(self.post.pk)
+        counter.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.updated_at, updated_at)
+
+    def test_threshold_triggers_flush(self):
+        counter = ViewCounter(flush_interval=3600, flush_threshold=3)
+        for _ in range(3):
+            counter.hit(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 3)
+        self.assertEqual(counter.pending(self.post.pk), 0)
+
+    @override_settings(VIEW_COUNTER={"FLUSH_TIMER": True})
+    def test_timer_flushes_an_idle_counter(self):
+        counter = ViewCounter(flush_interval=0.2, flush_threshold=1000)
+        counter.hit(self.post.pk)
+        counter.hit(self.post.pk)
+        self.assertEqual(counter.pending(self.post.pk), 2)
+        # no other hit comes in
+        counter._timer.join(5)
+        self.assertEqual(counter.pending(self.post.pk), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 2)
+
+    def test_no_increments_lost_under_concurrent_hits(self):
+        other = create_post(self.user, self.category)
+        counter = ViewCounter(flush_interval=3600, flush_threshold=10**9)
+        threads_count, hits_per_thread = 8, 500
+
+        def worker():
+            for i in range(hits_per_thread):
+                counter.hit(self.post.pk if i % 2 else other.pk)
+
+        threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        # flush while the hits are still coming in
+        while any(thread.is_alive() for thread in threads):
+            counter.flush()
+        for thread in threads:
+            thread.join()
+        counter.flush()
+
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        half = threads_count * hits_per_thread // 2
+        self.assertEqual(self.post.views_count, half)
+        self.assertEqual(other.views_count, half)
+
+    @override_settings(VIEW_COUNTER={"FLUSH_INTERVAL": 3600, "FLUSH_THRESHOLD": 1000})
+    def test_detail_view_buffers_hits(self):
+        url = reverse("post-detail", args=[self.post.pk])
+        for _ in range(3):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["post"].views_count, 3)
+        view_counter.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 3)
+
+
+class NavigationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.sports = Category.objects.create(name="Sports")
+        self.politics = Category.objects.create(name="Politics")
+        Tag.objects.create(name="nepal")
+        create_post(self.user, self.sports, views_count=5)
+        create_post(self.user, self.politics, views_count=3)
+        create_post(self.user, self.politics, views_count=4)
+
+    def test_is_lazy(self):
+        with self.assertNumQueries(0):
+            navigation(None)
+
+    def test_top_categories_ordered_by_total_views(self):
+        context = navigation(None)
+        self.assertEqual(list(context["top_categories"]), [self.politics, self.sports])
+        self.assertEqual(
+            list(context["whats_new_categories"]), [self.politics, self.sports]
+        )
+
+    def test_snapshot_is_cached(self):
+        list(navigation(None)["categories"])
+        with self.assertNumQueries(0):
+            context = navigation(None)
+            self.assertEqual(len(context["categories"]), 2)
+            self.assertEqual(len(context["tags"]), 1)
+            self.assertEqual(len(context["top_categories"]), 2)
+
+    def test_snapshot_invalidated_on_change(self):
+        list(navigation(None)["categories"])
+        Category.objects.create(name="Science")
+        self.assertEqual(len(navigation(None)["categories"]), 3)
+        Tag.objects.all().delete()
+        self.assertEqual(len(navigation(None)["tags"]), 0)
+
+    def test_page_render_runs_no_navigation_queries_when_warm(self):
+        self.client.get(reverse("contact"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("contact"))
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.election = create_post(
+            self.user,
+            self.category,
+            title="Election results announced",
+            content="<p>The <b>counting</b> is over.</p>",
+        )
+        self.mention = create_post(
+            self.user,
+            self.category,
+            title="Weather",
+            content="<p>Rain expected on election day &amp; after.</p>",
+        )
+        self.draft = create_post(
+            self.user, self.category, title="Election draft", published_at=None
+        )
+
+    def test_title_match_ranks_first(self):
+        results = search_posts("election")
+        self.assertEqual(results.count(), 2)
+        self.assertEqual(list(results), [self.election, self.mention])
+
+    def test_prefix_and_all_words_match(self):
+        self.assertEqual(list(search_posts("elect")), [self.election, self.mention])
+        self.assertEqual(list(search_posts("election rain")), [self.mention])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        post = search_posts("rain")[0]
+        self.assertIn("<mark>Rain</mark>", post.search_snippet)
+        self.assertIn("&amp; after", post.search_snippet)
+        self.assertNotIn("<p>", post.search_snippet)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(search_posts('"election -(* ^').count(), 2)
+        self.assertEqual(search_posts("   ").count(), 0)
+
+    def test_index_follows_post_changes(self):
+        self.draft.published_at = timezone.now()
+        self.draft.save()
+        self.assertEqual(search_posts("election").count(), 3)
+        self.election.status = "in_active"
+        self.election.save()
+        self.assertEqual(search_posts("election").count(), 2)
+        self.mention.delete()
+        self.assertEqual(list(search_posts("election")), [self.draft])
+
+    def test_words_of_two_paragraphs_are_found_apart(self):
+        create_post(
+            self.user,
+            self.category,
+            title="Parliament",
+            content="<p>Parliament passed</p><p>zanzibarword today</p>line<br>kilimanjaro",
+        )
+        self.assertEqual(search_posts("zanzibarword").count(), 1)
+        self.assertEqual(search_posts("kilimanjaro").count(), 1)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.assertEqual(search_posts("election").count(), 0)
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 2 posts.", out.getvalue())
+        self.assertEqual(search_posts("election").count(), 2)
+
+    def test_search_view(self):
+        response = self.client.get(reverse("post-search"), {"query": "election"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page_obj"].paginator.count, 2)
+        self.assertContains(response, "<mark>")
+
+    def test_search_view_without_query(self):
+        response = self.client.get(reverse("post-search"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page_obj"].paginator.count, 0)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        now = timezone.now()
+        self.posts = [
+            create_post(
+                self.user,
+                self.category,
+                title=f"Post {i}",
+                # two posts per timestamp, the id breaks the tie
+                published_at=now - timezone.timedelta(hours=i // 2),
+            )
+            for i in range(7)
+        ]
+        self.queryset = Post.objects.filter(published_at__isnull=False)
+        self.expected = sorted(
+            self.posts, key=lambda post: (post.published_at, post.id), reverse=True
+        )
+
+    def test_pages_cover_everything_once(self):
+        paginator = KeysetPaginator(self.queryset, 3)
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            seen += list(page)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(paginator.count, 7)
+
+    def test_previous_cursor(self):
+        paginator = KeysetPaginator(self.queryset, 3)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertTrue(back.has_next())
+        self.assertFalse(back.has_previous())
+
+    def test_page_is_one_query_without_count(self):
+        paginator = KeysetPaginator(self.queryset, 3, count=False)
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1):
+            page = paginator.page(cursor)
+            self.assertIsNone(paginator.count)
+        self.assertEqual(list(page), self.expected[3:6])
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(self.queryset, 3)
+        for cursor in ("garbage", "e30", "eyJ2IjpbMV0sInIiOmZhbHNlfQ"):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+    def test_list_view(self):
+        response = self.client.get(reverse("post-list"), {"page_size": 4})
+        self.assertEqual(list(response.context["posts"]), self.expected[:4])
+        response = self.client.get(
+            reverse("post-list"),
+            {"page_size": 4, "cursor": response.context["page_obj"].next_cursor},
+        )
+        self.assertEqual(list(response.context["posts"]), self.expected[4:])
+        self.assertEqual(
+            self.client.get(reverse("post-list"), {"cursor": "bad"}).status_code, 404
+        )
+
+
+class QueryPlanTest(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on every query of the public pages and API reads
+    and fails when one of them scans the whole post or comment table.
+    """
+
+    FULL_SCAN = re.compile(
+        r"\bSCAN (newspaper_app_post|newspaper_app_comment)\b(?! USING)"
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.tag = Tag.objects.create(name="nepal")
+        self.post = create_post(self.user, self.category, title="Election")
+        self.post.tag.add(self.tag)
+        Comment.objects.create(
+            post=self.post, comment="comment", name="reader", email="r@a.com"
+        )
+        create_post(self.user, self.category, published_at=None)
+
+    def full_scans(self, url, params=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT"):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                for row in cursor.fetchall():
+                    if self.FULL_SCAN.search(row[-1]):
+                        scans.append(f"{row[-1]}\n    {sql}")
+        return scans
+
+    def assertNoFullScans(self, url, params=None):
+        scans = self.full_scans(url, params)
+        self.assertFalse(scans, f"{url} scans a whole table:\n" + "\n".join(scans))
+
+    def test_pages(self):
+        self.assertNoFullScans(reverse("home"))
+        self.assertNoFullScans(reverse("about"))
+        self.assertNoFullScans(reverse("post-detail", args=[self.post.pk]))
+        self.assertNoFullScans(reverse("post-list"))
+        self.assertNoFullScans(reverse("post-by-category", args=[self.category.pk]))
+        self.assertNoFullScans(reverse("post-by-tag", args=[self.tag.pk]))
+        self.assertNoFullScans(reverse("post-search"), {"query": "election"})
+
+    def test_api(self):
+        self.assertNoFullScans(reverse("posts-list"))
+        self.assertNoFullScans(reverse("posts-list"), {"comments": "latest:3"})
+        self.assertNoFullScans(reverse("posts-detail", args=[self.post.pk]))
+        self.assertNoFullScans(reverse("post-by-category-api", args=[self.category.pk]))
+        self.assertNoFullScans(reverse("post-by-tag-api", args=[self.tag.pk]))
+        self.assertNoFullScans(reverse("comments-api", args=[self.post.pk]))
+        self.assertNoFullScans(reverse("post-search-api"), {"query": "election"})
+        self.assertNoFullScans(
+            reverse("sections-api"), {"categories": str(self.category.pk)}
+        )
+
+    def test_drafts(self):
+        self.client.force_login(self.user)
+        self.assertNoFullScans(reverse("draft-list"))
+
+    def test_validators_read_only_the_index(self):
+        queryset = Post.objects.filter(status="active", published_at__isnull=False)
+        with CaptureQueriesContext(connection) as queries:
+            get_validators([queryset])
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+            self.assertIn(
+                "USING COVERING INDEX post_validators_idx", cursor.fetchall()[0][-1]
+            )
+
+    def test_detects_full_scan(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM newspaper_app_post WHERE title = 'x'"
+            )
+            self.assertTrue(self.FULL_SCAN.search(cursor.fetchall()[0][-1]))
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.news = Category.objects.create(name="News")
+        self.sports = Category.objects.create(name="Sports")
+        self.post = create_post(self.user, self.news, title="First story")
+        self.draft = create_post(
+            self.user, self.news, title="Breaking story", published_at=None
+        )
+
+    def test_anonymous_hit_runs_no_queries(self):
+        self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "First story")
+
+    def test_hit_carries_the_visitors_csrf_token(self):
+        self.client.get(reverse("about"))
+        other = self.client_class()
+        response = other.get(reverse("about"))
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+        self.assertIn("csrftoken", response.cookies)
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+
+    def test_key_varies_on_query_string(self):
+        create_post(self.user, self.news, title="Second story")
+        first = self.client.get(reverse("post-list"))
+        cursor = first.context["page_obj"].next_cursor
+        second = self.client.get(reverse("post-list"), {"cursor": cursor})
+        self.assertNotEqual(first.content, second.content)
+
+    def test_logged_in_users_are_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("home"))
+        response = self.client.get(reverse("home"))
+        self.assertIsNotNone(response.context)
+
+    def test_publish_invalidates(self):
+        self.client.get(reverse("home"))
+        self.client.get(reverse("post-by-category", args=[self.sports.pk]))
+        editor = self.client_class()
+        editor.force_login(self.user)
+        editor.get(reverse("post-publish", args=[self.draft.pk]))
+
+        self.assertContains(self.client.get(reverse("home")), "Breaking story")
+        # other categories keep their cached page
+        with self.assertNumQueries(0):
+            self.client.get(reverse("post-by-category", args=[self.sports.pk]))
+
+    def test_api_publish_invalidates(self):
+        self.client.get(reverse("post-by-category", args=[self.news.pk]))
+        editor = self.client_class()
+        editor.force_login(self.user)
+        editor.post(reverse("post-publish-api"), {"post": self.draft.pk})
+        response = self.client.get(reverse("post-by-category", args=[self.news.pk]))
+        self.assertEqual(response.context["paginator"].count, 2)
+
+    def test_category_change_invalidates(self):
+        self.client.get(reverse("post-by-category", args=[self.sports.pk]))
+        self.news.name = "World"
+        self.news.save()
+        response = self.client.get(reverse("post-by-category", args=[self.sports.pk]))
+        self.assertContains(response, "World")
+
+    def test_delete_invalidates(self):
+        create_post(self.user, self.news, title="Second story")
+        self.client.get(reverse("home"))
+        editor = self.client_class()
+        editor.force_login(self.user)
+        editor.post(reverse("post-delete", args=[self.post.pk]))
+        self.assertNotContains(self.client.get(reverse("home")), "First story")
+
+    def test_home_expires_when_a_weekly_post_leaves_the_window(self):
+        self.post.published_at = timezone.now() - timezone.timedelta(
+            days=7, seconds=-30
+        )
+        self.post.save()
+        response = self.client.get(reverse("home"))
+        view = response.resolver_match.func.view_class()
+        self.assertLessEqual(view.get_page_cache_timeout(response), 30)
+
+
+@override_settings(
+    POST_IMAGE_RENDITIONS={"small": 100, "large": 300},
+    POST_IMAGE_RENDITION_WORKERS=0,
+)
+class RenditionTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+
+    def upload(self, size=(200, 100), name="photo.jpg"):
+        data = BytesIO()
+        Image.new("RGB", size, "red").save(data, format="JPEG")
+        return SimpleUploadedFile(name, data.getvalue(), content_type="image/jpeg")
+
+    def test_renders_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = create_post(self.user, self.category, featured_image=self.upload())
+        image = post.featured_image
+        small = rendition_name(image.name, "small")
+        self.assertTrue(small.endswith("photo.small.jpg"))
+        self.assertEqual(os.path.dirname(small), os.path.dirname(image.name))
+        with Image.open(os.path.join(self.media_root, small)) as rendered:
+            self.assertEqual(rendered.size, (100, 50))
+        with Image.open(
+            os.path.join(self.media_root, rendition_name(image.name, "small", True))
+        ) as rendered:
+            self.assertEqual(rendered.format, "WEBP")
+        # never upscaled, 300 is wider than the original
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(self.media_root, rendition_name(image.name, "large"))
+            )
+        )
+
+    def test_process_pool(self):
+        with override_settings(POST_IMAGE_RENDITION_WORKERS=1):
+            with self.captureOnCommitCallbacks(execute=True):
+                post = create_post(
+                    self.user, self.category, featured_image=self.upload((400, 200))
+                )
+            shutdown_executor()
+        self.assertTrue(has_renditions(post.featured_image))
+
+    def test_narrow_image_counts_as_rendered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = create_post(self.user, self.category, featured_image=self.upload())
+        # 200px wide, there is no large rendition
+        self.assertTrue(has_renditions(post.featured_image))
+        with self.captureOnCommitCallbacks() as callbacks:
+            post.save()
+        self.assertEqual(callbacks, [])
+
+    def test_failed_rendering_is_logged(self):
+        future = Future()
+        future.set_exception(OSError("broken"))
+        with self.assertLogs("newspaper_app.renditions", "ERROR") as logs:
+            log_failure("post_images/photo.jpg", future)
+        self.assertIn("post_images/photo.jpg", logs.output[0])
+
+    def test_missing_rendition_falls_back_to_original(self):
+        post = create_post(self.user, self.category, featured_image=self.upload())
+        image = post.featured_image
+        self.assertEqual(rendition_url(image, "small"), image.url)
+        self.assertEqual(rendition_url(image, "small", webp=True), "")
+        html = Template(
+            '{% load renditions %}{% picture image "small" alt="A" %}'
+        ).render(Context({"image": image}))
+        self.assertIn(f'src="{image.url}"', html)
+        self.assertNotIn("image/webp", html)
+
+    def test_template_tag_and_serializer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = create_post(self.user, self.category, featured_image=self.upload())
+        image = post.featured_image
+        html = Template(
+            '{% load renditions %}{% picture image "small" alt="A" sizes="160px" %}'
+        ).render(Context({"image": image}))
+        webp = rendition_url(image, "small", webp=True)
+        self.assertIn(f'srcset="{webp} 100w"', html)
+        self.assertIn(f'src="{rendition_url(image, "small")}"', html)
+
+        response = self.client.get(reverse("posts-detail", args=[post.pk]))
+        self.assertEqual(
+            response.data["renditions"]["small"]["webp"], f"http://testserver{webp}"
+        )
+        self.assertNotIn("large", response.data["renditions"])
+
+
+class SeedDataTest(TestCase):
+    def seed(self, **options):
+        options = {
+            "users": 3,
+            "categories": 4,
+            "tags": 6,
+            "posts": 40,
+            "comments": 80,
+            "newsletters": 5,
+            "contacts": 2,
+            "views": 30,
+            "batch_size": 7,
+            **options,
+        }
+        call_command("seed_data", stdout=StringIO(), **options)
+
+    def test_creates_the_requested_rows(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Category.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(Newsletter.objects.count(), 5)
+        self.assertGreaterEqual(Post.tag.through.objects.count(), 40)
+        self.assertTrue(
+            search_posts(
+                Post.objects.filter(published_at__isnull=False)
+                .filter(status="active")
+                .first()
+                .title
+            ).count()
+        )
+
+    def test_is_deterministic(self):
+        self.seed()
+        first = list(Post.objects.order_by("pk").values_list("title", "views_count"))
+        self.seed(clear=True)
+        second = list(Post.objects.order_by("pk").values_list("title", "views_count"))
+        self.assertEqual(first, second)
+        self.assertEqual(Post.objects.count(), 40)
+
+
+class BenchmarkTest(TestCase):
+    def test_report(self):
+        call_command(
+            "seed_data",
+            users=2,
+            categories=2,
+            tags=2,
+            posts=10,
+            comments=10,
+            newsletters=1,
+            contacts=1,
+            stdout=StringIO(),
+        )
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark",
+                runs=2,
+                output=output.name,
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+            report = json.load(open(output.name))
+        results = {result["name"]: result for result in report["results"]}
+        for name in ("home", "post-detail", "post-list", "posts-list", "comments-api"):
+            self.assertEqual(results[name]["status"], 200, name)
+            self.assertGreater(results[name]["bytes"], 0)
+            self.assertIn("p95_ms", results[name])
+        # login only pages are measured logged in, data changing ones never
+        self.assertTrue(results["draft-list"]["logged_in"])
+        self.assertEqual(results["draft-list"]["status"], 200)
+        self.assertNotIn("post-delete", results)
+        self.assertNotIn("tag-delete", results)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.post = create_post(self.user, self.category, title="First story")
+
+    def metric(self, text, name):
+        match = re.search(rf"^{re.escape(name)} (\S+)$", text, re.M)
+        self.assertIsNotNone(match, name)
+        return float(match.group(1))
+
+    def test_unknown_methods_share_a_label(self):
+        detail = reverse("post-detail", args=[self.post.pk])
+        self.client.generic("MADEUP", detail)
+        self.client.generic("ANOTHER", detail)
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertNotIn("MADEUP", text)
+        self.assertEqual(
+            self.metric(
+                text,
+                'newspaper_requests_total{view="post-detail",method="other",status="405"}',
+            ),
+            2,
+        )
+
+    def test_records_per_url_name(self):
+        detail = reverse("post-detail", args=[self.post.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(detail)
+        self.client.get(detail)
+        self.client.get(reverse("posts-list"))
+        text = self.client.get(reverse("metrics")).content.decode()
+
+        self.assertEqual(
+            self.metric(
+                text,
+                'newspaper_requests_total{view="post-detail",method="GET",status="200"}',
+            ),
+            2,
+        )
+        self.assertEqual(
+            self.metric(
+                text, 'newspaper_request_duration_seconds_count{view="posts-list"}'
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.metric(
+                text,
+                'newspaper_request_duration_seconds_bucket{view="post-detail",le="+Inf"}',
+            ),
+            2,
+        )
+        self.assertEqual(
+            self.metric(text, 'newspaper_db_queries_count{view="post-detail"}'), 2
+        )
+        self.assertGreaterEqual(
+            self.metric(text, 'newspaper_db_queries_sum{view="post-detail"}'),
+            len(queries),
+        )
+        self.assertGreater(
+            self.metric(
+                text, 'newspaper_render_duration_seconds_sum{view="post-detail"}'
+            ),
+            0,
+        )
+
+    def test_cache_hits_and_misses(self):
+        self.client.get(reverse("about"))
+        self.client.get(reverse("about"))
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertEqual(
+            self.metric(
+                text,
+                'newspaper_cache_requests_total{view="about",cache="page",result="miss"}',
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.metric(
+                text,
+                'newspaper_cache_requests_total{view="about",cache="page",result="hit"}',
+            ),
+            1,
+        )
+
+    def test_unmatched_urls_share_one_label(self):
+        self.client.get("/no-such-page/")
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('view="unmatched",method="GET",status="404"', text)
+
+    def test_staff_or_internal_ips_only(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.8").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(url, REMOTE_ADDR="10.0.0.8")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        view_counter.flush()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.post = create_post(self.user, self.category, title="First story")
+        self.url = reverse("post-detail", args=[self.post.pk])
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def test_not_modified_still_counts_the_view(self):
+        response = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", response)
+        with self.assertNumQueries(1):  # the validator aggregate
+            again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(view_counter.pending(self.post.pk), 2)
+
+    def test_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+        Comment.objects.create(
+            post=self.post, comment="first", name="reader", email="r@a.com"
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "first")
+
+        # header categories
+        etag = response["ETag"]
+        Category.objects.create(name="Sports")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # logged in visitors see other links
+        etag = response["ETag"]
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unpublished(self):
+        self.post.published_at = None
+        self.post.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class AsyncViewsTest(TestCase):
+    """
+    The read views through the async handler, as under ASGI.
+    """
+
+    def setUp(self):
+        cache.clear()
+        view_counter.flush()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.tag = Tag.objects.create(name="nepal")
+        self.post = create_post(self.user, self.category, title="Election results")
+        self.post.tag.add(self.tag)
+        self.older = create_post(
+            self.user,
+            self.category,
+            title="Budget speech",
+            published_at=timezone.now() - timezone.timedelta(days=1),
+        )
+
+    def tearDown(self):
+        view_counter.flush()
+
+    async def test_pages(self):
+        for url, text in (
+            (reverse("home"), "Election results"),
+            (reverse("post-detail", args=[self.older.pk]), "Budget speech"),
+            (reverse("post-list"), "Election results"),
+            (reverse("post-by-category", args=[self.category.pk]), "Election"),
+            (reverse("post-by-tag", args=[self.tag.pk]), "Election results"),
+            (reverse("post-search") + "?query=budget", "Budget"),
+        ):
+            response = await self.async_client.get(url)
+            self.assertContains(response, text, msg_prefix=url)
+
+    async def test_logged_in(self):
+        await sync_to_async(self.client.force_login)(self.user)
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(reverse("home"))
+        self.assertContains(response, "Election results")
+        response = await self.async_client.get(reverse("post-list"))
+        self.assertEqual(response.status_code, 200)
+
+    async def test_detail(self):
+        url = reverse("post-detail", args=[self.older.pk])
+        response = await self.async_client.get(url)
+        # by id
+        self.assertEqual(response.context["previous_post"], self.post)
+        self.assertIsNone(response.context["next_post"])
+        self.assertEqual(response.context["post"].views_count, 1)
+
+        # extra AsyncClient kwargs are header names
+        again = await self.async_client.get(url, **{"if-none-match": response["ETag"]})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(view_counter.pending(self.older.pk), 2)
+
+        response = await self.async_client.get(reverse("post-detail", args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cached_page_and_cursor(self):
+        url = reverse("post-list")
+        first = await self.async_client.get(url, {"page_size": 1})
+        cursor = first.context["page_obj"].next_cursor
+        self.assertEqual(first.context["paginator"].count, 2)
+        second = await self.async_client.get(url, {"page_size": 1, "cursor": cursor})
+        self.assertContains(second, "Budget speech")
+        cached = await self.async_client.get(url, {"page_size": 1})
+        self.assertIsNone(cached.context)
+        self.assertContains(cached, "Election results")
+        invalid = await self.async_client.get(url, {"cursor": "nope"})
+        self.assertEqual(invalid.status_code, 404)
+
+
+class ServerBenchmarkTest(TransactionTestCase):
+    # the WSGI worker threads use connections of their own, the data
+    # has to be committed
+    def test_report(self):
+        cache.clear()
+        call_command(
+            "seed_data",
+            users=2,
+            categories=2,
+            tags=2,
+            posts=5,
+            comments=5,
+            newsletters=1,
+            contacts=1,
+            stdout=StringIO(),
+        )
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark_servers",
+                requests=12,
+                concurrency=4,
+                workers=2,
+                output=output.name,
+                stdout=StringIO(),
+            )
+            report = json.load(open(output.name))
+        for name in ("wsgi", "asgi"):
+            result = report["results"][name]
+            self.assertEqual(result["requests"], 12)
+            self.assertEqual(result["statuses"], [200])
+            self.assertGreater(result["requests_per_second"], 0)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.tags = [Tag.objects.create(name=f"tag {i}") for i in range(2)]
+        self.now = timezone.now()
+        self.posts = []
+        for i in range(5):
+            post = create_post(self.user, self.category, title=f"Post {i}")
+            post.tag.add(*self.tags[: i % 3])
+            # oldest first
+            Post.objects.filter(pk=post.pk).update(
+                updated_at=self.now - timezone.timedelta(days=5 - i)
+            )
+            self.posts.append(post)
+        # comments touch their post, keep it the oldest
+        Comment.objects.create(
+            post=self.posts[0], comment="first", name="reader", email="r@a.com"
+        )
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            updated_at=self.now - timezone.timedelta(days=5)
+        )
+        Newsletter.objects.create(email="reader@example.com")
+
+    def export(self, *args, **options):
+        out = StringIO()
+        call_command("export_data", *args, stdout=out, **options)
+        return out.getvalue()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export("posts").splitlines()]
+        self.assertEqual([row["id"] for row in rows], [post.pk for post in self.posts])
+        self.assertEqual(rows[1]["tags"], [self.tags[0].pk])
+        self.assertEqual(rows[2]["tags"], [tag.pk for tag in self.tags])
+        self.assertEqual(rows[0]["tags"], [])
+        self.assertEqual(rows[0]["featured_image"], "post_images/test.jpg")
+
+    def test_csv(self):
+        lines = self.export("comments", format="csv").splitlines()
+        self.assertEqual(
+            lines[0], "id,post_id,comment,name,email,created_at,updated_at"
+        )
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f"{Comment.objects.get().pk},"))
+
+    def test_since(self):
+        since = (self.now - timezone.timedelta(days=2, hours=1)).isoformat()
+        rows = self.export("posts", since=since).splitlines()
+        self.assertEqual(
+            [json.loads(row)["id"] for row in rows],
+            [post.pk for post in self.posts[3:]],
+        )
+        with self.assertRaises(CommandError):
+            self.export("posts", since="yesterday")
+
+    def test_reads_in_chunks(self):
+        # posts in chunks of two: 3 chunks, each with its tag query
+        with self.assertNumQueries(4):
+            self.export("posts", chunk_size=2)
+
+    def test_output_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "newsletters.csv")
+            self.export("newsletters", format="csv", output=path)
+            with open(path) as f:
+                self.assertIn("reader@example.com", f.read())
+
+
+class TrendingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.evergreen = create_post(
+            self.user, self.category, title="Evergreen", views_count=10**6
+        )
+        self.fresh = create_post(self.user, self.category, title="Fresh")
+        self.now = timezone.now()
+
+    def score(self, post, window):
+        return TrendingScore.objects.get(post=post, window=window).score
+
+    def test_scores_decay(self):
+        PostView.objects.create(post=self.fresh, views=8)
+        self.assertEqual(update_trending(self.now), 8)
+        self.assertFalse(PostView.objects.exists())
+        self.assertEqual(self.score(self.fresh, "hourly"), 8)
+
+        PostView.objects.create(post=self.fresh, views=1)
+        update_trending(self.now + timezone.timedelta(hours=2))
+        # 8 halved twice, plus the new view
+        self.assertAlmostEqual(self.score(self.fresh, "hourly"), 3)
+        self.assertAlmostEqual(self.score(self.fresh, "daily"), 8 * 0.5 ** (2 / 24) + 1)
+
+    def test_lifetime_views_do_not_trend(self):
+        PostView.objects.create(post=self.fresh, views=3)
+        update_trending()
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["featured_post"], self.fresh)
+        response = self.client.get(reverse("post-detail", args=[self.fresh.pk]))
+        # the rest is topped up with the most viewed
+        self.assertEqual(
+            list(response.context["recent_posts"]), [self.fresh, self.evergreen]
+        )
+
+    def test_most_viewed_before_the_first_run(self):
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["featured_post"], self.evergreen)
+        response = self.client.get(reverse("post-detail", args=[self.fresh.pk]))
+        self.assertEqual(
+            list(response.context["recent_posts"]), [self.evergreen, self.fresh]
+        )
+
+    def test_only_published_posts_score(self):
+        draft = create_post(self.user, self.category, published_at=None)
+        PostView.objects.create(post=draft, views=5)
+        PostView.objects.create(post_id=draft.pk + 100, views=5)  # deleted since
+        self.assertEqual(update_trending(), 0)
+        self.assertFalse(TrendingScore.objects.exists())
+
+    @override_settings(TRENDING={"LEADERBOARD_SIZE": 1, "MIN_SCORE": 1})
+    def test_leaderboard_stays_compact(self):
+        PostView.objects.create(post=self.fresh, views=2)
+        PostView.objects.create(post=self.evergreen, views=1)
+        update_trending(self.now)
+        self.assertEqual(
+            list(TrendingScore.objects.values_list("post", flat=True).distinct()),
+            [self.fresh.pk],
+        )
+        # two weeks later even the weekly score decayed below MIN_SCORE
+        update_trending(self.now + timezone.timedelta(days=14))
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_top_posts_read_from_the_index(self):
+        published = Post.objects.filter(status="active", published_at__isnull=False)
+        plan = trending_posts(published, "daily", 5).explain()
+        self.assertIn("trending_top_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class FeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.news = Category.objects.create(name="News")
+        self.sports = Category.objects.create(name="Sports")
+        self.tag = Tag.objects.create(name="nepal")
+        self.post = create_post(self.user, self.news, title="First story")
+        self.post.tag.add(self.tag)
+        create_post(self.user, self.sports, title="Cricket final")
+        self.draft = create_post(
+            self.user, self.news, title="Breaking story", published_at=None
+        )
+
+    def test_feeds(self):
+        response = self.client.get(reverse("post-feed"))
+        self.assertEqual(response["Content-Type"], "application/rss+xml; charset=utf-8")
+        self.assertIn("Last-Modified", response)
+        self.assertContains(response, "First story")
+        self.assertContains(response, "<category>nepal</category>")
+        self.assertNotContains(response, "Breaking story")
+
+        response = self.client.get(reverse("category-feed-atom", args=[self.news.pk]))
+        self.assertEqual(
+            response["Content-Type"], "application/atom+xml; charset=utf-8"
+        )
+        self.assertContains(response, "First story")
+        self.assertNotContains(response, "Cricket final")
+
+        response = self.client.get(reverse("tag-feed", args=[self.tag.pk]))
+        self.assertContains(response, "First story")
+        self.assertNotContains(response, "Cricket final")
+        self.assertEqual(self.client.get("/feeds/tag/0/rss/").status_code, 404)
+
+    def test_cached_until_a_post_is_published(self):
+        url = reverse("category-feed", args=[self.news.pk])
+        other = reverse("category-feed", args=[self.sports.pk])
+        first = self.client.get(url)
+        self.client.get(other)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached["Last-Modified"], first["Last-Modified"])
+
+        editor = self.client_class()
+        editor.force_login(self.user)
+        editor.get(reverse("post-publish", args=[self.draft.pk]))
+        self.assertContains(self.client.get(url), "Breaking story")
+        # the other categories stay cached
+        with self.assertNumQueries(0):
+            self.client.get(other)
+
+    def test_renaming_a_tag_drops_the_latest_posts_feed(self):
+        url = reverse("post-feed")
+        self.client.get(url)
+        self.tag.name = "kathmandu"
+        self.tag.save()
+        self.assertContains(self.client.get(url), "<category>kathmandu</category>")
+
+
+@override_settings(SITEMAP_PAGE_SIZE=2)
+class SitemapTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.posts = [
+            create_post(self.user, self.category, title=f"Post {i}") for i in range(4)
+        ]
+        self.draft = create_post(self.user, self.category, published_at=None)
+
+    def locations(self, response):
+        return re.findall(
+            r"<loc>http://testserver([^<]+)</loc>", response.content.decode()
+        )
+
+    def test_index(self):
+        response = self.client.get(reverse("sitemap-index"))
+        self.assertEqual(
+            self.locations(response),
+            [
+                "/sitemap-pages.xml",
+                "/sitemap-categories.xml",
+                "/sitemap-tags.xml",
+                "/sitemap-posts.xml",
+                "/sitemap-posts.xml?p=2",
+                "/sitemap-posts.xml?p=3",
+            ],
+        )
+
+    def test_pages_split_posts_by_id(self):
+        url = reverse("sitemap-section", args=["posts"])
+        first, second, third = (self.client.get(url, {"p": p}) for p in (1, 2, 3))
+        detail = [reverse("post-detail", args=[post.pk]) for post in self.posts]
+        self.assertEqual(self.locations(first), detail[:2])
+        self.assertEqual(self.locations(second), detail[2:])
+        # only the draft there
+        self.assertEqual(self.locations(third), [])
+        self.assertContains(first, "<lastmod>")
+        self.assertEqual(self.client.get(url, {"p": 4}).status_code, 404)
+
+    def test_publish_only_drops_its_page(self):
+        url = reverse("sitemap-section", args=["posts"])
+        self.client.get(url, {"p": 1})
+        self.client.get(url, {"p": 3})
+        editor = self.client_class()
+        editor.force_login(self.user)
+        editor.get(reverse("post-publish", args=[self.draft.pk]))
+
+        with self.assertNumQueries(0):
+            self.client.get(url, {"p": 1})
+        self.assertEqual(
+            self.locations(self.client.get(url, {"p": 3})),
+            [reverse("post-detail", args=[self.draft.pk])],
+        )
+
+
+class AdjacencyTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.news = Category.objects.create(name="News")
+        self.sports = Category.objects.create(name="Sports")
+        # news, sports, news, sports, news
+        self.posts = [
+            create_post(self.user, (self.news, self.sports)[i % 2], title=f"Post {i}")
+            for i in range(5)
+        ]
+
+    def neighbours(self, post):
+        post = Post.objects.select_related(*ADJACENCY_RELATED).get(pk=post.pk)
+        return {
+            name: neighbour and neighbour.pk
+            for name, neighbour in get_neighbours(post).items()
+        }
+
+    def assertNeighbours(
+        self, post, previous, next, previous_in_category, next_in_category
+    ):
+        self.assertEqual(
+            self.neighbours(post),
+            {
+                "previous": previous and previous.pk,
+                "next": next and next.pk,
+                "previous_in_category": previous_in_category
+                and previous_in_category.pk,
+                "next_in_category": next_in_category and next_in_category.pk,
+            },
+        )
+
+    def test_published_posts_are_linked(self):
+        p = self.posts
+        self.assertNeighbours(p[0], None, p[1], None, p[2])
+        self.assertNeighbours(p[2], p[1], p[3], p[0], p[4])
+        self.assertNeighbours(p[4], p[3], None, p[2], None)
+
+    def test_unpublish_and_delete_relink_the_neighbours(self):
+        p = self.posts
+        p[2].status = "in_active"
+        p[2].save()
+        self.assertFalse(PostAdjacency.objects.filter(post=p[2]).exists())
+        self.assertNeighbours(p[1], p[0], p[3], None, p[3])
+        self.assertNeighbours(p[4], p[3], None, p[0], None)
+
+        p[3].delete()
+        self.assertNeighbours(p[1], p[0], p[4], None, None)
+        self.assertNeighbours(p[4], p[1], None, p[0], None)
+
+    def test_publish_and_category_change(self):
+        p = self.posts
+        draft = create_post(self.user, self.sports, published_at=None)
+        self.assertFalse(PostAdjacency.objects.filter(post=draft).exists())
+        editor = self.client_class()
+        editor.force_login(self.user)
+        editor.get(reverse("post-publish", args=[draft.pk]))
+        self.assertNeighbours(draft, p[4], None, p[3], None)
+        self.assertNeighbours(p[3], p[2], p[4], p[1], draft)
+
+        p[2].category = self.sports
+        p[2].save()
+        self.assertNeighbours(p[0], None, p[1], None, p[4])
+        self.assertNeighbours(p[2], p[1], p[3], p[1], p[3])
+
+    def test_rebuild_matches(self):
+        expected = {post.pk: self.neighbours(post) for post in self.posts}
+        PostAdjacency.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_adjacency", stdout=out)
+        self.assertIn("Linked 5 posts", out.getvalue())
+        self.assertEqual(
+            {post.pk: self.neighbours(post) for post in self.posts}, expected
+        )
+
+    def test_detail_reads_the_neighbours_with_the_post(self):
+        with self.assertNumQueries(1):
+            self.neighbours(self.posts[2])
+
+        response = self.client.get(reverse("post-detail", args=[self.posts[2].pk]))
+        self.assertEqual(response.context["previous_post"], self.posts[1])
+        self.assertEqual(response.context["next_post"], self.posts[3])
+        self.assertEqual(response.context["previous_in_category"], self.posts[0])
+        self.assertEqual(response.context["next_in_category"], self.posts[4])
+        self.assertContains(response, "More in News")
+
+
+class CommentCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+        self.post = create_post(self.user, self.category)
+        self.other = create_post(self.user, self.category, title="Other")
+
+    def comment(self, post):
+        return Comment.objects.create(
+            post=post, comment="Nice", name="Reader", email="reader@example.com"
+        )
+
+    def comment_count(self, post):
+        return Post.objects.values_list("comment_count", flat=True).get(pk=post.pk)
+
+    def test_create_move_and_delete(self):
+        response = self.client.post(
+            reverse("comment"),
+            {
+                "post": self.post.pk,
+                "comment": "Nice",
+                "name": "Reader",
+                "email": "reader@example.com",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        comment = self.comment(self.post)
+        self.assertEqual(self.comment_count(self.post), 2)
+
+        comment.comment = "Edited"
+        comment.save()
+        self.assertEqual(self.comment_count(self.post), 2)
+
+        # moved in the admin
+        comment.post = self.other
+        comment.save()
+        self.assertEqual(self.comment_count(self.post), 1)
+        self.assertEqual(self.comment_count(self.other), 1)
+
+        Comment.objects.filter(post=self.post).delete()
+        self.assertEqual(self.comment_count(self.post), 0)
+        self.assertEqual(self.comment_count(self.other), 1)
+
+    def assertNoRecount(self, delete):
+        with CaptureQueriesContext(connection) as queries:
+            delete()
+        recounts = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("UPDATE") and "comment_count" in query["sql"]
+        ]
+        self.assertFalse(recounts)
+
+    def test_category_delete_skips_recount(self):
+        for post in (self.post, self.other):
+            self.comment(post)
+            self.comment(post)
+        self.assertNoRecount(self.category.delete)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_queryset_delete_skips_recount(self):
+        self.comment(self.post)
+        self.comment(self.other)
+        self.assertNoRecount(Post.objects.filter(pk=self.post.pk).delete)
+        self.assertEqual(self.comment_count(self.other), 1)
+
+    def test_listing_reads_the_stored_count(self):
+        cache.clear()
+        for _ in range(3):
+            # the latest post, first on the page
+            self.comment(self.other)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-list"))
+        self.assertContains(response, "3 Comments")
+        # no COUNT per post
+        self.assertFalse(
+            any("newspaper_app_comment" in query["sql"] for query in queries)
+        )
+
+    def test_reconcile_fixes_drift(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, comment="Nice", name="Reader", email="r@e.com")
+            for _ in range(4)
+        )
+        Post.objects.filter(pk=self.other.pk).update(comment_count=7)
+        out = StringIO()
+        call_command("reconcile_comment_counts", stdout=out)
+        self.assertIn("Fixed 2 posts", out.getvalue())
+        self.assertEqual(self.comment_count(self.post), 4)
+        self.assertEqual(self.comment_count(self.other), 0)
+
+
+@override_settings(COMMENTS_PAGE_SIZE=2)
+class CommentThreadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user("author", password="password")
+        self.post = create_post(user, Category.objects.create(name="News"))
+        for i in range(5):
+            Comment.objects.create(
+                post=self.post, comment=f"comment {i}", name="Reader", email="r@e.com"
+            )
+
+    def load_more(self, content):
+        return re.search(r'class="load-more-comments[^"]*"\s+href="([^"]+)"', content)
+
+    def test_detail_embeds_the_first_page(self):
+        response = self.client.get(reverse("post-detail", args=[self.post.pk]))
+        content = response.content.decode()
+        self.assertContains(response, "5 Comments")
+        self.assertIn("comment 1", content)
+        self.assertNotIn("comment 2", content)
+
+        pages = []
+        link = self.load_more(content)
+        while link:
+            response = self.client.get(link.group(1).replace("&amp;", "&"))
+            self.assertEqual(response.status_code, 200)
+            content = response.content.decode()
+            pages.append(re.findall(r"comment \d", content))
+            link = self.load_more(content)
+        self.assertEqual(pages, [["comment 2", "comment 3"], ["comment 4"]])
+
+    def test_page_is_a_range_scan(self):
+        url = reverse("post-comments", args=[self.post.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        (query,) = queries
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("comment_thread_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_invalid_cursor(self):
+        url = reverse("post-comments", args=[self.post.pk])
+        self.assertEqual(self.client.get(url, {"cursor": "nope"}).status_code, 404)
+
+
+class RenderingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="News")
+
+    def test_rendered_on_save(self):
+        post = create_post(
+            self.user,
+            self.category,
+            content=(
+                '<p onclick="steal()">Budget <b>speech</b></p><script>x()</script>'
+                '<p><a href="javascript:x()">link</a> &amp; more</p>'
+            ),
+        )
+        post.refresh_from_db()
+        self.assertEqual(
+            post.body_html,
+            "<p>Budget <b>speech</b></p><p><a>link</a> &amp; more</p>",
+        )
+        self.assertEqual(post.excerpt, "Budget speech link & more")
+        self.assertEqual(post.word_count, 5)
+        self.assertEqual(post.reading_time, 1)
+
+        post.content = "<p>" + "word " * 450 + "</p>"
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.word_count, 450)
+        self.assertEqual(post.reading_time, 3)
+        self.assertEqual(len(post.excerpt.split()), 50)
+        self.assertTrue(post.excerpt.endswith("…"))
+
+    def test_pages_read_the_rendered_fields(self):
+        post = create_post(self.user, self.category, content="<p>Plain story</p>")
+        Post.objects.filter(pk=post.pk).update(
+            content="<p>raw</p>", body_html="<p>Clean body</p>", excerpt="Short"
+        )
+        response = self.client.get(reverse("post-detail", args=[post.pk]))
+        self.assertContains(response, "<p>Clean body</p>")
+        self.assertNotContains(response, "raw")
+        self.assertContains(response, "1 min read")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-list"))
+        self.assertContains(response, "<p>Short</p>")
+        # the cards don't load the bodies
+        self.assertFalse(any('."content"' in query["sql"] for query in queries))
+        self.assertContains(self.client.get(reverse("post-feed")), "Short")
+
+    def test_render_posts_backfills(self):
+        post = create_post(self.user, self.category, content="<p>One two</p>")
+        Post.objects.filter(pk=post.pk).update(body_html="", excerpt="", word_count=0)
+        out = StringIO()
+        updated_at = post.updated_at
+        call_command("render_posts", "--batch-size", "1", stdout=out)
+        self.assertIn("Rendered 1 posts", out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.body_html, post.excerpt, post.word_count),
+            ("<p>One two</p>", "One two", 2),
+        )
+        # the validators, sitemaps and exports see the new body
+        self.assertGreater(post.updated_at, updated_at)
+
+    def test_render_posts_drops_the_cached_pages(self):
+        post = create_post(self.user, self.category, content="<p>Backfilled</p>")
+        Post.objects.filter(pk=post.pk).update(body_html="", excerpt="")
+        url = reverse("post-list")
+        self.assertNotContains(self.client.get(url), "Backfilled")
+        call_command("render_posts", stdout=StringIO())
+        self.assertContains(self.client.get(url), "Backfilled")
+
+    def test_drafts_show_the_sanitized_body(self):
+        draft = create_post(
+            self.user,
+            self.category,
+            content="<p>Draft</p><script>alert(1)</script>",
+            published_at=None,
+        )
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("draft-detail", args=[draft.pk]))
+        self.assertContains(response, "<p>Draft</p>")
+        self.assertNotContains(response, "alert(1)")
+        response = self.client.get(reverse("draft-list"))
+        self.assertContains(response, "<p>Draft</p>")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_MAX_LAG=5)
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def serve(self, request, write=False):
+        # the databases the view reads from, before and after writing
+        reads = []
+
+        def view(request):
+            reads.append(router.db_for_read(Post))
+            if write:
+                router.db_for_write(Post)
+                reads.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        response = PrimaryStickinessMiddleware(view)(request)
+        return reads, response
+
+    def test_reads_go_to_the_replicas(self):
+        reads, response = self.serve(self.factory.get("/"))
+        self.assertEqual(reads, ["replica"])
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+        # commands and background threads
+        self.assertEqual(router.db_for_read(Post), "default")
+        self.assertEqual(router.db_for_write(Post), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica", "replica2"])
+    def test_one_replica_per_request(self):
+        def view(request):
+            replicas = {router.db_for_read(Post) for _ in range(20)}
+            return HttpResponse(",".join(replicas))
+
+        picked = set()
+        for _ in range(20):
+            response = PrimaryStickinessMiddleware(view)(self.factory.get("/"))
+            self.assertEqual(len(response.content.split(b",")), 1)
+            picked.add(response.content)
+        # still spread over the replicas across requests
+        self.assertEqual(picked, {b"replica", b"replica2"})
+
+    def test_writes_stick_to_the_primary(self):
+        reads, response = self.serve(self.factory.get("/"), write=True)
+        self.assertEqual(reads, ["replica", "default"])
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]["max-age"], 5)
+
+        reads, response = self.serve(self.factory.post("/"), write=True)
+        self.assertEqual(reads, ["default", "default"])
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        # the page the POST redirects to
+        request = self.factory.get("/")
+        request.COOKIES[PRIMARY_COOKIE] = "1"
+        self.assertEqual(self.serve(request)[0], ["default"])
+
+    def test_snapshots_expire_once_the_replicas_caught_up(self):
+        self.assertEqual(snapshot_timeout([PAGES_VERSION], 600), 600)
+        bump_version(PAGES_VERSION)
+        self.assertEqual(snapshot_timeout([PAGES_VERSION], 600), 5)
+        self.assertEqual(snapshot_timeout([LAYOUT_VERSION], 600), 600)
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(snapshot_timeout([PAGES_VERSION], 600), 600)
+
+
+@override_settings(SQLITE={"LOCK_BACKOFF": 0})
+class SQLiteBackendTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.connections = ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "newspaper_app.sqlite",
+                    "NAME": os.path.join(self.directory, "db.sqlite3"),
+                }
+            }
+        )
+        self.addCleanup(self.connections.close_all)
+
+    def pragma(self, name):
+        with self.connections["default"].cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_set_on_connect(self):
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(self.pragma("cache_size"), -64 * 1024)
+
+    @override_settings(SQLITE={"PRAGMAS": {"busy_timeout": 100}})
+    def test_pragmas_can_be_overridden(self):
+        self.assertEqual(self.pragma("busy_timeout"), 100)
+        self.assertEqual(self.pragma("cache_size"), -64 * 1024)
+
+    def test_wal_is_enabled_once(self):
+        # connecting leaves the file alone
+        self.assertEqual(self.pragma("journal_mode"), "delete")
+        enable_wal(self.connections["default"])
+        self.connections.close_all()
+        other = sqlite3.connect(self.connections["default"].settings_dict["NAME"])
+        self.addCleanup(other.close)
+        self.assertEqual(other.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        database = self.connections["default"]
+        database.ensure_connection()
+        other = sqlite3.connect(database.settings_dict["NAME"], timeout=0)
+        self.addCleanup(other.close)
+        # what atomic() starts with, before the transaction read anything
+        database._start_transaction_under_autocommit()
+        with self.assertRaisesMessage(sqlite3.OperationalError, "locked"):
+            other.execute("BEGIN IMMEDIATE")
+        database.rollback()
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("ROLLBACK")
+
+    def test_read_only_transactions_leave_the_write_lock(self):
+        database = self.connections["default"]
+        database.ensure_connection()
+        other = sqlite3.connect(database.settings_dict["NAME"], timeout=0)
+        self.addCleanup(other.close)
+        with mock.patch("newspaper_app.sqlite.base.connections", self.connections):
+            with read_only():
+                database._start_transaction_under_autocommit()
+        with database.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM sqlite_master")
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("ROLLBACK")
+        database.rollback()
+        self.assertTrue(database.begin_immediate)
+
+    def test_locked_statements_are_retried(self):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError("database is locked")
+            return "written"
+
+        self.assertEqual(retry_on_lock(write), "written")
+        self.assertEqual(len(calls), 3)
+
+    def test_retries_give_up(self):
+        calls = []
+
+        def write():
+            calls.append(1)
+            raise sqlite3.OperationalError("database is locked")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_lock(write)
+        self.assertEqual(len(calls), 6)
+
+        calls.clear()
+
+        def broken():
+            calls.append(1)
+            raise sqlite3.OperationalError("no such table: nope")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_lock(broken)
+        self.assertEqual(len(calls), 1)
+
+
+class StaticFilesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def test_only_the_used_theme_files_are_collected(self):
+        used = {path for path, storage in ThemeFinder().list([])}
+        self.assertIn("assets/css/style.css", used)
+        # the fonts of the stylesheets
+        self.assertIn("assets/fonts/fa-solid-900.woff2", used)
+        self.assertNotIn("assets/scss/style.scss", used)
+        self.assertNotIn("assets/css/main.css", used)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.static_root, "assets/css/main.css"))
+        )
+
+    def test_pages_link_the_fingerprinted_files(self):
+        response = self.get(reverse("about"))
+        self.assertRegex(
+            response.content.decode(), r"/static/assets/css/style\.[0-9a-f]{12}\.css"
+        )
+
+    def test_serves_the_compressed_file(self):
+        url = static("assets/css/style.css")
+        self.assertRegex(url, r"style\.[0-9a-f]{12}\.css$")
+        response = self.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertNotIn("Content-Disposition", response)
+        content = gzip.decompress(b"".join(response.streaming_content))
+        with open(os.path.join(self.static_root, url[len("/static/") :]), "rb") as f:
+            self.assertEqual(content, f.read())
+
+        response = self.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(
+            brotli.decompress(b"".join(response.streaming_content)), content
+        )
+
+        response = self.get(url, HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_unhashed_and_missing_files(self):
+        response = self.get("/static/assets/css/style.css")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+        self.assertEqual(self.get("/static/assets/scss/style.scss").status_code, 404)
+        self.assertEqual(self.get("/static/../manage.py").status_code, 404)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(
+            accepted_encodings("gzip;q=0.5, br;q=0, Deflate"), {"gzip", "deflate"}
+        )
+        self.assertEqual(accepted_encodings(""), set())
+
+
+class FragmentCacheTest(TestCase):
+    template = Template(
+        '{% load fragments %}{% fragment "cards" posts %}'
+        "{% for post in posts %}{{ post.category.name }} {{ label }};"
+        "{% endfor %}{% endfragment %}"
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.category = Category.objects.create(name="Sports")
+        self.first = create_post(self.user, self.category)
+        self.second = create_post(self.user, self.category)
+
+    def render(self, posts, label="a"):
+        # fresh instances, the category is fetched per post
+        posts = list(Post.objects.filter(pk__in=[post.pk for post in posts]))
+        return self.template.render(Context({"posts": posts, "label": label}))
+
+    def test_cached_per_posts(self):
+        self.assertEqual(self.render([self.first]), "Sports a;")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.render([self.first], label="b"), "Sports a;")
+        self.assertEqual(self.render([self.first, self.second], "b"), "Sports b;" * 2)
+
+    def test_dropped_on_change(self):
+        self.render([self.first])
+        self.category.name = "Politics"
+        self.category.save()
+        self.assertEqual(self.render([self.first], label="b"), "Politics b;")
+        self.first.title = "Edited"
+        self.first.save()
+        self.assertEqual(self.render([self.first], label="c"), "Politics c;")
+
+    def test_pages_show_the_changes(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse("home")), ">Sports</a>")
+        self.category.name = "Politics"
+        self.category.save()
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, ">Politics</a>")
+        self.assertNotContains(response, ">Sports</a>")
+
+
+class SectionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", password="password")
+        self.sports = Category.objects.create(name="Sports")
+        self.politics = Category.objects.create(name="Politics")
+        now = timezone.now()
+        self.posts = {
+            category: [
+                create_post(
+                    self.user,
+                    category,
+                    title=f"{category.name} {i}",
+                    published_at=now - timezone.timedelta(hours=i),
+                )
+                for i in range(8)
+            ]
+            for category in (self.sports, self.politics)
+        }
+        create_post(self.user, self.sports, title="Draft", published_at=None)
+        create_post(self.user, self.sports, title="Inactive", status="in_active")
+
+    def test_latest_posts_in_one_query(self):
+        with self.assertNumQueries(1):
+            posts = list(latest_posts([self.politics.pk, self.sports.pk], limit=3))
+        expected = sorted(
+            [self.posts[self.sports][:3], self.posts[self.politics][:3]],
+            key=lambda posts: posts[0].category_id,
+        )
+        self.assertEqual(posts, expected[0] + expected[1])
+        self.assertEqual([post.row_number for post in posts], [1, 2, 3] * 2)
+
+    def test_sections(self):
+        with self.assertNumQueries(1):
+            sections = get_sections([self.politics, self.sports])
+        self.assertEqual(list(sections), [self.politics, self.sports])
+        self.assertEqual(sections[self.sports], self.posts[self.sports][:6])
+        with self.assertNumQueries(0):
+            self.assertEqual(sections[self.sports][0].category.name, "Sports")
+        self.assertEqual(get_sections([]), {})
+
+    def test_cached_until_a_post_changes(self):
+        get_sections([self.sports])
+        with self.assertNumQueries(0):
+            get_sections([self.sports])
+        post = self.posts[self.sports][0]
+        post.status = "inactive"
+        post.save()
+        sections = get_sections([self.sports])
+        self.assertEqual(sections[self.sports], self.posts[self.sports][1:7])
+
+    def test_home_tabs(self):
+        response = self.client.get(reverse("home"))
+        self.assertEqual(
+            list(response.context["whats_new_sections"]),
+            list(response.context["whats_new_categories"]),
+        )
+        self.assertContains(response, "Sports 5")
+        self.assertNotContains(response, "Sports 6")
+        self.assertNotContains(response, "Draft")
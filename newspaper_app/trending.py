@@ -0,0 +1,142 @@
+"""
+Trending posts: per window, a score that adds up the views of a post and
+halves every half-life, so views from last month weigh next to nothing and
+an old post only trends while it is read again.
+
+The view counter records the views it flushes in PostView, update_trending()
+(the `update_trending` command, run from cron) folds them into the
+TrendingScore leaderboard. Each run decays the whole leaderboard with one
+UPDATE per window and only keeps its top posts, so the work doesn't grow
+with the number of posts. The pages learn about a run through the bump of
+TRENDING_VERSION, which needs the cache the web workers share (CACHES).
+
+Until the leaderboard fills up, e.g. before the first run, the pages show
+the most viewed posts in its place.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from newspaper_app.async_orm import alist
+from newspaper_app.models import PostView, TrendingScore
+from newspaper_app.versioning import bump_version
+
+# cached pages showing a leaderboard
+TRENDING_VERSION = "trending"
+
+# window => half-life of its scores
+WINDOWS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(days=7),
+}
+
+
+def get_config():
+    config = {
+        "LEADERBOARD_SIZE": 100,  # posts kept per window
+        "MIN_SCORE": 0.01,  # scores that decayed below are dropped
+    }
+    config.update(getattr(settings, "TRENDING", {}))
+    return config
+
+
+def decay_factor(elapsed, half_life):
+    return 0.5 ** (elapsed / half_life)
+
+
+def trending_posts(queryset, window, limit):
+    """
+    The top `limit` posts of `queryset` on the `window` leaderboard, read in
+    score order from the trending_top_idx index.
+    """
+    return queryset.filter(trending_scores__window=window).order_by(
+        "-trending_scores__score", "-trending_scores__post"
+    )[:limit]
+
+
+def popular_posts(queryset, limit):
+    # the most viewed ever, from the post_popular_idx index
+    return queryset.order_by("-views_count", "-id")[:limit]
+
+
+async def atrending_posts(queryset, window, limit):
+    """
+    trending_posts() as a list, topped up with the most viewed posts while
+    the leaderboard has fewer than `limit`.
+    """
+    posts = await alist(trending_posts(queryset, window, limit))
+    if len(posts) < limit:
+        posts += await alist(
+            popular_posts(
+                queryset.exclude(pk__in=[post.pk for post in posts]),
+                limit - len(posts),
+            )
+        )
+    return posts
+
+
+def update_trending(now=None):
+    """
+    Add the views recorded since the last run to the decayed scores of every
+    window. Only active, published posts score. Returns the number of views
+    added.
+    """
+    now = now or timezone.now()
+    config = get_config()
+    with transaction.atomic():
+        # rows flushed while this runs wait for the next run
+        last_id = PostView.objects.aggregate(last=Max("id"))["last"]
+        activity = PostView.objects.filter(id__lte=last_id or 0)
+        views = dict(
+            activity.filter(post__status="active", post__published_at__isnull=False)
+            .values("post")
+            .annotate(total=Sum("views"))
+            .values_list("post", "total")
+        )
+        activity.delete()
+
+        for window, half_life in WINDOWS.items():
+            scores = TrendingScore.objects.filter(window=window)
+            # every row of a window is decayed together, they share decayed_at
+            decayed_at = scores.values_list("decayed_at", flat=True).first()
+            if decayed_at is not None:
+                scores.update(
+                    score=F("score") * decay_factor(now - decayed_at, half_life),
+                    decayed_at=now,
+                )
+            if views:
+                # at most LEADERBOARD_SIZE rows
+                current = dict(scores.values_list("post", "score"))
+                # a post off the leaderboard only gets on it with one of the
+                # largest view counts
+                newcomers = sorted(
+                    (post_id for post_id in views if post_id not in current),
+                    key=views.get,
+                    reverse=True,
+                )[: config["LEADERBOARD_SIZE"]]
+                TrendingScore.objects.bulk_create(
+                    [
+                        TrendingScore(
+                            post_id=post_id,
+                            window=window,
+                            score=current.get(post_id, 0) + views[post_id],
+                            decayed_at=now,
+                        )
+                        for post_id in [*current.keys() & views.keys(), *newcomers]
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["window", "post"],
+                    update_fields=["score", "decayed_at"],
+                )
+            # keep the leaderboard compact
+            scores.filter(score__lt=config["MIN_SCORE"]).delete()
+            top = scores.order_by("-score", "-post").values("id")
+            scores.exclude(id__in=top[: config["LEADERBOARD_SIZE"]]).delete()
+
+    bump_version(TRENDING_VERSION)
+    return sum(views.values())
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from newspaper_app import views
+from newspaper_app import feeds, views
 
 urlpatterns = [
     path(
@@ -53,6 +53,11 @@ urlpatterns = [
         views.CommentView.as_view(),
         name="comment",
     ),
+    path(
+        "post-detail/<int:post_id>/comments/",
+        views.CommentPageView.as_view(),
+        name="post-comments",
+    ),
     path(
         "post-delete/<int:pk>/",
         views.PostDeleteView.as_view(),
@@ -124,4 +129,50 @@ urlpatterns = [
         views.CategoryDeleteView.as_view(),
         name="category-delete",
     ),
+    # feeds and sitemaps
+    path(
+        "feeds/rss/",
+        feeds.PostFeed(),
+        name="post-feed",
+    ),
+    path(
+        "feeds/atom/",
+        feeds.AtomPostFeed(),
+        name="post-feed-atom",
+    ),
+    path(
+        "feeds/category/<int:cat_id>/rss/",
+        feeds.CategoryPostFeed(),
+        name="category-feed",
+    ),
+    path(
+        "feeds/category/<int:cat_id>/atom/",
+        feeds.AtomCategoryPostFeed(),
+        name="category-feed-atom",
+    ),
+    path(
+        "feeds/tag/<int:tag_id>/rss/",
+        feeds.TagPostFeed(),
+        name="tag-feed",
+    ),
+    path(
+        "feeds/tag/<int:tag_id>/atom/",
+        feeds.AtomTagPostFeed(),
+        name="tag-feed-atom",
+    ),
+    path(
+        "sitemap.xml",
+        views.SitemapIndexView.as_view(),
+        name="sitemap-index",
+    ),
+    path(
+        "sitemap-<str:section>.xml",
+        views.SitemapView.as_view(),
+        name="sitemap-section",
+    ),
+    path(
+        "metrics/",
+        views.MetricsView.as_view(),
+        name="metrics",
+    ),
 ]
@@ -0,0 +1,53 @@
+import time
+
+from django.core.cache import cache
+
+from newspaper_app.db_router import get_max_lag, get_replicas
+
+
+# Cached snapshots embed a version number in their key. Bumping the version
+# orphans every old snapshot at once, no need to know their keys. The
+# versions live in the cache too: it has to be shared by every worker (see
+# CACHES), with a cache per process a bump only reaches the process that
+# made it.
+def _version_key(name):
+    return f"version:{name}"
+
+
+def get_version(name):
+    version = cache.get(_version_key(name))
+    if version is None:
+        # start from a timestamp so an evicted counter never goes back to a
+        # version that still has stale entries in the cache
+        version = time.time_ns()
+        cache.add(_version_key(name), version, timeout=None)
+        version = cache.get(_version_key(name), version)
+    return version
+
+
+def _bumped_key(name):
+    return f"version-bumped:{name}"
+
+
+def bump_version(name):
+    if get_replicas():
+        # replicas may not have the change yet, see snapshot_timeout()
+        cache.set(_bumped_key(name), True, get_max_lag())
+    try:
+        return cache.incr(_version_key(name))
+    except ValueError:
+        version = time.time_ns()
+        cache.set(_version_key(name), version, timeout=None)
+        return version
+
+
+def snapshot_timeout(names, timeout):
+    """
+    `timeout` for a snapshot keyed on the versions of `names`, or at most
+    REPLICA_MAX_LAG seconds when one was just bumped: the snapshot may have
+    been read from a replica that doesn't have the change yet, it is taken
+    again once the replicas caught up.
+    """
+    if get_replicas() and cache.get_many([_bumped_key(name) for name in names]):
+        return min(timeout, get_max_lag())
+    return timeout
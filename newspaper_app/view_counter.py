@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from newspaper_app.models import Post, PostView
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    config = {
+        "FLUSH_INTERVAL": 10,  # seconds between flushes
+        "FLUSH_THRESHOLD": 100,  # buffered hits that force a flush
+        # flush from a background thread FLUSH_INTERVAL seconds after the
+        # first buffered hit, even when no other view comes in
+        "FLUSH_TIMER": True,
+    }
+    config.update(getattr(settings, "VIEW_COUNTER", {}))
+    return config
+
+
+class ViewCounter:
+    """
+    Buffers post views in memory and writes them in batches.
+
+    Every flush runs one `UPDATE ... SET views_count = views_count + n` per
+    post, so concurrent hits are never lost and `updated_at` is not touched,
+    and records the views for the trending scores in a single INSERT.
+
+    A flush runs on the hit that reaches FLUSH_THRESHOLD or comes
+    FLUSH_INTERVAL after the last flush, and with FLUSH_TIMER from a timer
+    thread, so an idle worker doesn't sit on its views until the next one.
+    """
+
+    def __init__(self, flush_interval=None, flush_threshold=None):
+        self._flush_interval = flush_interval
+        self._flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        # sum(self._pending.values()), kept as hits come in
+        self._total = 0
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is None:
+            return get_config()["FLUSH_INTERVAL"]
+        return self._flush_interval
+
+    @property
+    def flush_threshold(self):
+        if self._flush_threshold is None:
+            return get_config()["FLUSH_THRESHOLD"]
+        return self._flush_threshold
+
+    def hit(self, post_id, count=1):
+        with self._lock:
+            self._pending[post_id] += count
+            self._total += count
+            due = (
+                self._total >= self.flush_threshold
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+            if not due:
+                self._schedule()
+        if due:
+            self.flush()
+
+    def _schedule(self):
+        # called under the lock
+        if self._timer is not None or not get_config()["FLUSH_TIMER"]:
+            return
+        self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Flushing the buffered post views failed")
+            # the hits are back in the buffer, try again later
+            with self._lock:
+                self._schedule()
+        finally:
+            # the timer thread's own connection
+            connection.close()
+
+    def pending(self, post_id):
+        with self._lock:
+            return self._pending[post_id]
+
+    def flush(self):
+        # swap the buffer out under the lock so hits can keep coming in
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            total, self._total = self._total, 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                for post_id, count in pending.items():
+                    Post.objects.filter(pk=post_id).update(
+                        views_count=F("views_count") + count
+                    )
+                PostView.objects.bulk_create(
+                    PostView(post_id=post_id, views=count)
+                    for post_id, count in pending.items()
+                )
+        except Exception:
+            # put the hits back, next flush will retry them
+            with self._lock:
+                self._pending.update(pending)
+                self._total += total
+            raise
+        return total
+
+
+view_counter = ViewCounter()
@@ -1,11 +1,14 @@
 from datetime import timedelta
+from functools import partial
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.sitemaps import views as sitemaps_views
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.db.models import Q
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.views.generic import (
@@ -18,6 +21,10 @@ from django.views.generic import (
     View,
 )
 
+from newspaper_app.adjacency import NEIGHBOURS, get_neighbours
+from newspaper_app.async_orm import alist
+from newspaper_app.comments import comment_paginator
+from newspaper_app.conditional import ConditionalGetMixin
 from newspaper_app.forms import (
     CommentForm,
     TagForm,
@@ -26,120 +33,219 @@ from newspaper_app.forms import (
     PostForm,
     CategoryForm
 )
+from newspaper_app.metrics import is_metrics_client, registry
 from newspaper_app.models import Category, Post, Tag, Category
+from newspaper_app.navigation import NAVIGATION_VERSION
+from newspaper_app.page_cache import (
+    LAYOUT_VERSION,
+    PAGES_VERSION,
+    CachedPageMixin,
+    cached_response,
+    category_version,
+    invalidate_post_pages,
+    sitemap_version,
+    tag_version,
+)
+from newspaper_app.pagination import InvalidCursor, KeysetPaginationMixin
+from newspaper_app.search import search_posts
+from newspaper_app.sections import get_sections
+from newspaper_app.sitemaps import SITEMAPS
+from newspaper_app.trending import TRENDING_VERSION, atrending_posts
+from newspaper_app.versioning import get_version
+from newspaper_app.view_counter import view_counter
 
 
-class HomeView(ListView):
-    model = Post
+class HomeView(CachedPageMixin, TemplateView):
     template_name = "aznews/home.html"
-    context_object_name = "posts"
-    queryset = Post.objects.filter(
-        status="active", published_at__isnull=False
-    ).order_by("-published_at")[:5]
+    # leaderboard of the featured posts
+    trending_window = "daily"
 
-    def get_context_data(self, *args, **kwargs):
-        context = super().get_context_data(*args, **kwargs)
-        context["featured_post"] = (
-            Post.objects.filter(status="active", published_at__isnull=False)
-            .order_by("-views_count")
-            .first()
-        )
-        context["featured_posts"] = Post.objects.filter(
-            status="active", published_at__isnull=False
-        ).order_by("-views_count")[2:5]
+    def get_page_cache_versions(self):
+        return super().get_page_cache_versions() + [TRENDING_VERSION]
+
+    async def get(self, request, *args, **kwargs):
+        published = Post.objects.filter(status="active", published_at__isnull=False)
         one_week_ago = timezone.now() - timedelta(days=7)
-        context["weekly_top_posts"] = Post.objects.filter(
-            status="active",
-            published_at__isnull=False,
-            published_at__gte=one_week_ago,
-        ).order_by("-published_at")[:7]
-        return context
+        # one after the other: Django 4.1 runs the async ORM calls on one
+        # thread, the event loop serves other requests meanwhile
+        posts = await alist(published.order_by("-published_at")[:5])
+        popular_posts = await atrending_posts(published, self.trending_window, 5)
+        weekly_top_posts = await alist(
+            published.filter(published_at__gte=one_week_ago).order_by(
+                "-published_at"
+            )[:7]
+        )
+        whats_new_sections = await sync_to_async(get_sections)()
+        context = self.get_context_data(
+            posts=posts,
+            featured_post=popular_posts[0] if popular_posts else None,
+            featured_posts=popular_posts[2:5],
+            weekly_top_posts=weekly_top_posts,
+            whats_new_sections=whats_new_sections,
+        )
+        return self.render_to_response(context)
+
+    def get_page_cache_timeout(self, response):
+        timeout = super().get_page_cache_timeout(response)
+        # the page changes as soon as a weekly post gets older than a week
+        weekly_top_posts = response.context_data["weekly_top_posts"]
+        if weekly_top_posts:
+            oldest = min(post.published_at for post in weekly_top_posts)
+            leaves_window = oldest + timedelta(days=7) - timezone.now()
+            timeout = min(timeout, max(1, int(leaves_window.total_seconds())))
+        return timeout
+
 
+ADJACENCY_RELATED = [f"adjacency__{name}" for name in NEIGHBOURS]
+# the cards of the listings show the excerpt, not the body
+CARD_DEFERRED = ("content", "body_html")
 
-class PostDetailView(DetailView):
+
+class PostDetailView(ConditionalGetMixin, DetailView):
     model = Post
     template_name = "aznews/detail.html"
     context_object_name = "post"
+    send_last_modified = False
+    # leaderboard of the sidebar
+    trending_window = "weekly"
 
     def get_queryset(self):
         qs = super().get_queryset()
         return qs.filter(status="active", published_at__isnull=False)
 
-    def get_context_data(self, *args, **kwargs):
-        context = super().get_context_data(*args, **kwargs)
-
-        # get current post
-        obj = self.get_object()
-        obj.views_count += 1
-        obj.save()
-
-        # id => 3
-        # 2, 1
-        context["previous_post"] = (
-            Post.objects.filter(
-                status="active", published_at__isnull=False, id__lt=obj.id
+    def get_validator_querysets(self):
+        # new comments touch the post's updated_at too
+        return [self.get_queryset().filter(pk=self.kwargs["pk"])]
+
+    def get_validator_extra(self):
+        # header/sidebar, previous/next links, trending posts and who is
+        # logged in
+        return [
+            get_version(LAYOUT_VERSION),
+            get_version(NAVIGATION_VERSION),
+            get_version(PAGES_VERSION),
+            get_version(TRENDING_VERSION),
+            self.request.user.pk,
+        ]
+
+    async def get(self, request, *args, **kwargs):
+        response = await self.aconditional(self.get_page, request, *args, **kwargs)
+        # a 304 means the browser shows its own copy, it still is a view;
+        # hit() may flush to the database
+        if response.status_code in (200, 304):
+            await sync_to_async(view_counter.hit)(self.kwargs["pk"])
+        return response
+
+    async def get_page(self, request, *args, **kwargs):
+        published = self.get_queryset()
+        pk = self.kwargs["pk"]
+        # the post comes with its author, category and previous/next posts,
+        # see adjacency.py
+        post = await (
+            published.filter(pk=pk)
+            .select_related("author", "category", *ADJACENCY_RELATED)
+            .defer(
+                "content",
+                *(
+                    f"{related}__{field}"
+                    for related in ADJACENCY_RELATED
+                    for field in CARD_DEFERRED
+                ),
             )
-            .order_by("-id")
-            .first()
+            .afirst()
+        )
+        if post is None:
+            raise Http404("No post found matching the query")
+        recent_posts = await atrending_posts(published, self.trending_window, 5)
+        comments = await comment_paginator(pk).apage()
+        # buffered, written in batches by view_counter.flush()
+        post.views_count += view_counter.pending(pk) + 1
+
+        self.object = post
+        neighbours = get_neighbours(post)
+        context = self.get_context_data(
+            object=post,
+            previous_post=neighbours["previous"],
+            next_post=neighbours["next"],
+            previous_in_category=neighbours["previous_in_category"],
+            next_in_category=neighbours["next_in_category"],
+            recent_posts=recent_posts,
+            comments=comments,
         )
-        # id => 3
-        # 4, 5, 6, 7, 8
-        context["next_post"] = (
-            Post.objects.filter(
-                status="active", published_at__isnull=False, id__gt=obj.id
+        return self.render_to_response(context)
+
+
+class CommentPageView(View):
+    """
+    The comments after `?cursor=`, what the "load more" link of the detail
+    page appends.
+    """
+
+    template_name = "aznews/main/detail/left/comment_page.html"
+
+    async def get(self, request, post_id, *args, **kwargs):
+        try:
+            comments = await comment_paginator(post_id).apage(
+                request.GET.get("cursor")
             )
-            .order_by("id")
-            .first()
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return TemplateResponse(
+            request, self.template_name, {"post_id": post_id, "comments": comments}
         )
-        context["recent_posts"] = Post.objects.filter(
-            status="active", published_at__isnull=False
-        ).order_by("-views_count")[:5]
-        return context
 
 
-class PostListView(ListView):
+class PostListView(CachedPageMixin, KeysetPaginationMixin, ListView):
     model = Post
     template_name = "aznews/list.html"
     context_object_name = "posts"
-    queryset = Post.objects.filter(
-        status="active", published_at__isnull=False
-    ).order_by("-published_at")
+    queryset = (
+        Post.objects.filter(status="active", published_at__isnull=False)
+        .defer(*CARD_DEFERRED)
+        .order_by("-published_at")
+    )
     paginate_by = 1
 
 
-class PostByCategoryView(ListView):
+class PostByCategoryView(CachedPageMixin, KeysetPaginationMixin, ListView):
     model = Post
     template_name = "aznews/list.html"
     context_object_name = "posts"
     paginate_by = 1
 
+    def get_page_cache_versions(self):
+        return [LAYOUT_VERSION, category_version(self.kwargs["cat_id"])]
+
     def get_queryset(self):
         super().get_queryset()
         queryset = Post.objects.filter(
             status="active",
             published_at__isnull=False,
             category=self.kwargs["cat_id"],
-        ).order_by("-published_at")
+        ).defer(*CARD_DEFERRED).order_by("-published_at")
         return queryset
 
 
-class PostByTagView(ListView):
+class PostByTagView(CachedPageMixin, KeysetPaginationMixin, ListView):
     model = Post
     template_name = "aznews/list.html"
     context_object_name = "posts"
     paginate_by = 1
 
+    def get_page_cache_versions(self):
+        return [LAYOUT_VERSION, tag_version(self.kwargs["tag_id"])]
+
     def get_queryset(self):
         super().get_queryset()
         queryset = Post.objects.filter(
             status="active",
             published_at__isnull=False,
             tag=self.kwargs["tag_id"],
-        ).order_by("-published_at")
+        ).defer(*CARD_DEFERRED).order_by("-published_at")
         return queryset
 
 
-class AboutView(TemplateView):
+class AboutView(CachedPageMixin, TemplateView):
     template_name = "aznews/about.html"
 
     def get_context_data(self, *args, **kwargs):
@@ -151,14 +257,19 @@ class AboutView(TemplateView):
 
 
 class PostSearchView(View):
-    def get(self, request, *args, **kwargs):
-        query = request.GET.get("query")
-        post_list = Post.objects.filter(
-            (Q(status="active") & Q(published_at__isnull=False))
-            & (Q(title__icontains=query) | Q(content__icontains=query)),
+    async def get(self, request, *args, **kwargs):
+        query = request.GET.get("query", "").strip()
+        # the FTS5 queries are raw SQL, there is no async cursor for them
+        posts = await sync_to_async(self.search)(query, request.GET.get("page", 1))
+        return TemplateResponse(
+            request,
+            "aznews/search_list.html",
+            {"page_obj": posts, "query": query},
         )
+
+    def search(self, query, page):
+        post_list = search_posts(query, Post.objects.defer(*CARD_DEFERRED))
         # pagination in function based views
-        page = request.GET.get("page", 1)
         paginator = Paginator(post_list, 1)
         try:
             posts = paginator.page(page)
@@ -166,12 +277,9 @@ class PostSearchView(View):
             posts = paginator.page(1)
         except EmptyPage:
             posts = paginator.page(paginator.num_pages)
-
-        return render(
-            request,
-            "aznews/search_list.html",
-            {"page_obj": posts, "query": query},
-        )
+        # the page is fetched here, not while rendering
+        posts.object_list = list(posts.object_list)
+        return posts
 
 
 class ContactView(View):
@@ -247,7 +355,11 @@ class CommentView(View):
             return render(
                 request,
                 self.template_name,
-                {"post": post, "form": form},
+                {
+                    "post": post,
+                    "form": form,
+                    "comments": comment_paginator(post.pk).page(),
+                },
             )
 
 
@@ -255,7 +367,11 @@ class DraftListView(LoginRequiredMixin, ListView):
     model = Post
     template_name = "news_admin/draft_list.html"
     context_object_name = "posts"
-    queryset = Post.objects.filter(published_at__isnull=True).order_by("-published_at")
+    queryset = (
+        Post.objects.filter(published_at__isnull=True)
+        .defer(*CARD_DEFERRED)
+        .order_by("-created_at")
+    )
 
 
 class PostDeleteView(LoginRequiredMixin, DeleteView):
@@ -263,6 +379,7 @@ class PostDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy("draft-list")
 
     def form_valid(self, form):
+        invalidate_post_pages(self.object)
         messages.success(self.request, "Post was successfully deleted")
         return super().form_valid(form)
 
@@ -285,6 +402,7 @@ class PostPublishView(LoginRequiredMixin, View):
         post = get_object_or_404(Post, pk=pk)
         post.published_at = timezone.now()
         post.save()
+        invalidate_post_pages(post)
         messages.success(request, "Post was successfully published")
         return redirect("post-detail", post.pk)
 
@@ -295,6 +413,13 @@ class PostUpdateView(LoginRequiredMixin, UpdateView):
     template_name = "news_admin/post_create.html"
     success_url = reverse_lazy("post-list")
 
+    def form_valid(self, form):
+        # the pages it was listed on before the edit, then the ones after
+        invalidate_post_pages(Post.objects.get(pk=self.object.pk))
+        response = super().form_valid(form)
+        invalidate_post_pages(self.object)
+        return response
+
 
 def handler404(request, exception, template_name="404.html"):
     return render(request, template_name, status=404)
@@ -366,3 +491,42 @@ class CategoryDeleteView(LoginRequiredMixin, View):
         category.delete()
         messages.success(self.request, "Category was successfully deleted")
         return redirect("category-list")
+
+
+class MetricsView(View):
+    # scraped by Prometheus, staff users and INTERNAL_IPS only
+    def get(self, request, *args, **kwargs):
+        if not is_metrics_client(request):
+            return HttpResponseForbidden()
+        return HttpResponse(
+            registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+class SitemapIndexView(View):
+    def get(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            [LAYOUT_VERSION, PAGES_VERSION],
+            partial(
+                sitemaps_views.index,
+                request,
+                SITEMAPS,
+                sitemap_url_name="sitemap-section",
+            ),
+            "sitemap",
+        )
+
+
+class SitemapView(View):
+    def get(self, request, section, *args, **kwargs):
+        get_response = partial(sitemaps_views.sitemap, request, SITEMAPS, section)
+        page = request.GET.get("p", "1")
+        if section != "posts":
+            versions = [LAYOUT_VERSION]
+        elif page.isdigit():
+            # a post only drops the page listing it
+            versions = [sitemap_version(int(page))]
+        else:
+            return get_response()
+        return cached_response(request, versions, get_response, "sitemap")